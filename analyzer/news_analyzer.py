@@ -3,12 +3,19 @@
 News Analyzer - извлечение знаний из новостей
 Определяет релевантность и извлекает технологии для внедрения
 """
-import sqlite3
-import json
+import sys
 import re
+import json
 from pathlib import Path
 
-DB_PATH = Path(__file__).parent.parent / "knowledge" / "news.db"
+BASE_DIR = Path(__file__).parent.parent
+DB_PATH = BASE_DIR / "knowledge" / "news.db"
+
+sys.path.insert(0, str(BASE_DIR))
+import storage
+import archive
+from matcher import Matcher
+import migrations
 
 # Паттерны для определения важности
 IMPORTANCE_PATTERNS = {
@@ -35,125 +42,168 @@ TECH_CATEGORIES = {
     "concept": [r"agent", r"agentic", r"autonomous", r"self-"]
 }
 
-def calculate_relevance(title, content):
+# Известные технологии: паттерн -> название
+TECH_PATTERNS = {
+    "MCP": [r"MCP|Model Context Protocol"],
+    "UCP": [r"UCP|Universal Commerce Protocol"],
+    "A2A": [r"A2A|Agent.?to.?Agent"],
+    "AP2": [r"AP2|Agent Payments Protocol"],
+    "Claude": [r"Claude\s*\d*\.?\d*"],
+    "GPT": [r"GPT-\d+"],
+    "Gemini": [r"Gemini"],
+}
+
+IMPORTANCE_SCORES = {"critical": 30, "high": 15, "medium": 5}
+
+# Все паттерны анализатора в одном автомате - один проход по тексту новости
+ANALYZER_MATCHER = Matcher({
+    **{("importance", level): patterns for level, patterns in IMPORTANCE_PATTERNS.items()},
+    **{("tech", name): patterns for name, patterns in TECH_PATTERNS.items()},
+    **{("category", category): patterns for category, patterns in TECH_CATEGORIES.items()},
+}, regex=True)
+
+def match_text(title, content):
+    """Run every analyzer pattern over the item once: {(kind, name): [patterns hit]}"""
+    return ANALYZER_MATCHER.matched(f"{title} {content}")
+
+def calculate_relevance(title, content, matched=None):
     """Calculate relevance score 0-100"""
-    text = f"{title} {content}".lower()
-    score = 0
-    
-    # Critical keywords +30 each
-    for pattern in IMPORTANCE_PATTERNS["critical"]:
-        if re.search(pattern, text, re.I):
-            score += 30
-    
-    # High keywords +15 each
-    for pattern in IMPORTANCE_PATTERNS["high"]:
-        if re.search(pattern, text, re.I):
-            score += 15
-    
-    # Medium keywords +5 each
-    for pattern in IMPORTANCE_PATTERNS["medium"]:
-        if re.search(pattern, text, re.I):
-            score += 5
-    
+    matched = matched if matched is not None else match_text(title, content)
+    # +30 за каждый critical паттерн, +15 за high, +5 за medium
+    score = sum(IMPORTANCE_SCORES[name] * len(patterns)
+                for (kind, name), patterns in matched.items() if kind == "importance")
     return min(score, 100)
 
-def extract_technologies(title, content):
+def extract_technologies(title, content, matched=None):
     """Extract technology mentions"""
-    text = f"{title} {content}"
-    technologies = []
-    
-    # Known tech patterns
-    tech_patterns = [
-        (r"MCP|Model Context Protocol", "MCP"),
-        (r"UCP|Universal Commerce Protocol", "UCP"),
-        (r"A2A|Agent.?to.?Agent", "A2A"),
-        (r"AP2|Agent Payments Protocol", "AP2"),
-        (r"Claude\s*\d*\.?\d*", "Claude"),
-        (r"GPT-\d+", "GPT"),
-        (r"Gemini", "Gemini"),
-    ]
-    
-    for pattern, name in tech_patterns:
-        if re.search(pattern, text, re.I):
-            technologies.append(name)
-    
-    return list(set(technologies))
+    matched = matched if matched is not None else match_text(title, content)
+    return list(set(name for kind, name in matched if kind == "tech"))
 
 def determine_category(text):
     """Determine technology category"""
-    text = text.lower()
-    for category, patterns in TECH_CATEGORIES.items():
-        for pattern in patterns:
-            if re.search(pattern, text, re.I):
-                return category
+    matched = ANALYZER_MATCHER.matched(text)
+    for category in TECH_CATEGORIES:
+        if ("category", category) in matched:
+            return category
     return "general"
 
 def analyze_news():
     """Analyze all unanalyzed news"""
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
+    migrations.migrate(DB_PATH)
+    with storage.transaction(DB_PATH) as conn:
+        c = conn.cursor()
     
-    # Get unanalyzed news
-    c.execute("SELECT id, source, title, content, url FROM news WHERE analyzed = 0")
-    news_items = c.fetchall()
+        # Почти-дубликаты уже разобраны в канонической записи
+        c.execute("UPDATE news SET analyzed = 1 WHERE analyzed = 0 AND duplicate_of IS NOT NULL")
+        duplicates = c.rowcount
     
-    analyzed_count = 0
-    knowledge_count = 0
-    tech_count = 0
+        # Get unanalyzed news
+        c.execute("SELECT id, source, title, content, url FROM news WHERE analyzed = 0")
+        news_items = c.fetchall()
     
-    for news_id, source, title, content, url in news_items:
-        # Calculate relevance
-        relevance = calculate_relevance(title, content or "")
-        
-        # Update news with relevance
-        c.execute("UPDATE news SET analyzed = 1, relevance_score = ? WHERE id = ?",
-                  (relevance, news_id))
-        analyzed_count += 1
+        scores = []
+        knowledge = []
+        technologies = []
+    
+        for news_id, source, title, content, url in news_items:
+            # Calculate relevance
+            matched = match_text(title, content or "")
+            relevance = calculate_relevance(title, content or "", matched)
+            scores.append((relevance, news_id))
         
-        # Extract technologies if relevant
-        if relevance >= 30:
-            technologies = extract_technologies(title, content or "")
-            
-            for tech in technologies:
-                # Save to knowledge
-                c.execute('''INSERT OR IGNORE INTO knowledge 
-                            (news_id, category, key, value, importance)
-                            VALUES (?, ?, ?, ?, ?)''',
-                         (news_id, "technology", tech, f"Found in: {title[:100]}", 
-                          "high" if relevance >= 60 else "medium"))
-                knowledge_count += 1
-                
-                # Add to technologies table
-                c.execute('''INSERT OR IGNORE INTO technologies 
-                            (name, description, source_news_id, status)
-                            VALUES (?, ?, ?, 'discovered')''',
-                         (tech, f"Discovered from {source}: {title[:200]}", news_id))
-                if c.rowcount > 0:
-                    tech_count += 1
+            # Extract technologies if relevant
+            if relevance >= 30:
+                for tech in extract_technologies(title, content or "", matched):
+                    knowledge.append((news_id, "technology", tech, f"Found in: {title[:100]}",
+                                      "high" if relevance >= 60 else "medium"))
+                    technologies.append((tech, f"Discovered from {source}: {title[:200]}", news_id))
     
-    conn.commit()
-    conn.close()
+        # Все записи разбора - три executemany в одной транзакции
+        analyzed_count = storage.write_many(conn, "UPDATE news SET analyzed = 1, relevance_score = ? WHERE id = ?",
+                                            scores)
+        knowledge_count = storage.insert_many(conn, "knowledge",
+                                              ("news_id", "category", "key", "value", "importance"),
+                                              knowledge)["inserted"]
+        tech_count = storage.insert_many(conn, "technologies", ("name", "description", "source_news_id"),
+                                         technologies)["inserted"]
     
     return {
         "analyzed": analyzed_count,
+        "duplicates_skipped": duplicates,
         "knowledge_extracted": knowledge_count,
         "new_technologies": tech_count
     }
 
-def get_high_relevance_news(min_score=50):
-    """Get highly relevant news"""
-    conn = sqlite3.connect(DB_PATH)
+def get_high_relevance_news(min_score=50, months=0):
+    """Get highly relevant news (months: include the last N archived months)"""
+    conn = storage.connect(DB_PATH)
+    migrations.migrate(DB_PATH)
     c = conn.cursor()
-    c.execute('''SELECT id, source, title, relevance_score, url 
-                 FROM news WHERE relevance_score >= ? 
-                 ORDER BY relevance_score DESC''', (min_score,))
-    results = c.fetchall()
+    table = "news"
+    try:
+        if months:
+            archive.attach_archives(conn, months, DB_PATH)
+            table = "news_all"
+        c.execute(f'''SELECT id, source, title, relevance_score, url 
+                      FROM {table} WHERE relevance_score >= ? AND duplicate_of IS NULL
+                      ORDER BY relevance_score DESC''', (min_score,))
+        results = c.fetchall()
+    finally:
+        # Соединение из пула: архивы и временные представления не должны остаться следующему
+        if months:
+            archive.close_archives(conn)
+        conn.close()
+    return results
+
+def fts_query(text):
+    """Free text -> safe FTS5 MATCH expression (all words, 'word*' keeps the prefix)"""
+    terms = []
+    for word in text.split():
+        prefix = word.endswith("*")
+        for token in re.findall(r"\w+", word):
+            terms.append(f'"{token}"')
+        if prefix and terms:
+            terms[-1] += "*"
+    return " ".join(terms)
+
+def search_fts(conn, schemas, match, limit):
+    """Best matches from the news_fts of each schema (live DB / attached archives)"""
+    arms = [f'''SELECT * FROM (SELECT n.id, n.source, n.title, n.url, n.relevance_score,
+                                    snippet(news_fts, -1, '[', ']', '…', 12), news_fts.rank
+                             FROM {schema}.news_fts JOIN {schema}.news n ON n.id = news_fts.rowid
+                             WHERE news_fts MATCH ?1 AND n.duplicate_of IS NULL
+                             ORDER BY news_fts.rank LIMIT ?2)''' for schema in schemas]
+    return conn.execute(" UNION ALL ".join(arms) + " ORDER BY 7 LIMIT ?2", (match, limit)).fetchall()
+
+def search(conn, text, limit=20, history=True):
+    """Full-text search on an open connection (live DB or a snapshot), best BM25 match first
+
+    history: also search the monthly archives (archive.py), attached group by group.
+    """
+    match = fts_query(text)
+    if not match:
+        return []
+    results = search_fts(conn, ["main"], match, limit)
+    if history:
+        try:
+            for schemas in archive.batches(conn, db_path=DB_PATH):
+                if schemas:
+                    results += search_fts(conn, schemas, match, limit)
+        finally:
+            archive.close_archives(conn)
+        results = sorted(results, key=lambda r: r[6])[:limit]
+    return [r[:6] for r in results]
+
+def search_news(text, limit=20, history=True):
+    """Full-text search over news titles and content"""
+    conn = storage.connect(DB_PATH)
+    results = search(conn, text, limit, history)
     conn.close()
     return results
 
 def get_discovered_technologies():
     """Get all discovered technologies"""
-    conn = sqlite3.connect(DB_PATH)
+    conn = storage.connect(DB_PATH)
     c = conn.cursor()
     c.execute('''SELECT name, description, status FROM technologies 
                  ORDER BY id DESC''')
@@ -176,3 +226,6 @@ if __name__ == "__main__":
         techs = get_discovered_technologies()
         for t in techs:
             print(f"[{t[2]}] {t[0]}: {t[1][:60]}...")
+    elif cmd == "search":
+        for n in search_news(" ".join(sys.argv[2:])):
+            print(f"[{n[4]}] {n[2][:60]} - {n[5]}")
@@ -3,12 +3,16 @@
 Architect - создание планов внедрения технологий
 Генерирует архитектуру и план действий для интеграции
 """
-import sqlite3
+import sys
 import json
 from pathlib import Path
 from datetime import datetime
 
-DB_PATH = Path(__file__).parent.parent / "knowledge" / "news.db"
+BASE_DIR = Path(__file__).parent.parent
+DB_PATH = BASE_DIR / "knowledge" / "news.db"
+
+sys.path.insert(0, str(BASE_DIR))
+import storage
 
 # Шаблоны архитектуры для разных типов технологий
 ARCHITECTURE_TEMPLATES = {
@@ -36,7 +40,7 @@ ARCHITECTURE_TEMPLATES = {
 
 def get_pending_technologies():
     """Get technologies awaiting architecture"""
-    conn = sqlite3.connect(DB_PATH)
+    conn = storage.connect(DB_PATH)
     c = conn.cursor()
     c.execute('''SELECT id, name, description FROM technologies 
                  WHERE status = 'discovered' AND architecture IS NULL''')
@@ -121,34 +125,31 @@ def plan_all_technologies():
     pending = get_pending_technologies()
     planned = 0
     
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
+    with storage.transaction(DB_PATH) as conn:
+        c = conn.cursor()
     
-    for tech_id, name, description in pending:
-        # Generate architecture
-        arch = generate_architecture(tech_id, name, description)
-        plan = create_implementation_plan(arch)
+        for tech_id, name, description in pending:
+            # Generate architecture
+            arch = generate_architecture(tech_id, name, description)
+            plan = create_implementation_plan(arch)
         
-        # Save to database
-        c.execute('''UPDATE technologies 
-                     SET architecture = ?, implementation_plan = ?, status = 'planned'
-                     WHERE id = ?''',
-                  (json.dumps(arch), json.dumps(plan), tech_id))
-        planned += 1
+            # Save to database
+            c.execute('''UPDATE technologies 
+                         SET architecture = ?, implementation_plan = ?, status = 'planned'
+                         WHERE id = ?''',
+                      (json.dumps(arch), json.dumps(plan), tech_id))
+            planned += 1
         
-        print(f"Planned: {name}")
-        print(f"  Type: {arch['type']}")
-        print(f"  Effort: {arch['estimated_effort']}")
-        print(f"  Steps: {len(plan['steps'])}")
-    
-    conn.commit()
-    conn.close()
+            print(f"Planned: {name}")
+            print(f"  Type: {arch['type']}")
+            print(f"  Effort: {arch['estimated_effort']}")
+            print(f"  Steps: {len(plan['steps'])}")
     
     return {"planned": planned}
 
 def show_plans():
     """Show all implementation plans"""
-    conn = sqlite3.connect(DB_PATH)
+    conn = storage.connect(DB_PATH)
     c = conn.cursor()
     c.execute('''SELECT name, status, implementation_plan FROM technologies 
                  WHERE implementation_plan IS NOT NULL''')
@@ -166,7 +167,6 @@ def show_plans():
             print(f"  ... and {len(plan['steps']) - 5} more steps")
 
 if __name__ == "__main__":
-    import sys
     cmd = sys.argv[1] if len(sys.argv) > 1 else "plan"
     
     if cmd == "plan":
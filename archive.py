@@ -0,0 +1,213 @@
+#!/usr/bin/env python3
+"""
+Archive - помесячный архив старых новостей в отдельных SQLite-файлах
+- news/knowledge старше ARCHIVE_AFTER_DAYS переносятся в knowledge/archive/news-YYYY-MM.db:
+  живая news.db (VACUUM, бэкапы, горячие запросы) остаётся маленькой
+- URL архивных новостей остаются в archived_urls - краулеры не вставят их заново
+- Исторические запросы подключают архивы через ATTACH и временные представления
+  news_all / knowledge_all (UNION ALL живой БД и архивов)
+"""
+import sys
+import json
+import sqlite3
+from pathlib import Path
+
+import storage
+import migrations
+import dedup
+
+DB_PATH = Path(__file__).parent / "knowledge" / "news.db"
+
+ARCHIVE_AFTER_DAYS = 180
+# Таблица -> колонка времени, по которой строка попадает в месяц
+ARCHIVED_TABLES = {"news": "crawled_at", "knowledge": "created_at"}
+SCHEMA_PREFIX = "archive_"
+
+def archive_dir(db_path=DB_PATH):
+    return Path(db_path).parent / "archive"
+
+def archive_path(month, db_path=DB_PATH):
+    return archive_dir(db_path) / f"news-{month}.db"
+
+def schema_name(month):
+    return SCHEMA_PREFIX + month.replace("-", "_")
+
+def month_range(month):
+    """('YYYY-MM-01', first day of the next month) - bounds for an indexed range scan"""
+    year, mon = map(int, month.split("-"))
+    year, mon = (year + 1, 1) if mon == 12 else (year, mon + 1)
+    return f"{month}-01", f"{year:04d}-{mon:02d}-01"
+
+def columns(conn, schema, table):
+    return [(r[1], r[2]) for r in conn.execute(f"PRAGMA {schema}.table_info({table})")]
+
+def attached(conn):
+    """{schema: file} of databases attached to conn"""
+    return {r[1]: r[2] for r in conn.execute("PRAGMA database_list") if r[1] not in ("main", "temp")}
+
+def prepare_archive(conn, schema):
+    """Create archive tables matching the live ones (new live columns are added too)"""
+    for table in ARCHIVED_TABLES:
+        live = columns(conn, "main", table)
+        defs = ", ".join("id INTEGER PRIMARY KEY" if name == "id" else f"{name} {decl}".strip()
+                         for name, decl in live)
+        conn.execute(f"CREATE TABLE IF NOT EXISTS {schema}.{table} ({defs})")
+        have = {name for name, _ in columns(conn, schema, table)}
+        for name, decl in live:
+            if name not in have:
+                conn.execute(f"ALTER TABLE {schema}.{table} ADD COLUMN {name} {decl}")
+    exists = conn.execute(f"SELECT 1 FROM {schema}.sqlite_master WHERE name = 'news_fts'").fetchone()
+    if not exists:
+        conn.execute(f"CREATE VIRTUAL TABLE {schema}.news_fts USING {migrations.NEWS_FTS}")
+        conn.execute(f"INSERT INTO {schema}.news_fts (news_fts, rank) VALUES ('rank', ?)",
+                     (migrations.NEWS_FTS_RANK,))
+
+def archive_month(conn, month, cutoff, db_path=DB_PATH):
+    """Move one month of rows older than cutoff into its archive file; {table: rows moved}"""
+    path = archive_path(month, db_path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    schema = schema_name(month)
+    if schema not in attached(conn):
+        conn.execute(f"ATTACH DATABASE ? AS {schema}", (str(path),))
+    start, end = month_range(month)
+    moved = {}
+    try:
+        prepare_archive(conn, schema)
+        with storage.transaction(db_path):
+            for table, column in ARCHIVED_TABLES.items():
+                where = f"{column} >= ?1 AND {column} < ?2 AND {column} < ?3"
+                if table == "news":
+                    # Новость с MAX(id) остаётся: без AUTOINCREMENT id иначе начнутся заново
+                    where += " AND id < (SELECT MAX(id) FROM main.news)"
+                    # Повтор после сбоя между файлами: в FTS только ещё не перенесённые строки
+                    conn.execute(f'''INSERT INTO {schema}.news_fts (rowid, title, content)
+                                     SELECT id, title, content FROM main.news
+                                     WHERE {where} AND id NOT IN (SELECT id FROM {schema}.news)''',
+                                 (start, end, cutoff))
+                    conn.execute(f'''INSERT OR IGNORE INTO main.archived_urls (url, month)
+                                     SELECT url, ?4 FROM main.news WHERE {where} AND url IS NOT NULL''',
+                                 (start, end, cutoff, month))
+                    conn.execute(f'''DELETE FROM main.news_fingerprints
+                                     WHERE news_id IN (SELECT id FROM main.news WHERE {where})''',
+                                 (start, end, cutoff))
+                names = ", ".join(name for name, _ in columns(conn, "main", table))
+                conn.execute(f'''INSERT OR IGNORE INTO {schema}.{table} ({names})
+                                 SELECT {names} FROM main.{table} WHERE {where}''', (start, end, cutoff))
+                moved[table] = conn.execute(f"DELETE FROM main.{table} WHERE {where}",
+                                            (start, end, cutoff)).rowcount
+            conn.execute('''INSERT INTO archive_months (month, path, news, knowledge) VALUES (?, ?, ?, ?)
+                            ON CONFLICT(month) DO UPDATE SET
+                                news = news + excluded.news,
+                                knowledge = knowledge + excluded.knowledge,
+                                archived_at = CURRENT_TIMESTAMP''',
+                         (month, path.name, moved["news"], moved["knowledge"]))
+    finally:
+        conn.execute(f"DETACH DATABASE {schema}")
+    return moved
+
+def archive_old(days=ARCHIVE_AFTER_DAYS, db_path=DB_PATH):
+    """Move news/knowledge older than days into monthly archive files"""
+    # Кандидаты в дубликаты (dedup) должны оставаться в живой БД
+    days = max(int(days), dedup.DUPLICATE_WINDOW_DAYS)
+    migrations.migrate(db_path)
+    conn = storage.connect(db_path)
+    close_archives(conn)
+    cutoff = conn.execute("SELECT datetime('now', ?)", (f"-{days} days",)).fetchone()[0]
+    months = set()
+    for table, column in ARCHIVED_TABLES.items():
+        months.update(r[0] for r in conn.execute(
+            f"SELECT DISTINCT strftime('%Y-%m', {column}) FROM {table} WHERE {column} < ?", (cutoff,)))
+    result = {"cutoff": cutoff, "months": {}}
+    try:
+        for month in sorted(m for m in months if m):
+            moved = archive_month(conn, month, cutoff, db_path)
+            if any(moved.values()):
+                result["months"][month] = moved
+    finally:
+        close_archives(conn)
+        conn.close()
+    result["news"] = sum(m["news"] for m in result["months"].values())
+    result["knowledge"] = sum(m["knowledge"] for m in result["months"].values())
+    return result
+
+def get_months(conn, months=None):
+    """Archived months, newest first (months: only the last N of them)"""
+    rows = [r[0] for r in conn.execute("SELECT month FROM archive_months ORDER BY month DESC")]
+    return rows[:months] if months is not None else rows
+
+def free_slots(conn):
+    """How many more archives this connection may ATTACH (SQLITE_LIMIT_ATTACHED)"""
+    others = [s for s in attached(conn) if not s.startswith(SCHEMA_PREFIX)]
+    return conn.getlimit(sqlite3.SQLITE_LIMIT_ATTACHED) - len(others)
+
+def use_archives(conn, months, db_path=DB_PATH):
+    """Attach exactly these months and point news_all / knowledge_all at them; their schemas"""
+    wanted = {schema_name(m): m for m in months}
+    for view in ("news_all", "knowledge_all"):
+        conn.execute(f"DROP VIEW IF EXISTS temp.{view}")
+    current = attached(conn)
+    for schema in current:
+        if schema.startswith(SCHEMA_PREFIX) and schema not in wanted:
+            conn.execute(f"DETACH DATABASE {schema}")
+    schemas = []
+    for schema, month in wanted.items():
+        path = archive_path(month, db_path)
+        if not path.exists():
+            continue
+        if schema not in current:
+            conn.execute(f"ATTACH DATABASE ? AS {schema}", (str(path),))
+        schemas.append(schema)
+
+    for table in ARCHIVED_TABLES:
+        live = [name for name, _ in columns(conn, "main", table)]
+        arms = [f"SELECT {', '.join(live)} FROM main.{table}"]
+        for schema in schemas:
+            # Архив старше живой схемы: недостающие колонки - NULL
+            have = {name for name, _ in columns(conn, schema, table)}
+            names = ", ".join(name if name in have else f"NULL AS {name}" for name in live)
+            arms.append(f"SELECT {names} FROM {schema}.{table}")
+        conn.execute(f"CREATE TEMP VIEW {table}_all AS " + " UNION ALL ".join(arms))
+    return schemas
+
+def attach_archives(conn, months=None, db_path=DB_PATH):
+    """Attach the newest archives (as many as fit) behind news_all / knowledge_all
+
+    Run outside a transaction: SQLite does not allow ATTACH/DETACH inside one.
+    """
+    return use_archives(conn, get_months(conn, months)[:free_slots(conn)], db_path)
+
+def batches(conn, months=None, db_path=DB_PATH):
+    """Attach all archives group by group (SQLite limits ATTACH); yields each group's schemas"""
+    all_months = get_months(conn, months)
+    step = max(1, free_slots(conn))
+    for i in range(0, len(all_months), step):
+        yield use_archives(conn, all_months[i:i + step], db_path)
+
+def close_archives(conn):
+    """Drop the history views and detach every archive"""
+    for view in ("news_all", "knowledge_all"):
+        conn.execute(f"DROP VIEW IF EXISTS temp.{view}")
+    for schema in attached(conn):
+        if schema.startswith(SCHEMA_PREFIX):
+            conn.execute(f"DETACH DATABASE {schema}")
+
+def get_summary(db_path=DB_PATH):
+    """Archived months with row counts (from archive_months, no ATTACH)"""
+    conn = storage.connect(db_path)
+    rows = conn.execute('''SELECT month, path, news, knowledge, archived_at
+                           FROM archive_months ORDER BY month DESC''').fetchall()
+    conn.close()
+    return [{"month": r[0], "path": r[1], "news": r[2], "knowledge": r[3], "archived_at": r[4]}
+            for r in rows]
+
+if __name__ == "__main__":
+    cmd = sys.argv[1] if len(sys.argv) > 1 else "summary"
+    migrations.migrate(DB_PATH)
+
+    if cmd == "run":
+        days = int(sys.argv[2]) if len(sys.argv) > 2 else ARCHIVE_AFTER_DAYS
+        print(json.dumps(archive_old(days), indent=2))
+    elif cmd == "summary":
+        print(json.dumps(get_summary(), indent=2))
+    else:
+        print("Commands: run [days], summary")
@@ -0,0 +1,210 @@
+#!/usr/bin/env python3
+"""
+Bloom - фильтр Блума известных URL новостей
+- Уже виденные URL отсекаются до записи в БД; "возможно есть" проверяется
+  одним пакетным SELECT, так что ложные срабатывания ничего не теряют
+- Сохраняется рядом с БД и при старте догружает только новые строки news;
+  при переполнении пересобирается из таблицы целиком
+"""
+import sys
+import os
+import json
+import math
+import hashlib
+import tempfile
+import threading
+from pathlib import Path
+
+import storage
+import migrations
+
+DB_PATH = Path(__file__).parent / "knowledge" / "news.db"
+
+ERROR_RATE = 0.01         # допустимая доля ложных срабатываний
+MIN_CAPACITY = 100000
+GROWTH = 2                # запас ёмкости при пересборке
+SQL_BATCH = 500           # URL в одном SELECT ... IN (...)
+
+class BloomFilter:
+    """Bit array with k hash functions (double hashing over blake2b)"""
+    def __init__(self, capacity, error_rate=ERROR_RATE):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.size = max(8, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def positions(self, key):
+        digest = hashlib.blake2b(key.encode("utf-8"), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return [(h1 + i * h2) % self.size for i in range(self.hashes)]
+
+    def add(self, key):
+        for pos in self.positions(key):
+            self.bits[pos >> 3] |= 1 << (pos & 7)
+        self.count += 1
+
+    def __contains__(self, key):
+        bits = self.bits
+        return all(bits[pos >> 3] & (1 << (pos & 7)) for pos in self.positions(key))
+
+    def to_bytes(self, meta):
+        header = json.dumps({"capacity": self.capacity, "error_rate": self.error_rate,
+                             "count": self.count, **meta}).encode()
+        return len(header).to_bytes(4, "little") + header + bytes(self.bits)
+
+    @classmethod
+    def from_bytes(cls, data):
+        length = int.from_bytes(data[:4], "little")
+        meta = json.loads(data[4:4 + length])
+        bloom = cls(meta["capacity"], meta["error_rate"])
+        bits = data[4 + length:]
+        if len(bits) != len(bloom.bits):
+            raise ValueError("Bloom filter size mismatch")
+        bloom.bits = bytearray(bits)
+        bloom.count = meta["count"]
+        return bloom, meta
+
+class KnownUrls:
+    """Bloom filter of news.url backed by a definitive DB check"""
+    def __init__(self, db_path, error_rate=ERROR_RATE):
+        self.db_path = Path(db_path)
+        self.path = storage.resolve(db_path).with_name("known_urls.bloom")
+        self.error_rate = error_rate
+        self.lock = threading.Lock()
+        self.bloom = None
+        self.max_id = 0
+        self.dirty = False      # добавлены URL, которых нет в файле
+        self.stats = {"checked": 0, "bloom_new": 0, "bloom_maybe": 0, "known": 0, "false_positive": 0}
+
+    def load(self):
+        """Load the persisted filter and add news rows newer than it; rebuild if needed"""
+        try:
+            with open(self.path, "rb") as f:
+                bloom, meta = BloomFilter.from_bytes(f.read())
+            if meta.get("error_rate") != self.error_rate:
+                raise ValueError("error rate changed")
+            self.bloom, self.max_id = bloom, meta.get("max_id", 0)
+        except (OSError, ValueError, KeyError):
+            self.bloom, self.max_id = None, 0
+
+        migrations.migrate(self.db_path)
+        conn = storage.connect(self.db_path)
+        c = conn.cursor()
+        c.execute("SELECT COUNT(*), COALESCE(MAX(id), 0) FROM news")
+        total, max_id = c.fetchone()
+        # URL архивных новостей (archive.py) тоже известны
+        c.execute("SELECT COUNT(*) FROM archived_urls")
+        total += c.fetchone()[0]
+        if self.bloom is None or max_id < self.max_id or total > self.bloom.capacity:
+            # Нет файла, БД пересоздана или фильтр переполнен - пересобираем
+            self.bloom = BloomFilter(max(MIN_CAPACITY, total * GROWTH), self.error_rate)
+            self.max_id = 0
+            c.execute("SELECT url FROM archived_urls")
+            for (url,) in c:
+                self.bloom.add(url)
+        c.execute("SELECT id, url FROM news WHERE id > ? AND url IS NOT NULL", (self.max_id,))
+        for news_id, url in c:
+            self.bloom.add(url)
+            self.max_id = max(self.max_id, news_id)
+        conn.close()
+        self.save()
+
+    def ensure_loaded(self):
+        with self.lock:
+            if self.bloom is None:
+                self.load()
+
+    def known(self, conn, urls):
+        """Subset of urls already in news or the archive: Bloom first, then one batched DB check"""
+        self.ensure_loaded()
+        urls = [u for u in set(urls) if u]
+        with self.lock:
+            maybe = [u for u in urls if u in self.bloom]
+        known = set()
+        for i in range(0, len(maybe), SQL_BATCH):
+            batch = maybe[i:i + SQL_BATCH]
+            marks = ",".join("?" * len(batch))
+            rows = conn.execute(f"""SELECT url FROM news WHERE url IN ({marks})
+                                    UNION ALL SELECT url FROM archived_urls WHERE url IN ({marks})""",
+                                batch + batch)
+            known.update(r[0] for r in rows)
+        with self.lock:
+            self.stats["checked"] += len(urls)
+            self.stats["bloom_new"] += len(urls) - len(maybe)
+            self.stats["bloom_maybe"] += len(maybe)
+            self.stats["known"] += len(known)
+            self.stats["false_positive"] += len(maybe) - len(known)
+        return known
+
+    def add(self, urls, max_id=None):
+        """Remember inserted urls (max_id: highest news.id written)"""
+        self.ensure_loaded()
+        with self.lock:
+            for url in urls:
+                if url:
+                    self.bloom.add(url)
+            if max_id:
+                self.max_id = max(self.max_id, max_id)
+            self.dirty = True
+
+    def save(self):
+        """Persist atomically next to the database"""
+        data = self.bloom.to_bytes({"max_id": self.max_id})
+        self.dirty = False
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=self.path.parent)
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp, self.path)
+
+    def get_cycle_stats(self, reset=True):
+        with self.lock:
+            stats = dict(self.stats)
+            if reset:
+                for key in self.stats:
+                    self.stats[key] = 0
+            if self.bloom is not None:
+                stats["fill_ratio"] = round(self.bloom.count / self.bloom.capacity, 3)
+        stats["hit_rate"] = round(stats["known"] / stats["checked"], 2) if stats["checked"] else 0.0
+        return stats
+
+_known = {}
+_known_lock = threading.Lock()
+
+def known_urls(db_path=DB_PATH):
+    """Shared KnownUrls for a database (one per process)"""
+    with _known_lock:
+        key = str(storage.resolve(db_path))
+        if key not in _known:
+            _known[key] = KnownUrls(db_path)
+        return _known[key]
+
+def save(db_path=DB_PATH):
+    """Persist the filter if urls were added (once per cycle: the file is rewritten whole)
+
+    Rows inserted after the last save are not lost: load() adds news rows newer than max_id.
+    """
+    known = known_urls(db_path)
+    if known.dirty:
+        known.save()
+
+def get_cycle_stats(db_path=DB_PATH, reset=True):
+    return known_urls(db_path).get_cycle_stats(reset)
+
+if __name__ == "__main__":
+    cmd = sys.argv[1] if len(sys.argv) > 1 else "stats"
+    known = known_urls()
+
+    if cmd == "rebuild":
+        if known.path.exists():
+            known.path.unlink()
+        known.ensure_loaded()
+        print(json.dumps({"urls": known.bloom.count, "capacity": known.bloom.capacity,
+                          "bits": known.bloom.size, "hashes": known.bloom.hashes}, indent=2))
+    elif cmd == "stats":
+        known.ensure_loaded()
+        print(json.dumps({"urls": known.bloom.count, "capacity": known.bloom.capacity,
+                          "error_rate": known.bloom.error_rate, "max_id": known.max_id}, indent=2))
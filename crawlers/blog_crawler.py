@@ -1,140 +1,224 @@
 #!/usr/bin/env python3
 """
-Blog Crawler - мониторинг блогов Anthropic и Google AI
+Blog Crawler - мониторинг блогов (Anthropic, Google AI, OpenAI, ...)
+Единый реестр источников: RSS/Atom лента, запасная web-страница, ключевые слова, лимиты.
+Источники обходятся параллельно и проходят общий путь parse -> filter -> save.
 """
-import sqlite3
+import sys
 import json
-import urllib.request
-import ssl
 import re
+import zlib
+import http.client
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from pathlib import Path
 
-DB_PATH = Path(__file__).parent.parent / "knowledge" / "news.db"
-ssl._create_default_https_context = ssl._create_unverified_context
+BASE_DIR = Path(__file__).parent.parent
+DB_PATH = BASE_DIR / "knowledge" / "news.db"
+# Необязательный файл с реестром источников (заменяет DEFAULT_BLOG_SOURCES)
+SOURCES_PATH = BASE_DIR / "blog_sources.json"
 
-BLOG_SOURCES = {
+sys.path.insert(0, str(BASE_DIR))
+import http_client
+import storage
+import migrations
+from crawlers.feed_cache import (init_feed_cache_table, open_feed, commit_validators,
+                                 discard_validators, get_cycle_stats)
+from crawlers.feed_parser import parse_feed, parse_feed_response
+from matcher import keyword_matcher
+from dedup import canonicalize_url, register_inserted
+from bloom import known_urls
+
+BLOG_WORKERS = 8
+WEB_FALLBACK_LIMIT = 10
+
+# Поля источника:
+#   rss          - URL RSS/Atom ленты
+#   web          - запасная страница, если лента недоступна или пуста
+#   web_pattern  - regex ссылок на статьи на запасной странице (группа 1 - путь)
+#   keywords     - фильтр по ключевым словам (пустой список - без фильтра)
+#   limit        - максимум записей из ленты
+#   priority     - "high": обходится первым, когда бюджет цикла ограничен (--deadline)
+DEFAULT_BLOG_SOURCES = {
     "anthropic": {
         "rss": "https://www.anthropic.com/rss.xml",
-        "keywords": ["claude", "mcp", "agent", "model", "safety", "api"]
+        "web": "https://www.anthropic.com/news",
+        "web_pattern": r'href="(/news/[^"]+)"',
+        "keywords": ["claude", "mcp", "agent", "model", "safety", "api"],
+        "limit": 20,
+        "priority": "high"
     },
     "google_ai": {
         "rss": "https://blog.google/technology/ai/rss/",
-        "keywords": ["gemini", "agent", "ai", "bard", "palm", "vertex"]
+        "keywords": ["gemini", "agent", "ai", "bard", "palm", "vertex", "model", "llm", "protocol"],
+        "limit": 20
     },
     "openai": {
         "rss": "https://openai.com/blog/rss.xml",
-        "keywords": ["gpt", "agent", "api", "chatgpt", "assistant"]
+        "keywords": ["gpt", "agent", "api", "chatgpt", "assistant", "model"],
+        "limit": 20
     }
 }
 
-def fetch_url(url):
-    """Fetch URL content"""
-    try:
-        req = urllib.request.Request(url, headers={"User-Agent": "AGI-News-Agent/1.0"})
-        with urllib.request.urlopen(req, timeout=15) as response:
-            return response.read().decode('utf-8')
-    except Exception as e:
-        print(f"Error fetching {url}: {e}")
-        return None
+def load_sources():
+    """Load the blog source registry"""
+    if SOURCES_PATH.exists():
+        with open(SOURCES_PATH) as f:
+            return json.load(f)
+    return DEFAULT_BLOG_SOURCES
+
+BLOG_SOURCES = load_sources()
+
+def parse_rss(xml_content, source_name, limit=20):
+    """Parse RSS/Atom document"""
+    return parse_feed([xml_content], source_name, limit)
+
+def crawl_web_fallback(source_name, config):
+    """Collect article links from the source's web page"""
+    content = http_client.fetch_url(config["web"], timeout=15)
+    if not content:
+        return []
+    
+    base = re.match(r"https?://[^/]+", config["web"]).group(0)
+    posts = []
+    seen = set()
+    for path in re.findall(config.get("web_pattern", r'href="(/[^"]+)"'), content):
+        if path in seen:
+            continue
+        seen.add(path)
+        # Заголовок берём из slug ссылки
+        title = path.rstrip("/").split("/")[-1].replace("-", " ").title()
+        posts.append({
+            "source": source_name,
+            "title": title,
+            "url": path if path.startswith("http") else base + path,
+            "content": f"{source_name.replace('_', ' ').title()} News",
+            "pubdate": None
+        })
+        if len(posts) >= WEB_FALLBACK_LIMIT:
+            break
+    return posts
 
-def parse_rss(xml_content, source_name):
-    """Simple RSS parser"""
-    items = []
+def filter_posts(posts, keywords):
+    """Keep posts that mention any of the keywords"""
+    if not keywords:
+        return posts
+    matcher = keyword_matcher(keywords)
+    filtered = []
+    for post in posts:
+        matched = matcher.matched(f"{post['title']} {post['content']}")
+        if matched:
+            post["matched_keywords"] = list(matched)
+            filtered.append(post)
+    return filtered
+
+def crawl_source(source_name, config=None):
+    """Crawl one source: feed (conditional GET) with web fallback, then filter
     
-    # Extract items using regex
-    item_pattern = r'<item>(.*?)</item>'
-    title_pattern = r'<title>(.*?)</title>'
-    link_pattern = r'<link>(.*?)</link>'
-    desc_pattern = r'<description>(.*?)</description>'
-    pubdate_pattern = r'<pubDate>(.*?)</pubDate>'
+    Returns (posts, status) where status is ok / not_modified / unchanged /
+    fallback / error.
+    """
+    config = config or BLOG_SOURCES[source_name]
+    response, not_modified = open_feed(config["rss"])
+    if not_modified:
+        return [], "not_modified"
     
-    for item_match in re.finditer(item_pattern, xml_content, re.DOTALL):
-        item_content = item_match.group(1)
-        
-        title = re.search(title_pattern, item_content, re.DOTALL)
-        link = re.search(link_pattern, item_content, re.DOTALL)
-        desc = re.search(desc_pattern, item_content, re.DOTALL)
-        pubdate = re.search(pubdate_pattern, item_content, re.DOTALL)
-        
-        if title and link:
-            # Clean CDATA
-            title_text = re.sub(r'<!\[CDATA\[(.*?)\]\]>', r'\1', title.group(1)).strip()
-            link_text = link.group(1).strip()
-            desc_text = ""
-            if desc:
-                desc_text = re.sub(r'<!\[CDATA\[(.*?)\]\]>', r'\1', desc.group(1))
-                desc_text = re.sub(r'<[^>]+>', '', desc_text)[:500]
-            
-            items.append({
-                "source": source_name,
-                "title": title_text,
-                "url": link_text,
-                "content": desc_text,
-                "pubdate": pubdate.group(1) if pubdate else None
-            })
+    try:
+        posts = parse_feed_response(response, source_name, config.get("limit")) if response else []
+    except (OSError, http.client.HTTPException, zlib.error) as e:
+        # Обрыв или таймаут посреди тела: недочитанная лента не должна стать "304" в следующий раз
+        print(f"Error reading {config['rss']}: {e}")
+        discard_validators([config["rss"]])
+        response = None
+        posts = []
+    if response is not None and response.unchanged:
+        # Лента без валидаторов, но тело совпадает с записанным ранее - сохранять нечего
+        # (дайджест известен, только когда записанное потоком тело прочитано)
+        return [], "unchanged"
+    status = "ok" if response else "error"
+    
+    if not posts and config.get("web"):
+        posts = crawl_web_fallback(source_name, config)
+        status = "fallback" if posts else status
     
-    return items[:20]  # Limit to 20 items
+    return filter_posts(posts, config.get("keywords")), status
 
-def crawl_blogs():
-    """Crawl all blog sources"""
-    all_posts = []
+def crawl_blogs(sources=None, stats=None):
+    """Crawl blog sources concurrently (all by default)"""
+    names = [name for name in BLOG_SOURCES if sources is None or name in sources]
+    if not names:
+        return []
     
-    for source_name, config in BLOG_SOURCES.items():
-        print(f"Crawling {source_name}...")
-        content = fetch_url(config["rss"])
-        
-        if not content:
-            continue
-        
-        posts = parse_rss(content, source_name)
-        
-        # Filter by keywords
-        keywords = config["keywords"]
-        filtered = []
-        for post in posts:
-            text = f"{post['title']} {post['content']}".lower()
-            if any(kw in text for kw in keywords):
-                post["matched_keywords"] = [kw for kw in keywords if kw in text]
-                filtered.append(post)
-        
-        all_posts.extend(filtered)
-        print(f"  Found {len(filtered)} relevant posts")
+    with ThreadPoolExecutor(max_workers=min(BLOG_WORKERS, len(names))) as executor:
+        results = list(executor.map(crawl_source, names))
+    
+    all_posts = []
+    for name, (posts, status) in zip(names, results):
+        print(f"  {name}: {len(posts)} relevant posts ({status})")
+        if stats is not None:
+            stats[name] = status
+        all_posts.extend(posts)
     
     return all_posts
 
 def save_blog_posts(posts):
-    """Save posts to news table"""
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
-    
-    saved = 0
-    for post in posts:
-        try:
-            c.execute('''INSERT OR IGNORE INTO news (source, title, content, url)
-                         VALUES (?, ?, ?, ?)''',
-                      (f"blog_{post['source']}", post["title"], 
-                       post["content"], post["url"]))
-            if c.rowcount > 0:
-                saved += 1
-        except Exception as e:
-            print(f"Error saving: {e}")
+    """Save posts to news table (raises if the write fails)"""
+    urls = [canonicalize_url(post["url"]) for post in posts]
+    known = known_urls(DB_PATH)
+    migrations.migrate(DB_PATH)
+    with storage.transaction(DB_PATH) as conn:
+        c = conn.cursor()
+        
+        # Уже известные URL отсекаются фильтром Блума (с точной проверкой в БД)
+        seen = known.known(conn, urls)
+        records = {}
+        for post, url in zip(posts, urls):
+            if url not in seen and url not in records:
+                records[url] = (f"blog_{post['source']}", post["title"], post["content"], url)
+        
+        c.execute("SELECT COALESCE(MAX(id), 0) FROM news")
+        last_id = c.fetchone()[0]
+        result = storage.insert_many(conn, "news", ("source", "title", "content", "url"),
+                                     records.values())
+        inserted = register_inserted(c, last_id, records)
     
-    conn.commit()
-    conn.close()
+    saved = result["inserted"]
+    if inserted:
+        known.add([url for _, url in inserted], max(news_id for news_id, _ in inserted))
     return saved
 
-def crawl_and_save():
+def crawl_and_save(sources=None):
     """Main function"""
-    posts = crawl_blogs()
-    saved = save_blog_posts(posts)
+    init_feed_cache_table()
+    status = {}
+    posts = crawl_blogs(sources, status)
+    
+    saved_by_source = {}
+    failed = []
+    for source_name in status:
+        try:
+            saved_by_source[source_name] = save_blog_posts(
+                [p for p in posts if p["source"] == source_name])
+        except Exception as e:
+            print(f"Error saving {source_name}: {e}")
+            saved_by_source[source_name] = 0
+            failed.append(source_name)
+    saved = sum(saved_by_source.values())
+    # Валидаторы только для сохранённых лент: иначе следующий цикл получит 304
+    # и несохранённые посты потеряются
+    discard_validators([BLOG_SOURCES[name]["rss"] for name in failed])
+    commit_validators()
     
     return {
         "total_found": len(posts),
         "saved": saved,
-        "sources": list(set(p["source"] for p in posts))
+        "saved_by_source": saved_by_source,
+        "status": status,
+        "failed": failed,
+        "sources": list(set(p["source"] for p in posts)),
+        "feeds": get_cycle_stats()
     }
 
 if __name__ == "__main__":
-    result = crawl_and_save()
+    result = crawl_and_save(sys.argv[1:] or None)
     print(json.dumps(result, indent=2))
@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+"""
+Feed Cache - условные GET запросы (ETag / Last-Modified) для RSS лент
+Валидаторы хранятся в SQLite; ответ 304 означает, что парсинг и запись в БД не нужны
+"""
+import sys
+import json
+import threading
+from pathlib import Path
+
+BASE_DIR = Path(__file__).parent.parent
+DB_PATH = BASE_DIR / "knowledge" / "news.db"
+
+sys.path.insert(0, str(BASE_DIR))
+import http_client
+import storage
+import migrations
+
+# Валидаторы, полученные в текущем цикле; сохраняются после записи постов в БД
+_pending = {}
+_stats = {"requests": 0, "not_modified": 0}
+_lock = threading.Lock()
+
+def init_feed_cache_table():
+    """Initialize feed validators table"""
+    migrations.migrate(DB_PATH)
+
+def get_validators(url):
+    """Get stored (etag, last_modified) for a feed URL"""
+    conn = storage.connect(DB_PATH)
+    c = conn.cursor()
+    c.execute("SELECT etag, last_modified FROM feed_validators WHERE url = ?", (url,))
+    row = c.fetchone()
+    conn.close()
+    return row or (None, None)
+
+def open_feed(url, timeout=15):
+    """Conditional streaming GET of a feed
+
+    Returns (response, not_modified): response is None on error or 304,
+    otherwise a streaming response the caller must read or close.
+    """
+    etag, last_modified = get_validators(url)
+    headers = {}
+    if etag:
+        headers["If-None-Match"] = etag
+    if last_modified:
+        headers["If-Modified-Since"] = last_modified
+
+    try:
+        resp = http_client.request("GET", url, headers=headers, timeout=timeout, stream=True)
+    except Exception as e:
+        print(f"Error fetching {url}: {e}")
+        return None, False
+
+    with _lock:
+        _stats["requests"] += 1
+        if resp.status == 304:
+            _stats["not_modified"] += 1
+            _pending[url] = (etag, last_modified, True)
+            return None, True
+
+    if not resp.ok:
+        print(f"Error fetching {url}: HTTP {resp.status}")
+        return None, False
+
+    with _lock:
+        _pending[url] = (resp.headers.get("etag"), resp.headers.get("last-modified"), False)
+    return resp, False
+
+def fetch_feed(url, timeout=15):
+    """Conditional GET of a feed
+
+    Returns (content, not_modified): content is None on error or 304.
+    """
+    resp, not_modified = open_feed(url, timeout)
+    if resp is None:
+        return None, not_modified
+    try:
+        return resp.text(), False
+    except Exception as e:
+        print(f"Error fetching {url}: {e}")
+        return None, False
+
+def commit_validators():
+    """Persist validators of feeds fetched in this cycle"""
+    with _lock:
+        pending = list(_pending.items())
+        _pending.clear()
+    if not pending:
+        return 0
+
+    with storage.transaction(DB_PATH) as conn:
+        c = conn.cursor()
+        for url, (etag, last_modified, not_modified) in pending:
+            c.execute('''INSERT INTO feed_validators (url, etag, last_modified, fetch_count, not_modified_count)
+                         VALUES (?, ?, ?, 1, ?)
+                         ON CONFLICT(url) DO UPDATE SET
+                             etag = excluded.etag, last_modified = excluded.last_modified,
+                             fetch_count = fetch_count + 1,
+                             not_modified_count = not_modified_count + excluded.not_modified_count,
+                             checked_at = CURRENT_TIMESTAMP''',
+                      (url, etag, last_modified, int(not_modified)))
+    return len(pending)
+
+def discard_validators(urls):
+    """Forget pending validators of feeds whose posts were not saved
+
+    The next cycle then fetches them in full instead of getting a 304.
+    """
+    with _lock:
+        for url in urls:
+            _pending.pop(url, None)
+
+def get_cycle_stats(reset=True):
+    """Get 304 statistics for this cycle"""
+    with _lock:
+        stats = dict(_stats)
+        if reset:
+            _stats.update(requests=0, not_modified=0)
+    stats["hit_rate"] = round(stats["not_modified"] / stats["requests"], 2) if stats["requests"] else 0.0
+    return stats
+
+def selftest():
+    """Check the 200 -> 304 flow against a local stand-in feed server"""
+    from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+    import tempfile
+
+    global DB_PATH
+    feed = b"<rss><channel><item><title>Claude</title><link>https://x/1</link></item></channel></rss>"
+
+    class FakeFeed(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.headers.get("If-None-Match") == '"v1"':
+                self.send_response(304)
+                self.end_headers()
+                return
+            self.send_response(200)
+            self.send_header("ETag", '"v1"')
+            self.send_header("Last-Modified", "Mon, 05 Jan 2026 10:00:00 GMT")
+            self.send_header("Content-Length", str(len(feed)))
+            self.end_headers()
+            self.wfile.write(feed)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FakeFeed)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_address[1]}/rss.xml"
+
+    saved_path = DB_PATH
+    with tempfile.TemporaryDirectory() as tmp:
+        DB_PATH = Path(tmp) / "news.db"
+        try:
+            init_feed_cache_table()
+            get_cycle_stats()
+            first = fetch_feed(url)
+            commit_validators()
+            second = fetch_feed(url)
+            commit_validators()
+            stats = get_cycle_stats()
+        finally:
+            DB_PATH = saved_path
+            server.shutdown()
+
+    assert first == (feed.decode(), False), first
+    assert second == (None, True), second
+    assert stats == {"requests": 2, "not_modified": 1, "hit_rate": 0.5}, stats
+    return stats
+
+if __name__ == "__main__":
+    cmd = sys.argv[1] if len(sys.argv) > 1 else "stats"
+
+    if cmd == "stats":
+        init_feed_cache_table()
+        conn = storage.connect(DB_PATH)
+        c = conn.cursor()
+        c.execute('''SELECT url, fetch_count, not_modified_count, checked_at
+                     FROM feed_validators ORDER BY url''')
+        for r in c.fetchall():
+            print(f"  [{r[2]:>3}/{r[1]:<3} 304] {r[0]} ({r[3]})")
+        conn.close()
+    elif cmd == "selftest":
+        print(json.dumps(selftest()))
@@ -0,0 +1,273 @@
+#!/usr/bin/env python3
+"""
+Feed Parser - потоковый парсер RSS 2.0 / Atom на expat
+- Читает ленту кусками прямо из ответа сервера
+- Корректно обрабатывает CDATA и HTML-сущности
+- Останавливается, как только набран лимит записей
+"""
+import sys
+import json
+import re
+import html
+import time
+import xml.parsers.expat
+from pathlib import Path
+
+ITEM_TAGS = {"item", "entry"}
+TITLE_TAGS = {"title"}
+LINK_TAGS = {"link"}
+DESC_TAGS = {"description", "summary", "content"}
+DATE_TAGS = {"pubDate", "published", "updated"}
+
+MAX_FIELD_CHARS = 8192     # сырой текст поля дальше не копим
+MAX_CONTENT_CHARS = 500    # длина content после очистки от HTML
+
+TAG_RE = re.compile(r"<[^>]+>")
+SPACE_RE = re.compile(r"\s+")
+
+class _LimitReached(Exception):
+    pass
+
+def html_to_text(raw):
+    """Strip HTML tags and entities from a description"""
+    return SPACE_RE.sub(" ", html.unescape(TAG_RE.sub(" ", raw))).strip()
+
+class FeedParser:
+    """Incremental RSS/Atom parser, feed it bytes with feed()"""
+    def __init__(self, source_name, limit=None):
+        self.source_name = source_name
+        self.limit = limit
+        self.items = []
+        self.item = None
+        self.field = None
+        self.buffer = []
+        self.buffered = 0
+
+        self.parser = xml.parsers.expat.ParserCreate()
+        # Неизвестные сущности (&nbsp; и т.п.) приходят в SkippedEntityHandler вместо ошибки
+        self.parser.UseForeignDTD(True)
+        self.parser.SetParamEntityParsing(xml.parsers.expat.XML_PARAM_ENTITY_PARSING_UNLESS_STANDALONE)
+        self.parser.buffer_text = True
+        self.parser.StartElementHandler = self.start
+        self.parser.EndElementHandler = self.end
+        self.parser.CharacterDataHandler = self.data
+        self.parser.SkippedEntityHandler = self.skipped_entity
+
+    def start(self, name, attrs):
+        if self.item is None:
+            if name in ITEM_TAGS:
+                self.item = {}
+            return
+        if self.field is not None:
+            return
+        # Atom: <link href="..." rel="alternate"/>
+        if name in LINK_TAGS and "href" in attrs and "url" not in self.item:
+            if attrs.get("rel", "alternate") == "alternate":
+                self.item["url"] = attrs["href"].strip()
+            return
+        if name in TITLE_TAGS or name in LINK_TAGS or name in DESC_TAGS or name in DATE_TAGS:
+            self.field = name
+            self.buffer = []
+            self.buffered = 0
+
+    def data(self, text):
+        if self.field is not None and self.buffered < MAX_FIELD_CHARS:
+            self.buffer.append(text)
+            self.buffered += len(text)
+
+    def skipped_entity(self, name, is_parameter_entity):
+        self.data(f"&{name};")
+
+    def end(self, name):
+        if self.item is None:
+            return
+        if name == self.field:
+            self.store_field(name, "".join(self.buffer)[:MAX_FIELD_CHARS])
+            self.field = None
+            self.buffer = []
+        elif self.field is None and name in ITEM_TAGS:
+            self.finish_item()
+
+    def store_field(self, name, text):
+        item = self.item
+        if name in TITLE_TAGS and "title" not in item:
+            item["title"] = html_to_text(text)
+        elif name in LINK_TAGS and "url" not in item and text.strip():
+            item["url"] = text.strip()
+        elif name in DESC_TAGS and "content" not in item:
+            item["content"] = html_to_text(text)[:MAX_CONTENT_CHARS]
+        elif name in DATE_TAGS and "pubdate" not in item:
+            item["pubdate"] = text.strip()
+
+    def finish_item(self):
+        item, self.item = self.item, None
+        if item.get("title") and item.get("url"):
+            self.items.append({
+                "source": self.source_name,
+                "title": item["title"],
+                "url": item["url"],
+                "content": item.get("content", ""),
+                "pubdate": item.get("pubdate")
+            })
+            if self.limit and len(self.items) >= self.limit:
+                raise _LimitReached()
+
+    def feed(self, chunk, final=False):
+        """Feed a chunk of bytes; returns False once the limit is reached"""
+        try:
+            self.parser.Parse(chunk, final)
+        except _LimitReached:
+            return False
+        return True
+
+def parse_feed(chunks, source_name, limit=None):
+    """Parse RSS/Atom from an iterable of byte chunks
+
+    Stops reading as soon as `limit` items are collected. On malformed XML
+    the items parsed so far are returned.
+    """
+    parser = FeedParser(source_name, limit)
+    try:
+        for chunk in chunks:
+            if isinstance(chunk, str):
+                chunk = chunk.encode("utf-8")
+            if not parser.feed(chunk):
+                return parser.items
+        parser.feed(b"", final=True)
+    except xml.parsers.expat.ExpatError as e:
+        print(f"Feed parse error ({source_name}): {e}")
+    return parser.items
+
+def parse_feed_response(response, source_name, limit=None):
+    """Parse a streaming HTTP response, closing it when done"""
+    try:
+        return parse_feed(response.iter_content(), source_name, limit)
+    finally:
+        response.close()
+
+# --- Benchmark против прежних regex-парсеров ---
+
+def _regex_parse_blog_crawler(xml_content, source_name):
+    """Previous crawlers/blog_crawler.parse_rss (without the 20-item cut)"""
+    items = []
+    for item_match in re.finditer(r'<item>(.*?)</item>', xml_content, re.DOTALL):
+        item_content = item_match.group(1)
+        title = re.search(r'<title>(.*?)</title>', item_content, re.DOTALL)
+        link = re.search(r'<link>(.*?)</link>', item_content, re.DOTALL)
+        desc = re.search(r'<description>(.*?)</description>', item_content, re.DOTALL)
+        pubdate = re.search(r'<pubDate>(.*?)</pubDate>', item_content, re.DOTALL)
+        if title and link:
+            desc_text = ""
+            if desc:
+                desc_text = re.sub(r'<!\[CDATA\[(.*?)\]\]>', r'\1', desc.group(1))
+                desc_text = re.sub(r'<[^>]+>', '', desc_text)[:500]
+            items.append({
+                "source": source_name,
+                "title": re.sub(r'<!\[CDATA\[(.*?)\]\]>', r'\1', title.group(1)).strip(),
+                "url": link.group(1).strip(),
+                "content": desc_text,
+                "pubdate": pubdate.group(1) if pubdate else None
+            })
+    return items
+
+def _regex_parse_blog_crawlers(xml_content, source_name):
+    """Previous crawlers/blog_crawlers.parse_rss"""
+    from html.parser import HTMLParser
+
+    class SimpleHTMLParser(HTMLParser):
+        def __init__(self):
+            super().__init__()
+            self.text = []
+
+        def handle_data(self, data):
+            self.text.append(data.strip())
+
+        def get_text(self):
+            return ' '.join(filter(None, self.text))
+
+    items = []
+    matches = re.findall(r'<(?:item|entry)>(.*?)</(?:item|entry)>', xml_content, re.DOTALL | re.IGNORECASE)
+    for match in matches:
+        item = {}
+        title_match = re.search(r'<title[^>]*>(?:<!\[CDATA\[)?(.*?)(?:\]\]>)?</title>', match, re.DOTALL)
+        if title_match:
+            item['title'] = re.sub(r'<[^>]+>', '', title_match.group(1)).strip()
+        link_match = re.search(r'<link[^>]*>([^<]+)</link>', match) or \
+                     re.search(r'<link[^>]*href="([^"]+)"', match)
+        if link_match:
+            item['url'] = link_match.group(1).strip()
+        desc_match = re.search(r'<(?:description|summary)[^>]*>(?:<!\[CDATA\[)?(.*?)(?:\]\]>)?</(?:description|summary)>',
+                               match, re.DOTALL)
+        if desc_match:
+            parser = SimpleHTMLParser()
+            parser.feed(desc_match.group(1))
+            item['description'] = parser.get_text()[:500]
+        date_match = re.search(r'<(?:pubDate|published|updated)[^>]*>([^<]+)</(?:pubDate|published|updated)>', match)
+        if date_match:
+            item['date'] = date_match.group(1).strip()
+        if item.get('title') and item.get('url'):
+            item['source'] = source_name
+            items.append(item)
+    return items
+
+def make_synthetic_feed(items, kind="rss"):
+    """Build a synthetic RSS or Atom document with `items` entries"""
+    body = "<p>Claude and MCP agents " + "lorem ipsum dolor sit amet " * 40 + "</p>"
+    parts = []
+    if kind == "atom":
+        parts.append('<?xml version="1.0" encoding="utf-8"?>\n<feed xmlns="http://www.w3.org/2005/Atom"><title>Bench</title>')
+        for i in range(items):
+            parts.append(f'<entry><title>Post {i}</title><link href="https://example.com/{i}"/>'
+                         f'<updated>2026-01-{i % 28 + 1:02d}T00:00:00Z</updated>'
+                         f'<summary type="html">{html.escape(body)}</summary></entry>')
+        parts.append('</feed>')
+    else:
+        parts.append('<?xml version="1.0" encoding="utf-8"?>\n<rss version="2.0"><channel><title>Bench</title>')
+        for i in range(items):
+            parts.append(f'<item><title><![CDATA[Post {i}]]></title><link>https://example.com/{i}</link>'
+                         f'<pubDate>Mon, 05 Jan 2026 10:00:00 GMT</pubDate>'
+                         f'<description><![CDATA[{body}]]></description></item>')
+        parts.append('</channel></rss>')
+    return "".join(parts)
+
+def _chunks(data, size=65536):
+    for i in range(0, len(data), size):
+        yield data[i:i + size]
+
+def benchmark(items=(1000, 10000), limit=20):
+    """Compare the streaming parser with the previous regex parsers"""
+    import tracemalloc
+
+    def measure(fn):
+        tracemalloc.start()
+        start = time.perf_counter()
+        count = len(fn())
+        elapsed = time.perf_counter() - start
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        return {"items": count, "ms": round(elapsed * 1000, 1), "peak_kb": peak // 1024}
+
+    results = []
+    for kind in ("rss", "atom"):
+        for n in items:
+            text = make_synthetic_feed(n, kind)
+            raw = text.encode("utf-8")
+            row = {"feed": kind, "entries": n, "size_kb": len(raw) // 1024,
+                   "stream_full": measure(lambda: parse_feed(_chunks(raw), "bench")),
+                   "stream_limit": measure(lambda: parse_feed(_chunks(raw), "bench", limit)),
+                   "regex_blog_crawlers": measure(lambda: _regex_parse_blog_crawlers(text, "bench"))}
+            if kind == "rss":
+                row["regex_blog_crawler"] = measure(lambda: _regex_parse_blog_crawler(text, "bench"))
+            results.append(row)
+    return results
+
+if __name__ == "__main__":
+    cmd = sys.argv[1] if len(sys.argv) > 1 else "bench"
+
+    if cmd == "bench":
+        for r in benchmark():
+            print(json.dumps(r))
+    elif cmd == "parse" and len(sys.argv) > 2:
+        with open(sys.argv[2], "rb") as f:
+            items = parse_feed(iter(lambda: f.read(65536), b""), Path(sys.argv[2]).stem)
+        print(json.dumps(items, indent=2, ensure_ascii=False))
@@ -5,15 +5,40 @@ GitHub Advanced Crawler - расширенный мониторинг репоз
 - Поиск "восходящих звезд" (молодые быстрорастущие проекты)
 - Watchlist для интересных проектов
 """
-import sqlite3
+import os
+import sys
 import json
-import urllib.request
-import ssl
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 from pathlib import Path
+from urllib.parse import quote_plus
 
-DB_PATH = Path(__file__).parent.parent / "knowledge" / "news.db"
-ssl._create_default_https_context = ssl._create_unverified_context
+BASE_DIR = Path(__file__).parent.parent
+DB_PATH = BASE_DIR / "knowledge" / "news.db"
+
+sys.path.insert(0, str(BASE_DIR))
+import http_client
+import storage
+import migrations
+
+GITHUB_API = "https://api.github.com"
+GITHUB_TOKEN = os.environ.get("GITHUB_TOKEN", "")
+
+# Параллельный поиск в пределах rate limit
+SEARCH_WORKERS = 4
+MAX_RATE_LIMIT_WAIT = 70     # максимум секунд ожидания сброса лимита
+MAX_RATE_LIMIT_RETRIES = 2
+
+# Обновление watchlist через GraphQL (нужен GITHUB_TOKEN)
+GRAPHQL_BATCH_SIZE = 100     # репозиториев в одном запросе
+GRAPHQL_WORKERS = 2
+
+# Хранение истории звёзд: сырые точки -> часовые -> дневные сводки
+HISTORY_RAW_DAYS = 7         # старше - сворачиваются в github_history_hourly
+HISTORY_HOURLY_DAYS = 90     # старше - сворачиваются в github_history_daily
+GROWTH_DAYS = 7
 
 # Категории поиска
 SEARCH_QUERIES = [
@@ -38,46 +63,152 @@ MIN_STARS_PER_DAY_RISING = 0.5   # Минимум звезд в день для
 
 def init_watchlist_table():
     """Initialize watchlist table"""
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
-    c.execute('''CREATE TABLE IF NOT EXISTS github_watchlist (
-        id INTEGER PRIMARY KEY,
-        repo_name TEXT UNIQUE,
-        url TEXT,
-        description TEXT,
-        stars INTEGER,
-        forks INTEGER,
-        language TEXT,
-        category TEXT,
-        status TEXT DEFAULT 'watching',
-        is_rising_star BOOLEAN DEFAULT 0,
-        stars_per_day REAL,
-        created_at TEXT,
-        first_seen TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-        last_updated TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-        notes TEXT
-    )''')
-    
-    c.execute('''CREATE TABLE IF NOT EXISTS github_history (
-        id INTEGER PRIMARY KEY,
-        repo_name TEXT,
-        stars INTEGER,
-        forks INTEGER,
-        recorded_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-    )''')
-    conn.commit()
-    conn.close()
+    migrations.migrate(DB_PATH)
+
+def github_headers():
+    headers = {"Accept": "application/vnd.github.v3+json"}
+    if GITHUB_TOKEN:
+        headers["Authorization"] = f"Bearer {GITHUB_TOKEN}"
+    return headers
+
+class RateLimitBudget:
+    """Token bucket over the GitHub rate-limit window
+
+    Tokens come from X-RateLimit-Remaining; when they run out, callers wait
+    until X-RateLimit-Reset (up to MAX_RATE_LIMIT_WAIT) instead of firing
+    requests that would be rejected with 403.
+    """
+    def __init__(self, remaining=None, limit=None, reset_at=None, max_wait=MAX_RATE_LIMIT_WAIT):
+        self.cond = threading.Condition()
+        self.remaining = remaining
+        self.limit = limit
+        self.reset_at = reset_at
+        self.max_wait = max_wait
+        self.in_flight = 0
+        self.waiting_reset = False
+        self.used = 0
+        self.waited = 0.0
+        self.rate_limited = 0
+        self.skipped = 0
+
+    @classmethod
+    def from_api(cls, resource="search"):
+        """Read the current budget from /rate_limit (free of charge)"""
+        try:
+            resp = http_client.request("GET", f"{GITHUB_API}/rate_limit",
+                                       headers=github_headers(), timeout=15)
+            if resp.ok:
+                data = resp.json()["resources"][resource]
+                return cls(data["remaining"], data["limit"], data["reset"])
+        except Exception as e:
+            print(f"GitHub rate_limit error: {e}")
+        return cls()
+
+    def acquire(self):
+        """Take a token, waiting for the window reset if needed; False if out of budget"""
+        with self.cond:
+            while True:
+                # Лимит неизвестен - пропускаем по одному запросу, пока не придут заголовки
+                if self.remaining is None:
+                    if self.in_flight == 0:
+                        break
+                elif self.remaining - self.in_flight > 0:
+                    break
+                elif self.reset_at is not None and self.in_flight == 0 and not self.waiting_reset:
+                    wait = self.reset_at - time.time() + 1
+                    left = http_client.time_left()
+                    # Окно сбрасывается позже срока цикла - ждать бессмысленно
+                    if wait > self.max_wait or (left is not None and wait > left):
+                        self.skipped += 1
+                        return False
+                    # Ждёт сброса окна один поток, остальные ждут его
+                    self.waiting_reset = True
+                    deadline = time.time() + wait
+                    while time.time() < deadline:
+                        self.cond.wait(deadline - time.time())
+                    self.waited += max(wait, 0)
+                    self.waiting_reset = False
+                    self.remaining = self.limit
+                    self.reset_at = None
+                    self.cond.notify_all()
+                    continue
+                elif self.in_flight == 0 and not self.waiting_reset:
+                    self.skipped += 1
+                    return False
+                self.cond.wait(1)
+            self.in_flight += 1
+            self.used += 1
+            return True
+
+    def release(self, headers, rate_limited=False):
+        """Return the token and update the budget from response headers"""
+        with self.cond:
+            self.in_flight -= 1
+            remaining = headers.get("x-ratelimit-remaining")
+            reset_at = headers.get("x-ratelimit-reset")
+            if headers.get("x-ratelimit-limit"):
+                self.limit = int(headers["x-ratelimit-limit"])
+            if reset_at is not None and (self.reset_at is None or int(reset_at) > self.reset_at):
+                self.reset_at = int(reset_at)
+                self.remaining = None
+            if remaining is not None:
+                remaining = int(remaining)
+                self.remaining = remaining if self.remaining is None else min(self.remaining, remaining)
+            if rate_limited:
+                self.rate_limited += 1
+                self.remaining = 0
+                retry_after = headers.get("retry-after")
+                if retry_after:
+                    self.reset_at = int(time.time() + int(retry_after))
+            self.cond.notify_all()
+
+    def summary(self):
+        with self.cond:
+            return {
+                "used": self.used,
+                "remaining": self.remaining,
+                "limit": self.limit,
+                "reset_at": self.reset_at,
+                "waited_seconds": round(self.waited, 1),
+                "rate_limited": self.rate_limited,
+                "skipped": self.skipped
+            }
+
+def fetch_github_budgeted(url, budget):
+    """Fetch GitHub API within the rate-limit budget, retrying after a reset"""
+    for _ in range(MAX_RATE_LIMIT_RETRIES + 1):
+        if not budget.acquire():
+            print(f"GitHub rate limit exhausted, skipping {url}")
+            return None
+        headers = {}
+        try:
+            resp = http_client.request("GET", url, headers=github_headers(), timeout=15)
+            headers = resp.headers
+        except Exception as e:
+            budget.release(headers)
+            print(f"GitHub API error: {e}")
+            return None
+        
+        rate_limited = resp.status in (403, 429) and (
+            headers.get("x-ratelimit-remaining") == "0" or "retry-after" in headers)
+        budget.release(headers, rate_limited)
+        if rate_limited:
+            continue
+        if not resp.ok:
+            print(f"GitHub API error: HTTP {resp.status}")
+            return None
+        return resp.json()
+    return None
 
 def fetch_github(url):
     """Fetch GitHub API with rate limit handling"""
-    headers = {
-        "User-Agent": "AGI-News-Agent/1.0",
-        "Accept": "application/vnd.github.v3+json"
-    }
+    headers = github_headers()
     try:
-        req = urllib.request.Request(url, headers=headers)
-        with urllib.request.urlopen(req, timeout=15) as response:
-            return json.loads(response.read().decode('utf-8'))
+        resp = http_client.request("GET", url, headers=headers, timeout=15)
+        if not resp.ok:
+            print(f"GitHub API error: HTTP {resp.status}")
+            return None
+        return resp.json()
     except Exception as e:
         print(f"GitHub API error: {e}")
         return None
@@ -100,17 +231,25 @@ def is_rising_star(repo):
         stars_per_day >= MIN_STARS_PER_DAY_RISING
     )
 
-def search_github_repos():
-    """Search GitHub for relevant repos"""
-    all_repos = []
+def search_github_repos(budget=None, workers=SEARCH_WORKERS):
+    """Search GitHub for relevant repos
+
+    Queries run in parallel within the search rate-limit budget.
+    """
+    budget = budget or RateLimitBudget.from_api("search")
+    
+    def run_query(search):
+        query = quote_plus(search["q"])
+        url = f"{GITHUB_API}/search/repositories?q={query}&sort=stars&order=desc&per_page=30"
+        return fetch_github_budgeted(url, budget)
+    
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        responses = list(executor.map(run_query, SEARCH_QUERIES))
     
-    for search in SEARCH_QUERIES:
-        query = search["q"].replace(" ", "+")
+    all_repos = []
+    for search, data in zip(SEARCH_QUERIES, responses):
         category = search["category"]
         
-        url = f"https://api.github.com/search/repositories?q={query}&sort=stars&order=desc&per_page=30"
-        data = fetch_github(url)
-        
         if not data or "items" not in data:
             continue
         
@@ -145,59 +284,53 @@ def search_github_repos():
 
 def update_watchlist(repos):
     """Update watchlist with new/updated repos"""
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
-    
-    new_repos = 0
-    updated = 0
+    repos = {repo["name"]: repo for repo in repos}
     rising_stars = []
     high_value = []
+    history = []
     
-    for repo in repos:
-        # Check if exists
-        c.execute("SELECT stars FROM github_watchlist WHERE repo_name = ?", (repo["name"],))
-        existing = c.fetchone()
-        
-        if existing:
-            old_stars = existing[0]
-            # Record history
-            c.execute('''INSERT INTO github_history (repo_name, stars, forks)
-                         VALUES (?, ?, ?)''', (repo["name"], repo["stars"], repo["forks"]))
-            
-            # Update
-            c.execute('''UPDATE github_watchlist SET
-                         stars = ?, forks = ?, stars_per_day = ?,
-                         is_rising_star = ?, last_updated = CURRENT_TIMESTAMP
-                         WHERE repo_name = ?''',
-                      (repo["stars"], repo["forks"], repo["stars_per_day"],
-                       repo["is_rising_star"], repo["name"]))
-            updated += 1
-            
-            # Check for significant growth
-            if repo["stars"] > old_stars * 1.1:  # 10% growth
-                high_value.append(repo)
-        else:
-            # New repo
-            c.execute('''INSERT INTO github_watchlist 
+    with storage.transaction(DB_PATH) as conn:
+        # Один UPSERT на пачку: prev_stars получает звёзды до обновления и
+        # возвращается через RETURNING, у новых строк он NULL
+        returned = storage.values_many(conn, '''INSERT INTO github_watchlist
                          (repo_name, url, description, stars, forks, language,
                           category, is_rising_star, stars_per_day, created_at)
-                         VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)''',
-                      (repo["name"], repo["url"], repo["description"],
-                       repo["stars"], repo["forks"], repo["language"],
-                       repo["category"], repo["is_rising_star"],
-                       repo["stars_per_day"], repo["created_at"]))
-            new_repos += 1
-            
-            # Track rising stars
-            if repo["is_rising_star"]:
-                rising_stars.append(repo)
-            
-            # Track high-value established repos
-            if repo["stars"] >= MIN_STARS_ESTABLISHED:
-                high_value.append(repo)
-    
-    conn.commit()
-    conn.close()
+                         VALUES {}
+                         ON CONFLICT(repo_name) DO UPDATE SET
+                         prev_stars = COALESCE(github_watchlist.stars, 0),
+                         prev_forks = COALESCE(github_watchlist.forks, 0),
+                         stars = excluded.stars, forks = excluded.forks,
+                         stars_per_day = excluded.stars_per_day,
+                         is_rising_star = excluded.is_rising_star,
+                         last_updated = CURRENT_TIMESTAMP
+                         RETURNING repo_name, prev_stars, prev_forks''',
+                         [(repo["name"], repo["url"], repo["description"],
+                           repo["stars"], repo["forks"], repo["language"],
+                           repo["category"], repo["is_rising_star"],
+                           repo["stars_per_day"], repo["created_at"]) for repo in repos.values()])
+        
+        new_repos = updated = 0
+        for name, prev_stars, prev_forks in returned:
+            repo = repos[name]
+            if prev_stars is None:
+                new_repos += 1
+                # Track rising stars
+                if repo["is_rising_star"]:
+                    rising_stars.append(repo)
+                # Track high-value established repos
+                if repo["stars"] >= MIN_STARS_ESTABLISHED:
+                    high_value.append(repo)
+            else:
+                updated += 1
+                # Точку истории пишем только при изменении
+                if (repo["stars"], repo["forks"]) != (prev_stars, prev_forks):
+                    history.append((name, repo["stars"], repo["forks"]))
+                # Check for significant growth
+                if repo["stars"] > prev_stars * 1.1:  # 10% growth
+                    high_value.append(repo)
+        
+        # Record history
+        storage.insert_many(conn, "github_history", ("repo_name", "stars", "forks"), history)
     
     return {
         "new_repos": new_repos,
@@ -208,7 +341,7 @@ def update_watchlist(repos):
 
 def get_watchlist_summary():
     """Get watchlist summary"""
-    conn = sqlite3.connect(DB_PATH)
+    conn = storage.connect(DB_PATH)
     c = conn.cursor()
     
     # Top by stars
@@ -232,7 +365,161 @@ def get_watchlist_summary():
     return {
         "top_by_stars": top_stars,
         "rising_stars": rising,
-        "by_category": categories
+        "by_category": categories,
+        "growth": get_star_growth()
+    }
+
+def rollup_history(c, source, target, bucket, cutoff):
+    """Fold rows of `source` older than cutoff into `target` buckets and delete them
+
+    source is github_history (raw points) or github_history_hourly; buckets
+    already in target are merged (min/max widened, last point kept).
+    """
+    if source == "github_history":
+        points = '''SELECT repo_name, recorded_at AS at, stars AS min_s, stars AS max_s, stars AS last_s,
+                          forks AS min_f, forks AS max_f, forks AS last_f, 1 AS n, id AS seq
+                   FROM github_history WHERE recorded_at < :cutoff'''
+        time_column = "recorded_at"
+    else:
+        points = f'''SELECT repo_name, last_at AS at, min_stars AS min_s, max_stars AS max_s,
+                           last_stars AS last_s, min_forks AS min_f, max_forks AS max_f,
+                           last_forks AS last_f, samples AS n, 0 AS seq
+                    FROM {source} WHERE bucket < :cutoff'''
+        time_column = "bucket"
+    c.execute(f'''INSERT INTO {target} (repo_name, bucket, min_stars, max_stars, last_stars,
+                                         min_forks, max_forks, last_forks, last_at, samples)
+                  SELECT repo_name, b, MIN(min_s), MAX(max_s),
+                         MAX(CASE WHEN rn = 1 THEN last_s END),
+                         MIN(min_f), MAX(max_f),
+                         MAX(CASE WHEN rn = 1 THEN last_f END),
+                         MAX(at), SUM(n)
+                  FROM (SELECT *, strftime(:bucket, at) AS b,
+                               ROW_NUMBER() OVER (PARTITION BY repo_name, strftime(:bucket, at)
+                                                  ORDER BY at DESC, seq DESC) AS rn
+                        FROM ({points}))
+                  WHERE true
+                  GROUP BY repo_name, b
+                  ON CONFLICT(repo_name, bucket) DO UPDATE SET
+                      min_stars = MIN(min_stars, excluded.min_stars),
+                      max_stars = MAX(max_stars, excluded.max_stars),
+                      min_forks = MIN(min_forks, excluded.min_forks),
+                      max_forks = MAX(max_forks, excluded.max_forks),
+                      last_stars = CASE WHEN excluded.last_at >= last_at THEN excluded.last_stars ELSE last_stars END,
+                      last_forks = CASE WHEN excluded.last_at >= last_at THEN excluded.last_forks ELSE last_forks END,
+                      last_at = MAX(last_at, excluded.last_at),
+                      samples = samples + excluded.samples''',
+              {"cutoff": cutoff, "bucket": bucket})
+    rolled = c.rowcount
+    c.execute(f"DELETE FROM {source} WHERE {time_column} < ?", (cutoff,))
+    return rolled, c.rowcount
+
+def compact_history(raw_days=HISTORY_RAW_DAYS, hourly_days=HISTORY_HOURLY_DAYS):
+    """Downsample old raw history to hourly and old hourly rollups to daily"""
+    migrations.migrate(DB_PATH)
+    with storage.transaction(DB_PATH) as conn:
+        c = conn.cursor()
+        # Границы выровнены по часу/дню, чтобы не резать корзину пополам
+        c.execute("SELECT strftime('%Y-%m-%d %H:00:00', 'now', ?), date('now', ?)",
+                  (f"-{raw_days} days", f"-{hourly_days} days"))
+        raw_cutoff, hourly_cutoff = c.fetchone()
+        hourly, raw_removed = rollup_history(c, "github_history", "github_history_hourly",
+                                             "%Y-%m-%d %H:00:00", raw_cutoff)
+        daily, hourly_removed = rollup_history(c, "github_history_hourly", "github_history_daily",
+                                               "%Y-%m-%d", hourly_cutoff)
+    return {
+        "raw_removed": raw_removed,
+        "hourly_buckets": hourly,
+        "hourly_removed": hourly_removed,
+        "daily_buckets": daily
+    }
+
+def get_star_growth(days=GROWTH_DAYS, limit=10):
+    """Repos with the largest star gain over `days` (raw points and rollups alike)"""
+    conn = storage.connect(DB_PATH)
+    c = conn.cursor()
+    # Точки пишутся только при изменении: база - последняя точка не позже начала окна
+    c.execute('''SELECT w.repo_name, w.stars, w.stars - base.stars AS growth
+                 FROM github_watchlist w
+                 JOIN (SELECT repo_name, stars, MAX(recorded_at) FROM github_history_series
+                       WHERE recorded_at <= datetime('now', ?) GROUP BY repo_name) base
+                   USING (repo_name)
+                 ORDER BY growth DESC LIMIT ?''', (f"-{days} days", limit))
+    results = c.fetchall()
+    conn.close()
+    return results
+
+def build_graphql_query(repo_names):
+    """One GraphQL query with an aliased repository() field per repo"""
+    fields = []
+    for i, full_name in enumerate(repo_names):
+        owner, _, name = full_name.partition("/")
+        fields.append(f"r{i}: repository(owner: {json.dumps(owner)}, name: {json.dumps(name)}) "
+                      "{ stargazerCount forkCount pushedAt createdAt }")
+    return "query { " + " ".join(fields) + " rateLimit { cost remaining resetAt } }"
+
+def fetch_repo_batch(repo_names):
+    """Fetch stars/forks/pushed_at for up to GRAPHQL_BATCH_SIZE repos in one request"""
+    headers = {"Authorization": f"Bearer {GITHUB_TOKEN}"} if GITHUB_TOKEN else {}
+    try:
+        resp = http_client.post_json(f"{GITHUB_API}/graphql", {"query": build_graphql_query(repo_names)},
+                                     headers=headers, timeout=30, record=True)
+        if not resp.ok:
+            print(f"GitHub GraphQL error: HTTP {resp.status}")
+            return None
+        data = resp.json().get("data") or {}
+    except Exception as e:
+        print(f"GitHub GraphQL error: {e}")
+        return None
+    
+    # Удалённые/переименованные репозитории приходят как null
+    return {name: data[f"r{i}"] for i, name in enumerate(repo_names) if data.get(f"r{i}")}
+
+def refresh_watchlist(skip=(), batch_size=GRAPHQL_BATCH_SIZE, workers=GRAPHQL_WORKERS):
+    """Refresh every tracked repo via batched GraphQL requests
+
+    Stars, forks and pushed_at are written back in bulk and appended to
+    github_history. Repos listed in `skip` (already updated from search
+    results this run) are not requested.
+    """
+    conn = storage.connect(DB_PATH)
+    c = conn.cursor()
+    c.execute("SELECT repo_name FROM github_watchlist")
+    skip = set(skip)
+    names = [r[0] for r in c.fetchall() if r[0] not in skip and "/" in r[0]]
+    conn.close()
+    
+    batches = [names[i:i + batch_size] for i in range(0, len(names), batch_size)]
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        results = list(executor.map(fetch_repo_batch, batches))
+    
+    updates = []
+    history = []
+    for batch in results:
+        for name, repo in (batch or {}).items():
+            repo = {"created_at": repo["createdAt"], "stargazers_count": repo["stargazerCount"],
+                    "forks_count": repo["forkCount"], "pushed_at": repo["pushedAt"]}
+            stars_per_day, _ = calculate_growth_rate(repo)
+            updates.append((repo["stargazers_count"], repo["forks_count"], repo["pushed_at"],
+                            round(stars_per_day, 2), is_rising_star(repo), name))
+            history.append((name, repo["stargazers_count"], repo["forks_count"]))
+    
+    with storage.transaction(DB_PATH) as conn:
+        # История до UPDATE: точка пишется, только если звёзды или форки изменились
+        recorded = storage.write_many(conn, '''INSERT INTO github_history (repo_name, stars, forks)
+                     SELECT ?1, ?2, ?3 WHERE NOT EXISTS (
+                         SELECT 1 FROM github_watchlist
+                         WHERE repo_name = ?1 AND stars IS ?2 AND forks IS ?3)''', history)
+        storage.write_many(conn, '''UPDATE github_watchlist SET
+                     stars = ?, forks = ?, pushed_at = ?, stars_per_day = ?,
+                     is_rising_star = ?, last_updated = CURRENT_TIMESTAMP
+                     WHERE repo_name = ?''', updates)
+    
+    return {
+        "tracked": len(names),
+        "requests": len(batches),
+        "failed_requests": sum(1 for r in results if r is None),
+        "refreshed": len(updates),
+        "history_points": recorded
     }
 
 def crawl_and_update():
@@ -241,16 +528,140 @@ def crawl_and_update():
     init_watchlist_table()
     
     print("Searching GitHub...")
-    repos = search_github_repos()
+    budget = RateLimitBudget.from_api("search")
+    repos = search_github_repos(budget)
     print(f"Found {len(repos)} repos")
     
     print("Updating watchlist...")
     result = update_watchlist(repos)
+    result["rate_limit"] = budget.summary()
+    
+    if GITHUB_TOKEN:
+        print("Refreshing watchlist...")
+        result["refresh"] = refresh_watchlist(skip=[r["name"] for r in repos])
+        print(f"Refreshed: {result['refresh']['refreshed']} repos in {result['refresh']['requests']} requests")
+    
+    result["history"] = compact_history()
     
     print(f"New: {result['new_repos']}, Updated: {result['updated']}")
     print(f"Rising stars: {len(result['rising_stars'])}")
     print(f"High value: {len(result['high_value'])}")
+    print(f"Search budget used: {result['rate_limit']['used']}, remaining: {result['rate_limit']['remaining']}")
+    
+    return result
+
+def selftest(limit=5, window=2):
+    """Run the search against a local stand-in GitHub API that enforces limits"""
+    from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+    
+    global GITHUB_API
+    state = {"remaining": limit, "reset": time.time() + window, "rejected": 0, "served": 0}
+    lock = threading.Lock()
+    
+    class FakeGitHub(BaseHTTPRequestHandler):
+        def do_GET(self):
+            with lock:
+                if time.time() >= state["reset"]:
+                    state.update(remaining=limit, reset=time.time() + window)
+                if self.path.startswith("/rate_limit"):
+                    body = {"resources": {"search": {"limit": limit, "remaining": state["remaining"],
+                                                     "reset": int(state["reset"])}}}
+                    status = 200
+                elif state["remaining"] <= 0:
+                    state["rejected"] += 1
+                    body, status = {"message": "API rate limit exceeded"}, 403
+                else:
+                    state["remaining"] -= 1
+                    state["served"] += 1
+                    body, status = {"items": [{
+                        "full_name": f"demo/{self.path.split('q=')[1].split('&')[0]}",
+                        "html_url": "https://github.com/demo", "description": "demo",
+                        "stargazers_count": 50, "forks_count": 1, "language": "Python",
+                        "created_at": datetime.now().strftime("%Y-%m-%dT00:00:00Z")}]}, 200
+                headers = {"X-RateLimit-Limit": limit, "X-RateLimit-Remaining": state["remaining"],
+                           "X-RateLimit-Reset": int(state["reset"])}
+            data = json.dumps(body).encode()
+            self.send_response(status)
+            for k, v in headers.items():
+                self.send_header(k, str(v))
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+        
+        def log_message(self, *args):
+            pass
+    
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FakeGitHub)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    saved_api = GITHUB_API
+    GITHUB_API = f"http://127.0.0.1:{server.server_address[1]}"
+    try:
+        budget = RateLimitBudget.from_api("search")
+        repos = search_github_repos(budget)
+    finally:
+        GITHUB_API = saved_api
+        server.shutdown()
+    
+    summary = budget.summary()
+    assert len(repos) == len(SEARCH_QUERIES), repos
+    assert state["served"] == len(SEARCH_QUERIES), state
+    assert summary["waited_seconds"] > 0, summary
+    return {"repos": len(repos), "rejected_by_server": state["rejected"], "budget": summary}
+
+def selftest_refresh(repos=250):
+    """Refresh a synthetic watchlist against a local stand-in GraphQL endpoint"""
+    from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+    import re
+    import tempfile
+    
+    global GITHUB_API, DB_PATH
+    requests = []
+    
+    class FakeGraphQL(BaseHTTPRequestHandler):
+        def do_POST(self):
+            query = json.loads(self.rfile.read(int(self.headers["Content-Length"])))["query"]
+            requests.append(query)
+            data = {}
+            for alias, owner, name in re.findall(r'(r\d+): repository\(owner: "([^"]*)", name: "([^"]*)"\)', query):
+                idx = int(name.split("-")[1])
+                data[alias] = None if idx % 50 == 0 else {
+                    "stargazerCount": 100 + idx, "forkCount": idx,
+                    "pushedAt": "2026-01-01T00:00:00Z", "createdAt": "2025-12-01T00:00:00Z"}
+            body = json.dumps({"data": data}).encode()
+            self.send_response(200)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        
+        def log_message(self, *args):
+            pass
+    
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FakeGraphQL)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    saved = (GITHUB_API, DB_PATH)
+    with tempfile.TemporaryDirectory() as tmp:
+        GITHUB_API = f"http://127.0.0.1:{server.server_address[1]}"
+        DB_PATH = Path(tmp) / "news.db"
+        try:
+            init_watchlist_table()
+            conn = storage.connect(DB_PATH)
+            conn.executemany("INSERT INTO github_watchlist (repo_name, stars) VALUES (?, 0)",
+                             [(f"demo/repo-{i}",) for i in range(repos)])
+            conn.commit()
+            conn.close()
+            result = refresh_watchlist()
+            conn = storage.connect(DB_PATH)
+            history = conn.execute("SELECT COUNT(*) FROM github_history").fetchone()[0]
+            stars = conn.execute("SELECT stars FROM github_watchlist WHERE repo_name = 'demo/repo-7'").fetchone()[0]
+            conn.close()
+        finally:
+            GITHUB_API, DB_PATH = saved
+            server.shutdown()
     
+    expected = repos - len(range(0, repos, 50))
+    assert len(requests) == -(-repos // GRAPHQL_BATCH_SIZE), len(requests)
+    assert result["refreshed"] == history == expected, (result, history)
+    assert stars == 107, stars
     return result
 
 if __name__ == "__main__":
@@ -283,3 +694,13 @@ if __name__ == "__main__":
         summary = get_watchlist_summary()
         for r in summary["rising_stars"]:
             print(f"{r[0]}|{r[1]}|{r[2]}|{r[3]}")
+    elif cmd == "refresh":
+        init_watchlist_table()
+        print(json.dumps(refresh_watchlist(), indent=2))
+    elif cmd == "compact":
+        print(json.dumps(compact_history(), indent=2))
+    elif cmd == "growth":
+        for name, stars, growth in get_star_growth(int(sys.argv[2]) if len(sys.argv) > 2 else GROWTH_DAYS):
+            print(f"  +{growth:<6} {name} ({stars}⭐)")
+    elif cmd == "selftest":
+        print(json.dumps({"search": selftest(), "refresh": selftest_refresh()}, indent=2))
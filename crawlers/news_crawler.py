@@ -3,23 +3,41 @@
 News Crawler - сбор новостей из разных источников
 Источники: Anthropic, Google AI, HackerNews, GitHub, ArXiv
 """
-import sqlite3
+import sys
 import json
 import re
-import urllib.request
-import ssl
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from pathlib import Path
 
-DB_PATH = Path(__file__).parent.parent / "knowledge" / "news.db"
+BASE_DIR = Path(__file__).parent.parent
+DB_PATH = BASE_DIR / "knowledge" / "news.db"
 
-# Отключаем SSL верификацию для простоты
-ssl._create_default_https_context = ssl._create_unverified_context
+sys.path.insert(0, str(BASE_DIR))
+import http_client
+import storage
+import migrations
+from http_client import fetch_url
+from matcher import keyword_matcher
+from dedup import canonicalize_url, register_inserted
+from bloom import known_urls
 
 SOURCES = {
     "hackernews": {
         "url": "https://hacker-news.firebaseio.com/v0/topstories.json",
+        "item_url": "https://hacker-news.firebaseio.com/v0/item/{id}.json",
+        "maxitem_url": "https://hacker-news.firebaseio.com/v0/maxitem.json",
+        "updates_url": "https://hacker-news.firebaseio.com/v0/updates.json",
         "type": "api",
+        "max_stories": 500,   # topstories.json отдаёт до 500 id
+        "workers": 32,        # параллельные запросы к item API
+        "cache_ttl": 900,     # через сколько секунд обновлять score подходящих историй
+        "miss_ttl": 86400,    # через сколько секунд перепроверять неподходящие истории
+        "incremental": True,  # обходить все новые item id после high-water mark
+        "batch_size": 200,    # item id за один параллельный батч
+        "max_new_items": 5000,  # потолок item id за один запуск
+        "backfill": 1000,     # сколько id назад от maxitem брать при первом запуске
         "keywords": ["ai", "llm", "anthropic", "claude", "mcp", "agent", "google", "openai", "gpt"]
     },
     "github_trending": {
@@ -28,51 +46,234 @@ SOURCES = {
     }
 }
 
-def fetch_url(url, headers=None):
-    """Fetch URL content"""
-    try:
-        req = urllib.request.Request(url, headers=headers or {"User-Agent": "AGI-News-Agent/1.0"})
-        with urllib.request.urlopen(req, timeout=10) as response:
-            return response.read().decode('utf-8')
-    except Exception as e:
-        print(f"Error fetching {url}: {e}")
-        return None
+def init_hn_cache_table():
+    """Initialize HN item cache table"""
+    migrations.migrate(DB_PATH)
+
+def init_crawler_state_table():
+    """Initialize crawler key/value state table"""
+    migrations.migrate(DB_PATH)
+
+def get_state(key, default=None):
+    conn = storage.connect(DB_PATH)
+    c = conn.cursor()
+    c.execute("SELECT value FROM crawler_state WHERE key = ?", (key,))
+    row = c.fetchone()
+    conn.close()
+    return row[0] if row else default
+
+def set_state(key, value):
+    with storage.transaction(DB_PATH) as conn:
+        c = conn.cursor()
+        c.execute('''INSERT INTO crawler_state (key, value) VALUES (?, ?)
+                     ON CONFLICT(key) DO UPDATE SET value = excluded.value,
+                         updated_at = CURRENT_TIMESTAMP''', (key, str(value)))
+
+def hn_filter_key():
+    """Identify the keyword set the cached filter decisions were made with"""
+    return ",".join(sorted(SOURCES["hackernews"]["keywords"]))
+
+def hn_matches(title):
+    """Keyword filter for HN titles"""
+    return keyword_matcher(SOURCES["hackernews"]["keywords"]).search(title)
+
+def load_cached_items(story_ids):
+    """Load cached HN items, marking the ones whose TTL has expired"""
+    if not story_ids:
+        return {}
+    config = SOURCES["hackernews"]
+    conn = storage.connect(DB_PATH)
+    c = conn.cursor()
+    placeholders = ",".join("?" * len(story_ids))
+    c.execute(f'''SELECT id, title, url, score, descendants, matched, filter_key,
+                         fetched_at < datetime('now', ?) AS hit_expired,
+                         fetched_at < datetime('now', ?) AS miss_expired
+                  FROM hn_items WHERE id IN ({placeholders})''',
+              (f"-{config['cache_ttl']} seconds", f"-{config['miss_ttl']} seconds", *story_ids))
+    key = hn_filter_key()
+    cached = {}
+    for sid, title, url, score, descendants, matched, filter_key, hit_expired, miss_expired in c.fetchall():
+        # Список ключевых слов поменялся - пересчитываем решение по сохранённому заголовку
+        if filter_key != key:
+            matched = hn_matches(title)
+        cached[sid] = {
+            "title": title, "url": url, "score": score, "descendants": descendants,
+            "matched": bool(matched), "filter_key": filter_key,
+            "expired": bool(hit_expired if matched else miss_expired)
+        }
+    conn.close()
+    return cached
+
+def store_cached_items(items):
+    """Upsert fetched HN items into the cache"""
+    if not items:
+        return
+    with storage.transaction(DB_PATH) as conn:
+        c = conn.cursor()
+        c.executemany('''INSERT INTO hn_items (id, title, url, score, descendants, matched, filter_key)
+                         VALUES (?, ?, ?, ?, ?, ?, ?)
+                         ON CONFLICT(id) DO UPDATE SET
+                             title = excluded.title, url = excluded.url, score = excluded.score,
+                             descendants = excluded.descendants, matched = excluded.matched,
+                             filter_key = excluded.filter_key, fetched_at = CURRENT_TIMESTAMP''',
+                      [(sid, i["title"], i["url"], i["score"], i["descendants"], i["matched"], i["filter_key"])
+                       for sid, i in items.items()])
+
+def fetch_hn_items(story_ids, workers=None):
+    """Fetch HN items concurrently, preserving ranking order"""
+    config = SOURCES["hackernews"]
+    workers = workers or config["workers"]
+    
+    def fetch_item(sid):
+        data = fetch_url(config["item_url"].format(id=sid))
+        if data is None:
+            return None
+        try:
+            return json.loads(data) or {}   # удалённые item приходят как null
+        except ValueError as e:
+            # Обрезанное тело - как ошибка загрузки: остальная пачка не теряется
+            print(f"Bad HN item {sid}: {e}")
+            return None
+    
+    if workers <= 1:
+        return [fetch_item(sid) for sid in story_ids]
+    
+    # executor.map отдаёт результаты в порядке входных id
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(fetch_item, story_ids))
+
+def crawl_hackernews(max_stories=None, workers=None, stats=None):
+    """Crawl HackerNews for AI-related stories
 
-def crawl_hackernews():
-    """Crawl HackerNews for AI-related stories"""
+    Only new story IDs and cached ones with an expired TTL are fetched.
+    """
     news = []
-    keywords = SOURCES["hackernews"]["keywords"]
+    config = SOURCES["hackernews"]
+    max_stories = max_stories or config["max_stories"]
     
     # Get top stories
-    data = fetch_url(SOURCES["hackernews"]["url"])
+    data = fetch_url(config["url"])
     if not data:
+        if stats is not None:
+            stats["error"] = "topstories unavailable"
         return news
     
-    story_ids = json.loads(data)[:50]  # Top 50
+    story_ids = json.loads(data)[:max_stories]
+    
+    init_hn_cache_table()
+    cached = load_cached_items(story_ids)
+    to_fetch = [sid for sid in story_ids if sid not in cached or cached[sid]["expired"]]
+    
+    key = hn_filter_key()
+    fetched = {}
+    for sid, story in zip(to_fetch, fetch_hn_items(to_fetch, workers)):
+        if story:
+            fetched[sid] = hn_story_to_cache(sid, story, key)
+    store_cached_items(fetched)
+    
+    if stats is not None:
+        stats.update(cached=len(story_ids) - len(to_fetch), fetched=len(to_fetch))
+    
+    for sid in story_ids:
+        story = fetched.get(sid) or cached.get(sid)
+        if story and story["matched"]:
+            news.append(hn_cache_to_news(story))
+    
+    return news
+
+def hn_story_to_cache(sid, story, key):
+    """Cache record for an HN story"""
+    title = story.get("title") or ""
+    return {
+        "title": title,
+        "url": story.get("url", f"https://news.ycombinator.com/item?id={sid}"),
+        "score": story.get("score", 0),
+        "descendants": story.get("descendants", 0),
+        "matched": hn_matches(title),
+        "filter_key": key
+    }
+
+def hn_cache_to_news(story):
+    return {
+        "source": "hackernews",
+        "title": story["title"],
+        "url": story["url"],
+        "content": f"HN Score: {story['score']}, Comments: {story['descendants']}"
+    }
+
+def refresh_hn_updates(workers=None):
+    """Refresh cached matching stories listed in updates.json"""
+    data = fetch_url(SOURCES["hackernews"]["updates_url"])
+    if not data:
+        return 0
+    updated_ids = json.loads(data).get("items", [])
+    cached = load_cached_items(updated_ids)
+    ids = [sid for sid in updated_ids if sid in cached and cached[sid]["matched"]]
+    
+    key = hn_filter_key()
+    refreshed = {}
+    for sid, story in zip(ids, fetch_hn_items(ids, workers)):
+        if story and story.get("title"):
+            refreshed[sid] = hn_story_to_cache(sid, story, key)
+    store_cached_items(refreshed)
+    return len(refreshed)
+
+def crawl_hackernews_incremental(workers=None, max_new_items=None, stats=None):
+    """Walk every new HN item since the last high-water mark
+
+    Items are fetched in concurrent batches; stories go through the keyword
+    filter and matches are saved batch by batch. The high-water mark stops
+    before the first item that could not be fetched, so nothing is skipped.
+    """
+    config = SOURCES["hackernews"]
+    max_new_items = max_new_items or config["max_new_items"]
+    batch_size = config["batch_size"]
+    
+    init_hn_cache_table()
+    init_crawler_state_table()
+    
+    data = fetch_url(config["maxitem_url"])
+    if not data:
+        return {"found": 0, "saved": 0}
+    maxitem = json.loads(data)
+    
+    hwm = int(get_state("hn_high_water_mark", maxitem - config["backfill"]))
+    last_id = min(maxitem, hwm + max_new_items)
+    key = hn_filter_key()
     
-    for sid in story_ids[:20]:  # Check first 20
-        story_data = fetch_url(f"https://hacker-news.firebaseio.com/v0/item/{sid}.json")
-        if not story_data:
-            continue
+    found = saved = walked = 0
+    complete = True
+    while complete and hwm < last_id:
+        ids = list(range(hwm + 1, min(hwm + batch_size, last_id) + 1))
         
-        story = json.loads(story_data)
-        title = story.get("title", "").lower()
+        stories = {}
+        for sid, item in zip(ids, fetch_hn_items(ids, workers)):
+            if item is None:
+                complete = False
+                break
+            hwm = sid
+            walked += 1
+            if item.get("type") == "story" and item.get("title") and not item.get("dead"):
+                stories[sid] = hn_story_to_cache(sid, item, key)
         
-        # Check keywords
-        if any(kw in title for kw in keywords):
-            news.append({
-                "source": "hackernews",
-                "title": story.get("title"),
-                "url": story.get("url", f"https://news.ycombinator.com/item?id={sid}"),
-                "content": f"HN Score: {story.get('score', 0)}, Comments: {story.get('descendants', 0)}"
-            })
+        store_cached_items(stories)
+        matched = [hn_cache_to_news(s) for s in stories.values() if s["matched"]]
+        found += len(matched)
+        saved += save_news(matched)
+        set_state("hn_high_water_mark", hwm)
     
-    return news
+    refreshed = refresh_hn_updates(workers)
+    
+    result = {"found": found, "saved": saved, "walked": walked, "high_water_mark": hwm,
+              "maxitem": maxitem, "refreshed": refreshed}
+    if stats is not None:
+        stats.update(result)
+    return result
 
 def crawl_github():
     """Crawl GitHub for MCP/AI related repos"""
     news = []
-    headers = {"User-Agent": "AGI-News-Agent/1.0", "Accept": "application/vnd.github.v3+json"}
+    headers = {"Accept": "application/vnd.github.v3+json"}
     
     data = fetch_url(SOURCES["github_trending"]["url"], headers)
     if not data:
@@ -92,40 +293,143 @@ def crawl_github():
 
 def save_news(news_list):
     """Save news to database"""
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
+    urls = [canonicalize_url(news["url"]) for news in news_list]
+    known = known_urls(DB_PATH)
+    migrations.migrate(DB_PATH)
+    try:
+        with storage.transaction(DB_PATH) as conn:
+            c = conn.cursor()
+            
+            # Уже известные URL отсекаются фильтром Блума (с точной проверкой в БД)
+            seen = known.known(conn, urls)
+            records = {}
+            for news, url in zip(news_list, urls):
+                if url not in seen and url not in records:
+                    records[url] = (news["source"], news["title"], news["content"], url)
+            
+            # Одна пачка executemany; новые строки потом отпечатываются для поиска дублей
+            c.execute("SELECT COALESCE(MAX(id), 0) FROM news")
+            last_id = c.fetchone()[0]
+            result = storage.insert_many(conn, "news", ("source", "title", "content", "url"),
+                                         records.values())
+            inserted = register_inserted(c, last_id, records)
+    except Exception as e:
+        print(f"Error saving: {e}")
+        return 0
     
-    saved = 0
-    for news in news_list:
-        try:
-            c.execute('''INSERT OR IGNORE INTO news (source, title, content, url)
-                         VALUES (?, ?, ?, ?)''',
-                      (news["source"], news["title"], news["content"], news["url"]))
-            if c.rowcount > 0:
-                saved += 1
-        except Exception as e:
-            print(f"Error saving: {e}")
-    
-    conn.commit()
-    conn.close()
+    saved = result["inserted"]
+    if inserted:
+        known.add([url for _, url in inserted], max(news_id for news_id, _ in inserted))
     return saved
 
 def crawl_all():
     """Run all crawlers"""
     all_news = []
+    hn_stats = {}
     
     print("Crawling HackerNews...")
-    all_news.extend(crawl_hackernews())
+    all_news.extend(crawl_hackernews(stats=hn_stats))
+    print(f"  HN items: {hn_stats.get('fetched', 0)} fetched, {hn_stats.get('cached', 0)} from cache")
+    
+    found = saved = 0
+    if SOURCES["hackernews"]["incremental"]:
+        print("Crawling HackerNews new items...")
+        incremental = crawl_hackernews_incremental()
+        hn_stats["incremental"] = incremental
+        found += incremental["found"]
+        saved += incremental["saved"]
+        print(f"  Walked {incremental.get('walked', 0)} items up to {incremental.get('high_water_mark')}")
     
     print("Crawling GitHub...")
     all_news.extend(crawl_github())
     
-    print(f"Found {len(all_news)} items")
-    saved = save_news(all_news)
+    found += len(all_news)
+    print(f"Found {found} items")
+    saved += save_news(all_news)
     print(f"Saved {saved} new items")
     
-    return {"found": len(all_news), "saved": saved}
+    return {"found": found, "saved": saved, "hn": hn_stats}
+
+def benchmark_hackernews(stories=200, latency=0.05, workers=(1, 8, 32)):
+    """Benchmark crawl_hackernews against a local stand-in HN server
+
+    Every worker count runs against an empty item cache; the last run
+    repeats the crawl with a warm cache.
+    """
+    from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+    import threading
+    import tempfile
+    
+    global DB_PATH
+    
+    class FakeHN(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        disable_nagle_algorithm = True
+        
+        def do_GET(self):
+            time.sleep(latency)
+            if self.path.endswith("/topstories.json"):
+                body = list(range(1, stories + 1))
+            else:
+                sid = int(self.path.rsplit("/", 1)[-1].split(".")[0])
+                title = f"Story {sid} about LLM agents" if sid % 3 == 0 else f"Story {sid}"
+                body = {"id": sid, "title": title, "score": sid, "descendants": 0}
+            data = json.dumps(body).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+        
+        def log_message(self, *args):
+            pass
+    
+    class Server(ThreadingHTTPServer):
+        request_queue_size = 128
+    
+    server = Server(("127.0.0.1", 0), FakeHN)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base = f"http://127.0.0.1:{server.server_address[1]}/v0"
+    http_client.configure(host_limits={"127.0.0.1": max(workers)})
+    
+    saved = dict(SOURCES["hackernews"])
+    SOURCES["hackernews"].update(url=f"{base}/topstories.json",
+                                 item_url=f"{base}/item/{{id}}.json")
+    saved_path = DB_PATH
+    tmp = tempfile.TemporaryDirectory()
+    results = []
+    
+    def run(w, cache):
+        stats = {}
+        start = time.perf_counter()
+        found = crawl_hackernews(max_stories=stories, workers=w, stats=stats)
+        elapsed = time.perf_counter() - start
+        results.append({"workers": w, "cache": cache, "stories": stories, "found": len(found),
+                        "fetched": stats.get("fetched"), "seconds": round(elapsed, 3)})
+    
+    try:
+        for w in workers:
+            DB_PATH = Path(tmp.name) / f"bench_{w}.db"
+            run(w, "cold")
+        run(workers[-1], "warm")
+    finally:
+        SOURCES["hackernews"].clear()
+        SOURCES["hackernews"].update(saved)
+        DB_PATH = saved_path
+        tmp.cleanup()
+        server.shutdown()
+    
+    return results
 
 if __name__ == "__main__":
-    result = crawl_all()
-    print(json.dumps(result))
+    cmd = sys.argv[1] if len(sys.argv) > 1 else "crawl"
+    
+    if cmd == "crawl":
+        result = crawl_all()
+        print(json.dumps(result))
+    elif cmd == "incremental":
+        result = crawl_hackernews_incremental()
+        print(json.dumps(result))
+    elif cmd == "bench":
+        for r in benchmark_hackernews():
+            print(json.dumps(r))
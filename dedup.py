@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+"""
+Dedup - канонизация URL и поиск почти-дубликатов новостей между источниками
+- URL приводится к канонической форме до вставки (без www, без трекинг-параметров);
+  схема и параметры, которые могут менять страницу (source, ref), сохраняются
+- MinHash по словам заголовка + LSH: 8 полос по 3 хэша, каждая полоса - индексированная
+  колонка, поэтому кандидаты ищутся по индексам, а не перебором всей таблицы
+- Кандидаты проверяются точным коэффициентом Жаккара; дубликат ссылается на
+  каноническую запись через news.duplicate_of
+"""
+import sys
+import re
+import json
+import random
+import hashlib
+from pathlib import Path
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+
+import storage
+import migrations
+
+DB_PATH = Path(__file__).parent / "knowledge" / "news.db"
+
+# Известные параметры рекламных систем и рассылок - содержимое страницы от них не зависит
+TRACKING_PARAMS = {"fbclid", "gclid", "dclid", "msclkid", "mc_cid", "mc_eid", "ref_src",
+                   "ref_url", "_hsenc", "_hsmi", "igshid"}
+TRACKING_PREFIXES = ("utm_",)
+
+# Вероятность попасть в кандидаты 1 - (1 - J^ROWS)^BANDS:
+# J=0.7 -> 97%, J=0.5 -> 65%, J=0.2 -> 6%
+BANDS = 8
+ROWS = 3
+DUPLICATE_JACCARD = 0.7
+MIN_FEATURES = 3          # слишком короткие заголовки не отпечатываем
+DUPLICATE_WINDOW_DAYS = 30
+MAX_CANDIDATES = 50       # предел проверок для шаблонных заголовков ("Show HN: ...")
+
+MERSENNE = (1 << 61) - 1
+_rnd = random.Random(20240601)   # фиксированное зерно: отпечатки стабильны между запусками
+HASH_PARAMS = [(_rnd.randrange(1, MERSENNE), _rnd.randrange(MERSENNE)) for _ in range(BANDS * ROWS)]
+
+STOPWORDS = {"a", "an", "the", "and", "or", "of", "to", "in", "on", "for", "with", "is", "are",
+             "by", "at", "from", "as", "its", "it", "this", "that", "our", "we", "your",
+             "show", "hn", "ask", "new", "now", "yet"}
+
+def canonicalize_url(url):
+    """Canonical form of a URL for deduplication"""
+    if not url:
+        return url
+    parts = urlsplit(url.strip())
+    scheme = parts.scheme.lower()
+    if scheme not in ("http", "https"):
+        return url.strip()
+
+    host = (parts.hostname or "").lower()
+    if host.startswith("www."):
+        host = host[4:]
+    if parts.port and parts.port != (443 if scheme == "https" else 80):
+        host = f"{host}:{parts.port}"
+
+    path = re.sub(r"/{2,}", "/", parts.path or "/")
+    if len(path) > 1:
+        path = path.rstrip("/")
+
+    query = [(k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True)
+             if k.lower() not in TRACKING_PARAMS and not k.lower().startswith(TRACKING_PREFIXES)]
+    return urlunsplit((scheme, host, path, urlencode(sorted(query)), ""))
+
+def stem(word):
+    """Crude suffix stripping so 'introducing' / 'introduces' compare equal"""
+    if len(word) > 4:
+        for suffix in ("ing", "ed", "es", "s"):
+            if word.endswith(suffix):
+                return word[:-len(suffix)]
+    return word
+
+def features(title, content=""):
+    """Set of normalized title words
+
+    Content is only used when the title is too short: it differs by source
+    (HN stores score metadata, blogs store the summary) and would push
+    cross-source copies of one announcement apart.
+    """
+    words = {stem(w) for w in re.findall(r"[a-z0-9]+", (title or "").lower()) if w not in STOPWORDS}
+    if len(words) < MIN_FEATURES:
+        words |= {stem(w) for w in re.findall(r"[a-z0-9]+", (content or "").lower())[:20]
+                  if w not in STOPWORDS}
+    return words
+
+def jaccard(a, b):
+    return len(a & b) / len(a | b) if a or b else 0.0
+
+def minhash_bands(feats):
+    """LSH band keys (BANDS ints, 63-bit) of the MinHash signature"""
+    tokens = [int.from_bytes(hashlib.blake2b(f.encode("utf-8"), digest_size=8).digest(), "big")
+              for f in feats]
+    signature = [min((a * t + b) % MERSENNE for t in tokens) for a, b in HASH_PARAMS]
+    keys = []
+    for i in range(BANDS):
+        band = signature[i * ROWS:(i + 1) * ROWS]
+        digest = hashlib.blake2b(repr((i, band)).encode(), digest_size=8).digest()
+        keys.append(int.from_bytes(digest, "big") >> 1)   # SQLite INTEGER - знаковый 64-бит
+    return keys
+
+def find_duplicate(c, feats, keys, exclude_id=None):
+    """Canonical news id of the closest recent near-duplicate, or None"""
+    # OR по индексированным полосам - SQLite делает отдельный поиск по каждому индексу
+    where = " OR ".join(f"f.band{i} = ?" for i in range(BANDS))
+    c.execute(f'''SELECT n.id, n.title, n.content, n.duplicate_of FROM news_fingerprints f
+                  JOIN news n ON n.id = f.news_id
+                  WHERE ({where})
+                  AND n.crawled_at >= datetime('now', '-{DUPLICATE_WINDOW_DAYS} days')
+                  ORDER BY n.id DESC LIMIT {MAX_CANDIDATES}''', keys)
+    best, best_score = None, DUPLICATE_JACCARD
+    for news_id, title, content, duplicate_of in c.fetchall():
+        if news_id == exclude_id:
+            continue
+        score = jaccard(feats, features(title, content))
+        # Кандидаты от новых к старым: при равном сходстве остаётся более свежий
+        if score >= best_score and (best is None or score > best_score):
+            best, best_score = duplicate_of or news_id, score
+    return best
+
+def register_news(c, news_id, title, content=""):
+    """Fingerprint a freshly inserted news row and link it if it is a near-duplicate
+
+    Runs on the caller's cursor, inside its transaction. Returns the canonical
+    news id for duplicates, None otherwise.
+    """
+    feats = features(title, content)
+    if len(feats) < MIN_FEATURES:
+        return None
+    keys = minhash_bands(feats)
+    canonical = find_duplicate(c, feats, keys, news_id)
+    if canonical:
+        c.execute("UPDATE news SET duplicate_of = ? WHERE id = ?", (canonical, news_id))
+    c.execute(f'''INSERT OR REPLACE INTO news_fingerprints (news_id, {", ".join(f"band{i}" for i in range(BANDS))})
+                  VALUES ({", ".join("?" * (BANDS + 1))})''', [news_id] + keys)
+    return canonical
+
+def register_inserted(c, after_id, urls):
+    """Fingerprint rows a bulk insert just added (id > after_id, url in urls)
+
+    Returns [(news_id, url)] of the new rows.
+    """
+    rows = list(storage.select_in(c, f"""SELECT id, title, content, url FROM news
+                                          WHERE id > {int(after_id)} AND url IN ({{}})""", urls))
+    rows.sort()
+    for news_id, title, content, url in rows:
+        register_news(c, news_id, title, content)
+    return [(news_id, url) for news_id, _, _, url in rows]
+
+def backfill():
+    """Fingerprint existing news rows that have none yet (oldest first)"""
+    migrations.migrate(DB_PATH)
+    with storage.transaction(DB_PATH) as conn:
+        c = conn.cursor()
+        c.execute('''SELECT id, title, content FROM news
+                     WHERE id NOT IN (SELECT news_id FROM news_fingerprints) ORDER BY id''')
+        rows = c.fetchall()
+        duplicates = 0
+        for news_id, title, content in rows:
+            if register_news(c, news_id, title, content):
+                duplicates += 1
+    return {"fingerprinted": len(rows), "duplicates": duplicates}
+
+def get_duplicates(limit=20):
+    """Recent duplicate -> canonical pairs"""
+    conn = storage.connect(DB_PATH)
+    c = conn.cursor()
+    c.execute('''SELECT d.source, d.title, n.source, n.title FROM news d
+                 JOIN news n ON n.id = d.duplicate_of
+                 ORDER BY d.id DESC LIMIT ?''', (limit,))
+    rows = c.fetchall()
+    conn.close()
+    return rows
+
+if __name__ == "__main__":
+    cmd = sys.argv[1] if len(sys.argv) > 1 else "duplicates"
+
+    if cmd == "backfill":
+        print(json.dumps(backfill(), indent=2))
+    elif cmd == "duplicates":
+        migrations.migrate(DB_PATH)
+        for dup_source, dup_title, source, title in get_duplicates():
+            print(f"  [{dup_source}] {dup_title[:50]}  ->  [{source}] {title[:50]}")
+    elif cmd == "canonical":
+        for url in sys.argv[2:]:
+            print(canonicalize_url(url))
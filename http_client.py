@@ -0,0 +1,647 @@
+#!/usr/bin/env python3
+"""
+HTTP Client - общий HTTP клиент для краулеров и уведомлений
+- Keep-alive пул соединений по хостам (без повторных TCP+TLS handshake)
+- Распаковка gzip/deflate (в том числе потоковая)
+- Лимит параллельных запросов на хост
+- Запись ответов в response_store и воспроизведение без сети (replay)
+- Адаптивные таймауты по p95 задержки хоста и circuit breaker на хост
+"""
+import sys
+import http.client
+import hashlib
+import json
+import ssl
+import threading
+import time
+import zlib
+from collections import deque
+from urllib.parse import urlsplit, urljoin
+
+USER_AGENT = "AGI-News-Agent/1.0"
+DEFAULT_TIMEOUT = 10
+MAX_REDIRECTS = 5
+
+# Лимиты параллельных запросов на хост
+MAX_PER_HOST = 8
+HOST_LIMITS = {
+    "hacker-news.firebaseio.com": 32,
+    "api.github.com": 4,
+    "api.telegram.org": 2,
+}
+POOL_IDLE_TIMEOUT = 60   # секунд до закрытия простаивающего соединения
+
+# Отключаем SSL верификацию для простоты (как и раньше в краулерах)
+SSL_CONTEXT = ssl._create_unverified_context()
+
+# Ошибки, при которых переиспользованное соединение оказалось закрыто сервером
+STALE_ERRORS = (http.client.RemoteDisconnected, http.client.BadStatusLine,
+                ConnectionResetError, BrokenPipeError)
+
+# Адаптивный таймаут: p95 задержки хоста * TIMEOUT_FACTOR, но не больше таймаута вызова
+LATENCY_WINDOW = 50
+LATENCY_MIN_SAMPLES = 10
+TIMEOUT_FACTOR = 3
+MIN_TIMEOUT = 2
+
+# Circuit breaker: после BREAKER_THRESHOLD ошибок подряд хост отключается на
+# BREAKER_COOLDOWN секунд, затем пропускается один пробный запрос
+BREAKER_THRESHOLD = 5
+BREAKER_COOLDOWN = 30
+BREAKER_MAX_COOLDOWN = 600
+
+# Заголовки, которые не сохраняются вместе с записанным телом
+UNRECORDED_HEADERS = ("content-encoding", "content-length", "transfer-encoding", "set-cookie")
+
+# Активные Recorder / Replayer из response_store (None - обычная работа с сетью)
+_recorder = None
+_replayer = None
+
+# Общий срок (time.monotonic) для всех запросов текущего шага цикла, None - без срока
+_deadline = None
+
+class Response:
+    """Ответ сервера с уже распакованным телом"""
+    def __init__(self, url, status, headers, body):
+        self.url = url
+        self.status = status
+        self.headers = headers
+        self.body = body
+        # sha256 тела в response_store и дайджест предыдущего ответа с этого URL
+        self.digest = None
+        self.previous_digest = None
+
+    @property
+    def ok(self):
+        return 200 <= self.status < 300
+
+    def text(self, errors="replace"):
+        return self.body.decode("utf-8", errors=errors)
+
+    def json(self):
+        return json.loads(self.body.decode("utf-8"))
+
+    def iter_content(self, chunk_size=65536):
+        """Yield body chunks (same interface as StreamResponse)"""
+        for i in range(0, len(self.body), chunk_size):
+            yield self.body[i:i + chunk_size]
+
+    @property
+    def unchanged(self):
+        """Body is identical to the previously recorded response for this URL"""
+        return self.digest is not None and self.digest == self.previous_digest
+
+    def close(self):
+        pass
+
+class StreamResponse(Response):
+    """Ответ, тело которого читается по частям
+
+    Соединение возвращается в пул только если тело прочитано до конца.
+    """
+    def __init__(self, url, status, headers, pool, conn, raw):
+        super().__init__(url, status, headers, None)
+        self.pool = pool
+        self.conn = conn
+        self.raw = raw
+        self.closed = False
+        # Запись в response_store по мере чтения (record_to): тело не копится в памяти
+        self.sink = None
+        self.complete = False
+
+    def record_to(self, recorder, method, request_hash, headers):
+        """Tee the chunks read into the store; the response is recorded on close"""
+        self.sink = (recorder, method, request_hash, headers, recorder.open_body())
+
+    def iter_content(self, chunk_size=65536):
+        """Yield decoded body chunks"""
+        decoder = make_decoder(self.headers.get("content-encoding"))
+        try:
+            while True:
+                chunk = self.raw.read(chunk_size)
+                if not chunk:
+                    break
+                data = decoder.decompress(chunk) if decoder else chunk
+                if data:
+                    self._tee(data)
+                    yield data
+            if decoder:
+                tail = decoder.flush()
+                if tail:
+                    self._tee(tail)
+                    yield tail
+            self.complete = True
+        finally:
+            self.close()
+
+    def _tee(self, data):
+        if self.sink is not None:
+            self.sink[-1].write(data)
+
+    @property
+    def body(self):
+        if self._body is None:
+            self._body = b"".join(self.iter_content())
+        return self._body
+
+    @body.setter
+    def body(self, value):
+        self._body = value
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        if self.raw.isclosed() and not self.raw.will_close:
+            self.pool.release(self.conn)
+        else:
+            self.conn.close()
+        self.pool.semaphore.release()
+        if self.sink is not None:
+            recorder, method, request_hash, headers, body = self.sink
+            self.sink = None
+            if not self.complete:
+                # Читатель остановился раньше (limit): в хранилище только прочитанная часть
+                headers = dict(headers, **{"x-recorded-partial": "1"})
+            try:
+                self.digest, self.previous_digest = recorder.record_body(
+                    method, self.url, request_hash, self.status, headers, body)
+            except Exception as e:
+                body.discard()
+                print(f"Error recording {self.url}: {e}")
+
+class CircuitOpenError(ConnectionError):
+    """Host is failing; request rejected without touching the network"""
+
+class DeadlineExceeded(TimeoutError):
+    """Cycle budget is spent; request not sent"""
+
+class HostHealth:
+    """Задержки и состояние circuit breaker одного хоста"""
+    def __init__(self, host):
+        self.host = host
+        self.lock = threading.Lock()
+        self.latencies = deque(maxlen=LATENCY_WINDOW)
+        self.state = "closed"   # closed / open / half_open
+        self.failures = 0
+        self.cooldown = BREAKER_COOLDOWN
+        self.opened_at = 0.0
+        self.trips = 0
+        self.rejected = 0
+
+    def p95(self):
+        if len(self.latencies) < LATENCY_MIN_SAMPLES:
+            return None
+        ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+
+    def timeout(self, limit):
+        """Timeout for the next request, capped by the caller's limit"""
+        with self.lock:
+            p95 = self.p95()
+        if p95 is None:
+            return limit
+        return max(MIN_TIMEOUT, min(limit, p95 * TIMEOUT_FACTOR))
+
+    def before_request(self):
+        """Raise CircuitOpenError unless the request may go out"""
+        with self.lock:
+            if self.state == "closed":
+                return
+            if self.state == "open" and time.monotonic() - self.opened_at >= self.cooldown:
+                self.state = "half_open"   # этот запрос - пробный
+                return
+            self.rejected += 1
+        raise CircuitOpenError(f"Circuit open for {self.host}")
+
+    def success(self, latency):
+        with self.lock:
+            self.latencies.append(latency)
+            if self.state != "closed":
+                print(f"Circuit closed for {self.host}")
+            self.state = "closed"
+            self.failures = 0
+            self.cooldown = BREAKER_COOLDOWN
+
+    def failure(self):
+        with self.lock:
+            self.failures += 1
+            if self.state == "half_open":
+                # Пробный запрос не прошёл - ждём дольше
+                self.cooldown = min(self.cooldown * 2, BREAKER_MAX_COOLDOWN)
+            elif self.state == "open" or self.failures < BREAKER_THRESHOLD:
+                return
+            self.state = "open"
+            self.opened_at = time.monotonic()
+            self.trips += 1
+            print(f"Circuit open for {self.host} after {self.failures} failures "
+                  f"(retry in {self.cooldown}s)")
+
+    def abandon_probe(self):
+        """The probe was cut short by the cycle deadline: open again, due for the next probe"""
+        with self.lock:
+            if self.state == "half_open":
+                # opened_at и cooldown прежние - следующий запрос снова пробный
+                self.state = "open"
+
+    def summary(self):
+        with self.lock:
+            p95 = self.p95()
+            return {
+                "state": self.state,
+                "failures": self.failures,
+                "trips": self.trips,
+                "rejected": self.rejected,
+                "samples": len(self.latencies),
+                "p95_ms": round(p95 * 1000) if p95 is not None else None
+            }
+
+class HostPool:
+    """Пул keep-alive соединений к одному хосту"""
+    def __init__(self, scheme, host, port, limit):
+        self.scheme = scheme
+        self.host = host
+        self.port = port
+        self.semaphore = threading.BoundedSemaphore(limit)
+        self.lock = threading.Lock()
+        self.idle = []
+
+    def checkout(self):
+        """Take an idle connection, or None if a new one is needed"""
+        now = time.monotonic()
+        with self.lock:
+            while self.idle:
+                conn, last_used = self.idle.pop()
+                if now - last_used < POOL_IDLE_TIMEOUT:
+                    return conn
+                conn.close()
+        return None
+
+    def connect(self, timeout):
+        if self.scheme == "https":
+            return http.client.HTTPSConnection(self.host, self.port, timeout=timeout,
+                                               context=SSL_CONTEXT)
+        return http.client.HTTPConnection(self.host, self.port, timeout=timeout)
+
+    def release(self, conn):
+        with self.lock:
+            self.idle.append((conn, time.monotonic()))
+
+    def close(self):
+        with self.lock:
+            for conn, _ in self.idle:
+                conn.close()
+            self.idle = []
+
+_pools = {}
+_pools_lock = threading.Lock()
+# Состояние хостов переживает configure()/close_all()
+_health = {}
+
+def configure(max_per_host=None, host_limits=None):
+    """Change per-host concurrency limits (applies to new pools)"""
+    global MAX_PER_HOST
+    if max_per_host:
+        MAX_PER_HOST = max_per_host
+    if host_limits:
+        HOST_LIMITS.update(host_limits)
+    close_all()
+
+def close_all():
+    """Close every pooled connection"""
+    with _pools_lock:
+        for pool in _pools.values():
+            pool.close()
+        _pools.clear()
+
+def get_pool(scheme, host, port):
+    key = (scheme, host, port)
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None:
+            limit = HOST_LIMITS.get(host, MAX_PER_HOST)
+            pool = _pools[key] = HostPool(scheme, host, port, limit)
+        return pool
+
+def get_health(host):
+    with _pools_lock:
+        health = _health.get(host)
+        if health is None:
+            health = _health[host] = HostHealth(host)
+        return health
+
+def breaker_status(reset_rejected=False):
+    """Latency and circuit breaker state of every host seen so far"""
+    with _pools_lock:
+        hosts = list(_health.values())
+    status = {}
+    for health in hosts:
+        status[health.host] = health.summary()
+        if reset_rejected:
+            health.rejected = 0
+    return status
+
+def reset_health():
+    """Forget latency samples and breaker state"""
+    with _pools_lock:
+        _health.clear()
+
+def make_decoder(encoding):
+    """Incremental decompressor for Content-Encoding, None for identity"""
+    encoding = (encoding or "").lower()
+    if encoding in ("gzip", "x-gzip"):
+        return zlib.decompressobj(16 + zlib.MAX_WBITS)
+    if encoding == "deflate":
+        return zlib.decompressobj()
+    return None
+
+def decode_body(body, encoding):
+    """Decompress gzip/deflate body"""
+    encoding = (encoding or "").lower()
+    if encoding in ("gzip", "x-gzip"):
+        return zlib.decompress(body, 16 + zlib.MAX_WBITS)
+    if encoding == "deflate":
+        try:
+            return zlib.decompress(body)
+        except zlib.error:
+            return zlib.decompress(body, -zlib.MAX_WBITS)   # raw deflate
+    return body
+
+def _send(pool, method, path, headers, data, timeout, stream=False):
+    """Send one request over a pooled connection, retrying once on a stale socket
+
+    Returns (response, body, conn); with stream=True the body is left unread
+    and the caller owns the connection.
+    """
+    conn = pool.checkout()
+    reused = conn is not None
+    while True:
+        if conn is None:
+            conn = pool.connect(timeout)
+        elif conn.sock is not None:
+            conn.sock.settimeout(timeout)
+        try:
+            conn.request(method, path, body=data, headers=headers)
+            resp = conn.getresponse()
+            body = None if stream else resp.read()
+        except STALE_ERRORS:
+            conn.close()
+            if not reused:
+                raise
+            conn, reused = None, False
+            continue
+        except Exception:
+            conn.close()
+            raise
+
+        if stream:
+            return resp, None, conn
+        if resp.will_close:
+            conn.close()
+        else:
+            pool.release(conn)
+        return resp, body, None
+
+def set_recorder(recorder):
+    """Record responses into a response_store.Recorder (None to stop)"""
+    global _recorder
+    _recorder = recorder
+
+def set_replayer(replayer):
+    """Serve responses from a response_store.Replayer instead of the network (None to stop)"""
+    global _replayer
+    _replayer = replayer
+
+def set_deadline(seconds):
+    """Cap every request timeout so nothing runs past now + seconds (None to clear)"""
+    global _deadline
+    _deadline = time.monotonic() + seconds if seconds is not None else None
+
+def time_left():
+    """Seconds until the cycle deadline (None without one)"""
+    return _deadline - time.monotonic() if _deadline is not None else None
+
+def request_hash(data):
+    return hashlib.sha256(data).hexdigest() if data else ""
+
+def request(method, url, headers=None, data=None, timeout=DEFAULT_TIMEOUT, stream=False, record=None):
+    """Perform an HTTP request and return a Response (any status)
+
+    With stream=True a StreamResponse is returned for 2xx answers; it holds
+    the host slot until closed or read to the end. While recording, the
+    chunks read are written to the store as they arrive and the response is
+    recorded when it is closed. Replayed bodies are always read in full.
+
+    record: whether the response belongs in the response store; by default
+    only GET requests are recorded (POSTs carry notifications and tokens).
+    """
+    if record is None:
+        record = method == "GET"
+
+    if _replayer is not None:
+        if not record:
+            raise ConnectionError(f"Network disabled in replay mode: {method} {url}")
+        status, resp_headers, body = _replayer.lookup(method, url, request_hash(data))
+        return Response(url, status, resp_headers, body)
+
+    recorder = _recorder if record else None
+    resp = _request(method, url, headers, data, timeout, stream)
+    if recorder is not None:
+        saved_headers = {k: v for k, v in resp.headers.items() if k not in UNRECORDED_HEADERS}
+        if isinstance(resp, StreamResponse):
+            try:
+                resp.record_to(recorder, method, request_hash(data), saved_headers)
+            except Exception as e:
+                print(f"Error recording {url}: {e}")
+            return resp
+        try:
+            resp.digest, resp.previous_digest = recorder.record(
+                method, url, request_hash(data), resp.status, saved_headers, resp.body)
+        except Exception as e:
+            print(f"Error recording {url}: {e}")
+    return resp
+
+def _request(method, url, headers, data, timeout, stream):
+    all_headers = {"User-Agent": USER_AGENT, "Accept-Encoding": "gzip, deflate"}
+    all_headers.update(headers or {})
+
+    for _ in range(MAX_REDIRECTS + 1):
+        parts = urlsplit(url)
+        scheme = parts.scheme.lower()
+        if scheme not in ("http", "https"):
+            raise ValueError(f"Unsupported URL scheme: {url}")
+        port = parts.port or (443 if scheme == "https" else 80)
+        path = parts.path or "/"
+        if parts.query:
+            path += "?" + parts.query
+
+        health = get_health(parts.hostname)
+        pool = get_pool(scheme, parts.hostname, port)
+        # Очередь за слотом хоста тоже укладывается в срок цикла
+        if _deadline is None:
+            pool.semaphore.acquire()
+        elif not pool.semaphore.acquire(timeout=max(0, _deadline - time.monotonic())):
+            raise DeadlineExceeded(f"Cycle deadline reached waiting for a slot: {url}")
+        started = time.monotonic()
+        limit = health.timeout(timeout)
+        capped = _deadline is not None and _deadline - started < limit
+        if capped:
+            limit = _deadline - started
+            if limit <= 0:
+                pool.semaphore.release()
+                raise DeadlineExceeded(f"Cycle deadline reached before {url}")
+        try:
+            # После проверки срока: иначе пробный запрос half-open так и не ушёл бы
+            health.before_request()
+        except CircuitOpenError:
+            pool.semaphore.release()
+            raise
+        try:
+            resp, body, conn = _send(pool, method, path, all_headers, data, limit, stream)
+        except Exception as e:
+            pool.semaphore.release()
+            # Таймаут, урезанный бюджетом цикла, - не вина хоста
+            if capped and isinstance(e, TimeoutError):
+                health.abandon_probe()
+            else:
+                health.failure()
+            raise
+        if resp.status >= 500:
+            health.failure()
+        else:
+            health.success(time.monotonic() - started)
+
+        resp_headers = {k.lower(): v for k, v in resp.getheaders()}
+        if conn is not None:
+            if 200 <= resp.status < 300:
+                return StreamResponse(url, resp.status, resp_headers, pool, conn, resp)
+            body = resp.read()
+            if resp.will_close:
+                conn.close()
+            else:
+                pool.release(conn)
+        pool.semaphore.release()
+
+        location = resp_headers.get("location")
+        if resp.status in (301, 302, 303, 307, 308) and location:
+            url = urljoin(url, location)
+            if resp.status == 303:
+                method, data = "GET", None
+            continue
+
+        body = decode_body(body, resp_headers.get("content-encoding"))
+        return Response(url, resp.status, resp_headers, body)
+
+    raise http.client.HTTPException(f"Too many redirects: {url}")
+
+def fetch_url(url, headers=None, timeout=DEFAULT_TIMEOUT):
+    """Fetch URL content as text, None on error"""
+    try:
+        resp = request("GET", url, headers=headers, timeout=timeout)
+        if not resp.ok:
+            print(f"Error fetching {url}: HTTP {resp.status}")
+            return None
+        return resp.text()
+    except (CircuitOpenError, DeadlineExceeded):
+        # Размыкание / конец бюджета уже залогированы, не засоряем вывод на каждый URL
+        return None
+    except Exception as e:
+        print(f"Error fetching {url}: {e}")
+        return None
+
+def fetch_json(url, headers=None, timeout=DEFAULT_TIMEOUT):
+    """Fetch URL and decode JSON, None on error"""
+    data = fetch_url(url, headers=headers, timeout=timeout)
+    return json.loads(data) if data else None
+
+def post_json(url, payload, headers=None, timeout=DEFAULT_TIMEOUT, record=False):
+    """POST a JSON payload and return the Response"""
+    all_headers = {"Content-Type": "application/json"}
+    all_headers.update(headers or {})
+    data = json.dumps(payload).encode("utf-8")
+    return request("POST", url, headers=all_headers, data=data, timeout=timeout, record=record)
+
+def selftest():
+    """Check adaptive timeouts and the breaker against a local stand-in server"""
+    from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+    global BREAKER_COOLDOWN
+    mode = {"hang": False}
+
+    class Flaky(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_GET(self):
+            if mode["hang"]:
+                time.sleep(MIN_TIMEOUT + 1)
+            body = b"ok"
+            self.send_response(200)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Flaky)
+    server.disable_nagle_algorithm = True
+    server.daemon_threads = True
+    server.handle_error = lambda request, address: None   # клиент ушёл по таймауту
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_address[1]}/"
+    saved_cooldown = BREAKER_COOLDOWN
+    BREAKER_COOLDOWN = 1
+    reset_health()
+    try:
+        for _ in range(LATENCY_MIN_SAMPLES):
+            assert fetch_url(url, timeout=30) == "ok"
+        assert get_health("127.0.0.1").timeout(30) == MIN_TIMEOUT
+
+        # Хост завис: запросы обрываются по p95-таймауту, а не через 30 с
+        mode["hang"] = True
+        started = time.monotonic()
+        for _ in range(BREAKER_THRESHOLD):
+            assert fetch_url(url, timeout=30) is None
+        hang_time = time.monotonic() - started
+        assert get_health("127.0.0.1").state == "open"
+
+        # Разомкнутый breaker отвечает мгновенно
+        started = time.monotonic()
+        for _ in range(100):
+            assert fetch_url(url, timeout=30) is None
+        rejected_time = time.monotonic() - started
+
+        # Пробный запрос, оборванный сроком цикла, возвращает breaker в open без удвоения паузы
+        time.sleep(BREAKER_COOLDOWN)
+        set_deadline(MIN_TIMEOUT / 2)
+        try:
+            assert fetch_url(url, timeout=30) is None
+        finally:
+            set_deadline(None)
+        health = get_health("127.0.0.1")
+        assert health.state == "open" and health.cooldown == BREAKER_COOLDOWN, health.summary()
+
+        # После паузы пробный запрос проходит и breaker замыкается
+        mode["hang"] = False
+        assert fetch_url(url, timeout=30) == "ok"
+        status = breaker_status()["127.0.0.1"]
+        assert status["state"] == "closed" and status["trips"] == 1, status
+    finally:
+        BREAKER_COOLDOWN = saved_cooldown
+        server.shutdown()
+        server.server_close()
+        close_all()
+        reset_health()
+
+    return {
+        "hang_requests": BREAKER_THRESHOLD,
+        "hang_seconds": round(hang_time, 2),
+        "rejected_requests": 100,
+        "rejected_seconds": round(rejected_time, 4),
+        "breaker": status
+    }
+
+if __name__ == "__main__":
+    cmd = sys.argv[1] if len(sys.argv) > 1 else "selftest"
+
+    if cmd == "selftest":
+        print(json.dumps(selftest(), indent=2))
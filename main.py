@@ -3,9 +3,11 @@
 AGI News Agent v2.0 - Self-Learning System
 Полный цикл: Crawl -> Analyze -> Architect -> Notify
 """
+import os
 import sys
 import json
-import sqlite3
+import tempfile
+from contextlib import contextmanager
 from datetime import datetime
 from pathlib import Path
 
@@ -13,45 +15,228 @@ BASE_DIR = Path(__file__).parent
 DB_PATH = BASE_DIR / "knowledge" / "news.db"
 
 sys.path.insert(0, str(BASE_DIR))
-from crawlers.news_crawler import crawl_all as crawl_news
+from crawlers.news_crawler import crawl_all as crawl_news, get_state, set_state
 from crawlers.github_advanced import crawl_and_update as crawl_github, get_watchlist_summary
-from crawlers.blog_crawler import crawl_and_save as crawl_blogs
+from crawlers.blog_crawler import crawl_and_save as crawl_blogs, BLOG_SOURCES
 from analyzer.news_analyzer import analyze_news, get_high_relevance_news, get_discovered_technologies
 from architect.planner import plan_all_technologies, show_plans
 from notifier import check_and_notify, get_pending_notifications
+import scheduler
+import http_client
+import response_store
+import bloom
+import storage
+import migrations
+import archive
+import snapshot
+
+# Сохранять сырые ответы краулеров в knowledge/responses (для replay): run --record
+# или AGI_RECORD_RESPONSES=1
+RECORD_RESPONSES = os.environ.get("AGI_RECORD_RESPONSES") == "1"
+KEEP_RUNS = 50           # записанных запусков в хранилище, старые удаляются после записи
+# Состояние краулеров, с которого начинается запуск; replay стартует с него же
+REPLAY_STATE = ("hn_high_water_mark",)
 
 def log_run(action, result):
     """Log agent run"""
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
-    c.execute('''INSERT INTO agent_actions (action_type, description, output_data, success)
-                 VALUES (?, ?, ?, ?)''',
-              (action, f"Agent run: {action}", json.dumps(result), True))
-    conn.commit()
-    conn.close()
+    with storage.transaction(DB_PATH) as conn:
+        c = conn.cursor()
+        c.execute('''INSERT INTO agent_actions (action_type, description, output_data, success)
+                     VALUES (?, ?, ?, ?)''',
+                  (action, f"Agent run: {action}", json.dumps(result), True))
+
+def log_skipped(budget):
+    """Record work dropped because the cycle budget ran out"""
+    with storage.transaction(DB_PATH) as conn:
+        c = conn.cursor()
+        c.execute('''INSERT INTO agent_actions (action_type, description, output_data, success)
+                     VALUES (?, ?, ?, ?)''',
+                  ("cycle_skipped",
+                   f"Deadline {budget.seconds}s: skipped {', '.join(s['step'] for s in budget.skipped)}",
+                   json.dumps(budget.summary()), False))
+
+@contextmanager
+def replay_database(store, run_id):
+    """Point DB_PATH at a fresh scratch database for the replay
+
+    The live database (feed validators, HN cache and high-water mark, news,
+    agent_actions) is not touched; the scratch one starts from the crawler
+    state the recorded run started from and is deleted afterwards.
+    """
+    with tempfile.TemporaryDirectory(prefix="agi-replay-") as scratch:
+        storage.redirect(DB_PATH, Path(scratch) / "news.db")
+        try:
+            migrations.migrate(DB_PATH)
+            for key, value in store.load_state(run_id).items():
+                set_state(key, value)
+            yield
+        finally:
+            storage.redirect(DB_PATH, None)
+
+def run_full_cycle(force=False, replay=None, deadline=None, publish_snapshot=False, record=None):
+    """Run complete agent cycle
 
-def run_full_cycle():
-    """Run complete agent cycle"""
+    Sources are crawled only when the adaptive schedule says they are due,
+    unless force=True. With replay=<run-id> every source is crawled from the
+    responses recorded in that run, without network, schedule updates or
+    notifications, into a scratch database. record: save the raw responses
+    for replay (default RECORD_RESPONSES). deadline (seconds) bounds the whole
+    cycle: work that does not fit is skipped and logged to agent_actions.
+    publish_snapshot: finish by publishing a read-only snapshot for the
+    dashboards (snapshot.py).
+    """
     print("=" * 60)
     print(f"AGI NEWS AGENT v2.0 - Full Cycle")
     print(f"Started: {datetime.now().isoformat()}")
     print("=" * 60)
     
+    if record is None:
+        record = RECORD_RESPONSES
+    store = response_store.ResponseStore() if record or replay else None
+    if replay:
+        with replay_database(store, replay):
+            return run_cycle(force, replay, deadline, False, store)
+    return run_cycle(force, None, deadline, publish_snapshot, store)
+
+def run_cycle(force, replay, deadline, publish_snapshot, store):
+    """Steps of run_full_cycle against whatever DB_PATH currently opens"""
     results = {}
+    budget = scheduler.CycleBudget(deadline) if deadline else None
+    if replay:
+        replayer = response_store.Replayer(store, replay)
+        http_client.set_replayer(replayer)
+        print(f"Replaying run {replay} (offline, scratch database)")
+    elif store is not None:
+        results["run_id"] = response_store.new_run_id()
+        state = {key: get_state(key) for key in REPLAY_STATE}
+        state = {key: value for key, value in state.items() if value is not None}
+        http_client.set_recorder(response_store.Recorder(store, results["run_id"], state))
     
-    # Step 1: Crawl all sources
-    print("\n[1/5] CRAWLING SOURCES...")
+    try:
+        crawl_cycle(results, force or bool(replay), record_schedule=not replay, budget=budget)
+    finally:
+        http_client.set_recorder(None)
+        http_client.set_replayer(None)
+    if replay:
+        results["replay"] = replayer.stats()
+        print(f"     Replay: {replayer.hits} hits, {replayer.misses} misses")
+    elif store is not None:
+        results["responses_pruned"] = store.prune(KEEP_RUNS)
+    
+    # Step 2: Analyze
+    print("\n[2/5] ANALYZING...")
+    if budget and budget.remaining() < scheduler.MIN_STEP_SECONDS:
+        budget.skip("analyze")
+        print("     Skipped, cycle budget spent")
+    else:
+        analyze_result = analyze_news()
+        results["analyze"] = analyze_result
+        print(f"     Analyzed: {analyze_result['analyzed']}")
+        print(f"     Knowledge: {analyze_result['knowledge_extracted']}")
+        print(f"     Technologies: {analyze_result['new_technologies']}")
+    
+    # Step 3: Plan
+    print("\n[3/5] PLANNING...")
+    if budget and budget.remaining() < scheduler.MIN_STEP_SECONDS:
+        budget.skip("plan")
+        print("     Skipped, cycle budget spent")
+    else:
+        plan_result = plan_all_technologies()
+        results["plan"] = plan_result
+        print(f"     Planned: {plan_result['planned']}")
+    
+    # Step 4: Notify
+    print("\n[4/5] SENDING NOTIFICATIONS...")
+    if replay:
+        results["notify"] = {"notified": False, "skipped": "replay"}
+        print("     Skipped in replay mode")
+    elif budget and budget.remaining() < scheduler.MIN_STEP_SECONDS:
+        budget.skip("notify")
+        print("     Skipped, cycle budget spent")
+    else:
+        if budget:
+            http_client.set_deadline(budget.remaining())
+        try:
+            notify_result = check_and_notify()
+        finally:
+            http_client.set_deadline(None)
+        results["notify"] = notify_result
+        print(f"     Notified: {notify_result.get('notified', False)}")
+        if notify_result.get("channels"):
+            print(f"     Channels: {', '.join(notify_result['channels'])}")
+    
+    if budget:
+        results["deadline"] = budget.summary()
+        if budget.skipped:
+            log_skipped(budget)
+    
+    # Step 5: Summary
+    print("\n[5/5] GENERATING SUMMARY...")
+    
+    print("\n" + "=" * 60)
+    print("CYCLE COMPLETE")
+    print("=" * 60)
+    
+    log_run("replay_cycle" if replay else "full_cycle_v2", results)
     
+    if publish_snapshot:
+        results["snapshot"] = snapshot.publish(DB_PATH)
+        print(f"Snapshot: {results['snapshot']['path']} ({results['snapshot']['seconds']}s)")
+    return results
+
+# Вес шага в бюджете краулинга (--deadline); шаги идут в порядке приоритета
+STEP_WEIGHTS = {"blogs_high": 1, "hackernews": 3, "blogs": 2, "github": 3}
+
+def crawl_hackernews_step(results, record_schedule):
     print("  → HackerNews...")
-    news_result = crawl_news()
+    try:
+        news_result = crawl_news()
+    except Exception as e:
+        print(f"     HackerNews error: {e}")
+        results["news"] = {"error": str(e)}
+        if record_schedule:
+            scheduler.record_run("hackernews", 0, error=True)
+        return
     results["news"] = news_result
+    if record_schedule:
+        scheduler.record_run("hackernews", news_result["saved"], error="error" in news_result["hn"])
     print(f"     Found: {news_result['found']}, Saved: {news_result['saved']}")
-    
-    print("  → Blogs (Anthropic, Google, OpenAI)...")
-    blog_result = crawl_blogs()
-    results["blogs"] = blog_result
+
+def crawl_blogs_step(results, names, record_schedule):
+    print(f"  → Blogs ({', '.join(names)})...")
+    try:
+        blog_result = crawl_blogs(names)
+    except Exception as e:
+        print(f"     Blogs error: {e}")
+        results.setdefault("blog_errors", []).append(str(e))
+        if record_schedule:
+            for name in names:
+                scheduler.record_run(f"blog_{name}", 0, error=True)
+        return
+    if record_schedule:
+        for name, saved in blog_result["saved_by_source"].items():
+            failed = blog_result["status"].get(name) == "error" or name in blog_result["failed"]
+            scheduler.record_run(f"blog_{name}", saved, error=failed)
     print(f"     Found: {blog_result['total_found']}, Saved: {blog_result['saved']}")
+    feeds = blog_result["feeds"]
+    print(f"     Feeds 304: {feeds['not_modified']}/{feeds['requests']} (hit rate {feeds['hit_rate']:.0%})")
     
+    # Блоги могут обходиться двумя шагами (приоритетные и остальные) - сводим в один результат
+    merged = results.setdefault("blogs", {
+        "total_found": 0, "saved": 0, "saved_by_source": {}, "status": {}, "sources": [],
+        "feeds": {"requests": 0, "not_modified": 0, "hit_rate": 0.0}
+    })
+    merged["total_found"] += blog_result["total_found"]
+    merged["saved"] += blog_result["saved"]
+    merged["saved_by_source"].update(blog_result["saved_by_source"])
+    merged["status"].update(blog_result["status"])
+    merged["sources"] += blog_result["sources"]
+    merged["feeds"]["requests"] += feeds["requests"]
+    merged["feeds"]["not_modified"] += feeds["not_modified"]
+    if merged["feeds"]["requests"]:
+        merged["feeds"]["hit_rate"] = round(merged["feeds"]["not_modified"] / merged["feeds"]["requests"], 2)
+
+def crawl_github_step(results, record_schedule):
     print("  → GitHub Advanced...")
     try:
         github_result = crawl_github()
@@ -59,48 +244,81 @@ def run_full_cycle():
             "new": github_result["new_repos"],
             "updated": github_result["updated"],
             "rising_stars": len(github_result["rising_stars"]),
-            "high_value": len(github_result["high_value"])
+            "high_value": len(github_result["high_value"]),
+            "rate_limit": github_result["rate_limit"],
+            "refreshed": github_result.get("refresh", {}).get("refreshed", 0)
         }
+        if record_schedule:
+            scheduler.record_run("github", github_result["new_repos"])
         print(f"     New: {github_result['new_repos']}, Rising: {len(github_result['rising_stars'])}")
     except Exception as e:
         print(f"     GitHub error: {e}")
         results["github"] = {"error": str(e)}
+        if record_schedule:
+            scheduler.record_run("github", 0, error=True)
+
+def crawl_cycle(results, force=False, record_schedule=True, budget=None):
+    """Step 1: crawl the sources that are due
+
+    Order: high-priority blogs, HackerNews, other blogs, GitHub. With a
+    budget each step gets its weight's share of the crawl time left and
+    every HTTP request is capped by it; steps that get no time are skipped.
+    """
+    print("\n[1/5] CRAWLING SOURCES...")
     
-    # Step 2: Analyze
-    print("\n[2/5] ANALYZING...")
-    analyze_result = analyze_news()
-    results["analyze"] = analyze_result
-    print(f"     Analyzed: {analyze_result['analyzed']}")
-    print(f"     Knowledge: {analyze_result['knowledge_extracted']}")
-    print(f"     Technologies: {analyze_result['new_technologies']}")
+    scheduler.init_schedule_table()
+    blog_sources = [f"blog_{name}" for name in BLOG_SOURCES]
+    all_sources = ["hackernews"] + blog_sources + ["github"]
+    due = all_sources if force else scheduler.due_sources(all_sources)
+    results["schedule"] = {"due": due, "skipped": [s for s in all_sources if s not in due]}
+    if results["schedule"]["skipped"]:
+        print(f"  Not due yet: {', '.join(results['schedule']['skipped'])}")
     
-    # Step 3: Plan
-    print("\n[3/5] PLANNING...")
-    plan_result = plan_all_technologies()
-    results["plan"] = plan_result
-    print(f"     Planned: {plan_result['planned']}")
+    due_blogs = [s[len("blog_"):] for s in blog_sources if s in due]
+    high_blogs = [b for b in due_blogs if BLOG_SOURCES[b].get("priority") == "high"]
+    other_blogs = [b for b in due_blogs if b not in high_blogs]
     
-    # Step 4: Notify
-    print("\n[4/5] SENDING NOTIFICATIONS...")
-    notify_result = check_and_notify()
-    results["notify"] = notify_result
-    print(f"     Notified: {notify_result.get('notified', False)}")
-    if notify_result.get("channels"):
-        print(f"     Channels: {', '.join(notify_result['channels'])}")
+    steps = []
+    if high_blogs:
+        steps.append(("blogs_high", lambda: crawl_blogs_step(results, high_blogs, record_schedule)))
+    if "hackernews" in due:
+        steps.append(("hackernews", lambda: crawl_hackernews_step(results, record_schedule)))
+    if other_blogs:
+        steps.append(("blogs", lambda: crawl_blogs_step(results, other_blogs, record_schedule)))
+    if "github" in due:
+        steps.append(("github", lambda: crawl_github_step(results, record_schedule)))
     
-    # Step 5: Summary
-    print("\n[5/5] GENERATING SUMMARY...")
+    try:
+        for i, (name, step) in enumerate(steps):
+            if budget:
+                pending = sum(STEP_WEIGHTS[n] for n, _ in steps[i:])
+                seconds = budget.allot(STEP_WEIGHTS[name], pending)
+                if seconds < scheduler.MIN_STEP_SECONDS:
+                    print(f"  ✗ {name}: skipped, cycle budget spent")
+                    budget.skip(name)
+                    continue
+                http_client.set_deadline(seconds)
+            step()
+    finally:
+        http_client.set_deadline(None)
+        bloom.save(DB_PATH)
     
-    print("\n" + "=" * 60)
-    print("CYCLE COMPLETE")
-    print("=" * 60)
+    # Сколько URL отсёк фильтр Блума до записи в БД
+    results["known_urls"] = bloom.get_cycle_stats(DB_PATH)
+    known = results["known_urls"]
+    print(f"  Known URLs: {known['known']}/{known['checked']} already stored "
+          f"({known['bloom_new']} new by Bloom, {known['false_positive']} false positives)")
     
-    log_run("full_cycle_v2", results)
-    return results
+    # Задержки и состояние circuit breaker по хостам за этот цикл
+    results["hosts"] = http_client.breaker_status(reset_rejected=True)
+    tripped = [f"{host} ({st['state']}, {st['rejected']} rejected)"
+               for host, st in results["hosts"].items() if st["state"] != "closed" or st["rejected"]]
+    if tripped:
+        print(f"  Circuit breaker: {', '.join(tripped)}")
 
 def get_status():
     """Get full system status"""
-    conn = sqlite3.connect(DB_PATH)
+    conn = storage.connect(DB_PATH)
     c = conn.cursor()
     
     status = {
@@ -109,19 +327,18 @@ def get_status():
         "tables": {}
     }
     
+    # Счётчики ведут триггеры (migrations.COUNTED_TABLES) - без COUNT(*) по таблицам
+    counters = migrations.get_counters(DB_PATH)
     for table in ["news", "knowledge", "technologies", "agent_actions", "github_watchlist"]:
-        try:
-            c.execute(f"SELECT COUNT(*) FROM {table}")
-            status["tables"][table] = c.fetchone()[0]
-        except:
-            status["tables"][table] = 0
+        status["tables"][table] = counters.get(table, 0)
     
     # GitHub summary
-    try:
-        c.execute("SELECT COUNT(*) FROM github_watchlist WHERE is_rising_star = 1")
-        status["rising_stars"] = c.fetchone()[0]
-    except:
-        status["rising_stars"] = 0
+    status["rising_stars"] = counters.get("github_watchlist.rising", 0)
+    
+    # Архив: суммы из archive_months, файлы не подключаются
+    c.execute("SELECT COUNT(*), COALESCE(SUM(news), 0), COALESCE(SUM(knowledge), 0) FROM archive_months")
+    months, news, knowledge = c.fetchone()
+    status["archive"] = {"months": months, "news": news, "knowledge": knowledge}
     
     # Recent actions
     c.execute('''SELECT action_type, executed_at FROM agent_actions 
@@ -131,8 +348,8 @@ def get_status():
     conn.close()
     return status
 
-def generate_report():
-    """Generate comprehensive report"""
+def generate_report(months=0):
+    """Generate comprehensive report (months: high relevance news from the last N archived months too)"""
     print("\n" + "=" * 70)
     print("                    AGI NEWS AGENT - FULL REPORT")
     print("=" * 70)
@@ -145,6 +362,8 @@ def generate_report():
     print(f"   Technologies: {status['tables'].get('technologies', 0)}")
     print(f"   GitHub repos: {status['tables'].get('github_watchlist', 0)}")
     print(f"   Rising stars: {status.get('rising_stars', 0)}")
+    print(f"   Archived: {status['archive']['news']} news, {status['archive']['knowledge']} knowledge "
+          f"in {status['archive']['months']} months")
     
     # GitHub summary
     print("\n" + "-" * 70)
@@ -168,7 +387,7 @@ def generate_report():
     print("\n" + "-" * 70)
     print("📰 HIGH RELEVANCE NEWS")
     print("-" * 70)
-    news = get_high_relevance_news(40)
+    news = get_high_relevance_news(40, months)
     for n in news[:5]:
         print(f"   [{n[3]:>3}] {n[1]}: {n[2][:45]}...")
     
@@ -210,20 +429,32 @@ def show_rising_stars():
 
 if __name__ == "__main__":
     cmd = sys.argv[1] if len(sys.argv) > 1 else "status"
+    migrations.migrate(DB_PATH)
     
     if cmd == "run":
-        result = run_full_cycle()
+        replay = sys.argv[sys.argv.index("--replay") + 1] if "--replay" in sys.argv else None
+        deadline = float(sys.argv[sys.argv.index("--deadline") + 1]) if "--deadline" in sys.argv else None
+        result = run_full_cycle(force="--force" in sys.argv, replay=replay, deadline=deadline,
+                                publish_snapshot="--snapshot" in sys.argv,
+                                record="--record" in sys.argv or RECORD_RESPONSES)
         print(json.dumps(result, indent=2))
     elif cmd == "status":
         status = get_status()
         print(json.dumps(status, indent=2))
     elif cmd == "report":
-        generate_report()
+        months = int(sys.argv[sys.argv.index("--months") + 1]) if "--months" in sys.argv else 0
+        generate_report(months)
     elif cmd == "rising":
         show_rising_stars()
     elif cmd == "notify":
         result = check_and_notify()
         print(json.dumps(result, indent=2))
+    elif cmd == "schedule":
+        scheduler.init_schedule_table()
+        print(json.dumps(scheduler.get_schedule(), indent=2))
+    elif cmd == "archive":
+        days = int(sys.argv[2]) if len(sys.argv) > 2 else archive.ARCHIVE_AFTER_DAYS
+        print(json.dumps(archive.archive_old(days), indent=2))
     else:
         print(f"AGI News Agent v2.0")
-        print(f"Commands: run, status, report, rising, notify")
+        print(f"Commands: run [--force] [--record] [--replay <run-id>] [--deadline <seconds>] [--snapshot], status, report [--months N], rising, notify, schedule, archive [days]")
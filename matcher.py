@@ -0,0 +1,263 @@
+#!/usr/bin/env python3
+"""
+Matcher - поиск множества ключевых слов и паттернов за один проход (Aho-Corasick)
+- Ключевые слова ищутся как подстроки без учёта регистра (как `kw in text.lower()`)
+- Regex паттерны разбиваются по альтернативам верхнего уровня; из каждой берётся
+  обязательный литерал-якорь, и regex проверяется только если якорь найден
+- Общий для краулеров (фильтр по ключевым словам) и анализатора (релевантность)
+"""
+import sys
+import re
+import json
+import time
+from collections import namedtuple
+from functools import lru_cache
+
+try:
+    from re import _parser as sre_parse
+except ImportError:   # Python < 3.11
+    import sre_parse
+
+Hit = namedtuple("Hit", "label pattern start end")
+
+# До стольких литералов str.find (в C) быстрее автомата на чистом Python;
+# автомат выигрывает, когда список растёт (см. `python matcher.py bench`)
+DIRECT_SEARCH_MAX = 64
+
+def split_alternatives(pattern):
+    """Split a regex at its top-level | (not inside groups or classes)"""
+    parts, depth, in_class, start, i = [], 0, False, 0, 0
+    while i < len(pattern):
+        ch = pattern[i]
+        if ch == "\\":
+            i += 2
+            continue
+        if in_class:
+            in_class = ch != "]"
+        elif ch == "[":
+            in_class = True
+            # ']' сразу после '[' или '[^' - литерал
+            if pattern[i + 1:i + 2] == "]":
+                i += 1
+            elif pattern[i + 1:i + 3] == "^]":
+                i += 2
+        elif ch == "(":
+            depth += 1
+        elif ch == ")":
+            depth -= 1
+        elif ch == "|" and depth == 0:
+            parts.append(pattern[start:i])
+            start = i + 1
+        i += 1
+    parts.append(pattern[start:])
+    return parts
+
+def parse_regex(pattern):
+    try:
+        return sre_parse.parse(pattern)
+    except re.error:
+        return None
+
+def is_literal(pattern):
+    """True if the regex matches only one fixed string"""
+    parsed = parse_regex(pattern)
+    return parsed is not None and all(op is sre_parse.LITERAL for op, _ in parsed)
+
+def literal_anchor(pattern):
+    """Longest literal run every match of the regex must contain ('' if none)"""
+    parsed = parse_regex(pattern)
+    if parsed is None:
+        return ""
+    best, run = "", []
+    for op, av in parsed:
+        if op is sre_parse.LITERAL:
+            run.append(chr(av))
+            continue
+        if len("".join(run)) > len(best):
+            best = "".join(run)
+        run = []
+    if len("".join(run)) > len(best):
+        best = "".join(run)
+    return best.lower()
+
+class Matcher:
+    """Aho-Corasick automaton over keywords and regex anchors
+
+    patterns: list of strings (label = the pattern) or dict {label: [patterns]}.
+    regex=True treats the patterns as regular expressions (case-insensitive).
+    """
+    def __init__(self, patterns, regex=False):
+        if not isinstance(patterns, dict):
+            patterns = {p: [p] for p in patterns}
+        self.entries = [(label, p) for label, group in patterns.items() for p in group]
+        self.compiled = {}   # индекс записи -> regex, требующий проверки
+        self.unanchored = []
+
+        # Литералы автомата: слово -> индексы записей, которым оно принадлежит
+        literals = {}
+        for idx, (label, pattern) in enumerate(self.entries):
+            if not regex:
+                literals.setdefault(pattern.lower(), []).append(idx)
+                continue
+            alternatives = split_alternatives(pattern)
+            if all(is_literal(alt) for alt in alternatives):
+                # Чистые литералы: попадание в автомате и есть совпадение
+                for alt in set(literal_anchor(alt) for alt in alternatives):
+                    literals.setdefault(alt, []).append(idx)
+                continue
+            self.compiled[idx] = re.compile(pattern, re.I)
+            anchors = [literal_anchor(alt) for alt in alternatives]
+            if not all(anchors):
+                # Хотя бы у одной альтернативы нет литерала - проверяем всегда
+                self.unanchored.append(idx)
+                continue
+            for anchor in set(anchors):
+                literals.setdefault(anchor, []).append(idx)
+        self.build(literals)
+
+    def build(self, literals):
+        """Build the trie, failure links and a full transition table"""
+        self.literals = [(word, tuple(idxs)) for word, idxs in literals.items()]
+        self.direct = len(self.literals) <= DIRECT_SEARCH_MAX
+        if self.direct:
+            return
+        goto = [{}]
+        out = [[]]
+        for word, idxs in literals.items():
+            state = 0
+            for ch in word:
+                nxt = goto[state].get(ch)
+                if nxt is None:
+                    nxt = len(goto)
+                    goto[state][ch] = nxt
+                    goto.append({})
+                    out.append([])
+                state = nxt
+            out[state].extend((idx, len(word)) for idx in idxs)
+
+        # BFS: ссылки отказа и слияние выходов; переходы разворачиваются в полную
+        # таблицу, чтобы при сканировании не ходить по ссылкам отказа
+        fail = [0] * len(goto)
+        delta = [dict(goto[0])] + [None] * (len(goto) - 1)
+        queue = list(goto[0].values())
+        for state in queue:
+            delta[state] = dict(delta[fail[state]])
+            delta[state].update(goto[state])
+            out[state] = out[state] + out[fail[state]]
+            for ch, nxt in goto[state].items():
+                fail[nxt] = delta[fail[state]].get(ch, 0) if state else 0
+                queue.append(nxt)
+        self.delta = delta
+        self.out = [tuple(o) for o in out]
+
+    def scan(self, text):
+        """Yield (entry index, start, end) of literal hits in lowercased text"""
+        if self.direct:
+            for word, idxs in self.literals:
+                start = text.find(word)
+                while start >= 0:
+                    for idx in idxs:
+                        yield idx, start, start + len(word)
+                    start = text.find(word, start + 1)
+            return
+        delta, out = self.delta, self.out
+        state = 0
+        for i, ch in enumerate(text):
+            state = delta[state].get(ch, 0)
+            if out[state]:
+                for idx, length in out[state]:
+                    yield idx, i - length + 1, i + 1
+
+    def find_all(self, text):
+        """Every keyword/pattern hit with its position, ordered by start"""
+        text = (text or "").lower()
+        hits = []
+        candidates = set(self.unanchored)
+        for idx, start, end in self.scan(text):
+            if idx in self.compiled:
+                candidates.add(idx)
+            else:
+                label, pattern = self.entries[idx]
+                hits.append(Hit(label, pattern, start, end))
+        for idx in candidates:
+            label, pattern = self.entries[idx]
+            for m in self.compiled[idx].finditer(text):
+                if m.end() > m.start():
+                    hits.append(Hit(label, pattern, m.start(), m.end()))
+        hits.sort(key=lambda h: (h.start, h.end))
+        return hits
+
+    def matched(self, text):
+        """{label: [patterns hit]} in declaration order, each pattern once"""
+        text = (text or "").lower()
+        hit = {idx for idx, _, _ in self.scan(text)}
+        if self.compiled:
+            candidates = hit.intersection(self.compiled)
+            candidates.update(self.unanchored)
+            hit.difference_update(self.compiled)
+            hit.update(idx for idx in candidates if self.compiled[idx].search(text))
+        result = {}
+        for idx in sorted(hit):
+            label, pattern = self.entries[idx]
+            result.setdefault(label, []).append(pattern)
+        return result
+
+    def search(self, text):
+        """True if anything matches (stops at the first hit)"""
+        text = (text or "").lower()
+        candidates = set(self.unanchored)
+        for idx, _, _ in self.scan(text):
+            if idx not in self.compiled:
+                return True
+            candidates.add(idx)
+        return any(self.compiled[idx].search(text) for idx in candidates)
+
+@lru_cache(maxsize=64)
+def _keyword_matcher(keywords):
+    return Matcher(list(keywords))
+
+def keyword_matcher(keywords):
+    """Shared matcher for a keyword list (built once per distinct list)"""
+    return _keyword_matcher(tuple(keywords))
+
+def benchmark(sizes=(10, 32, 100, 1000, 5000), texts=2000):
+    """Compare the automaton with `any(kw in text)` as the keyword list grows"""
+    import random
+
+    rnd = random.Random(42)
+    alphabet = "abcdefghijklmnopqrstuvwxyz"
+    vocab = sorted({"".join(rnd.choice(alphabet) for _ in range(rnd.randint(4, 10))) for _ in range(20000)})
+    samples = [" ".join(rnd.choice(vocab) for _ in range(rnd.randint(8, 30))) for _ in range(texts)]
+
+    results = []
+    for size in sizes:
+        keywords = rnd.sample(vocab, size)
+        matcher = Matcher(keywords)
+        matcher.matched(samples[0])   # прогрев
+
+        started = time.perf_counter()
+        expected = [[kw for kw in keywords if kw in t] for t in samples]
+        naive = time.perf_counter() - started
+
+        started = time.perf_counter()
+        got = [matcher.matched(t) for t in samples]
+        automaton = time.perf_counter() - started
+
+        assert [sorted(g) for g in got] == [sorted(e) for e in expected]
+        results.append({
+            "keywords": size,
+            "naive_us_per_text": round(naive / texts * 1e6, 1),
+            "automaton_us_per_text": round(automaton / texts * 1e6, 1),
+            "speedup": round(naive / automaton, 2)
+        })
+    return results
+
+if __name__ == "__main__":
+    cmd = sys.argv[1] if len(sys.argv) > 1 else "bench"
+
+    if cmd == "bench":
+        for row in benchmark():
+            print(json.dumps(row))
+    elif cmd == "anchors":
+        for pattern in sys.argv[2:]:
+            print(pattern, "->", [literal_anchor(alt) for alt in split_alternatives(pattern)])
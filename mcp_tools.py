@@ -4,21 +4,25 @@ MCP Tools для AGI News Agent
 Позволяет управлять агентом через MCP-HUB
 """
 import json
-import sqlite3
 from pathlib import Path
 
+import storage
+import migrations
+import archive
+from analyzer.news_analyzer import search_news
+
 DB_PATH = Path(__file__).parent / "knowledge" / "news.db"
 
 def tool_agent_status():
     """Get AGI Agent status"""
-    conn = sqlite3.connect(DB_PATH)
+    conn = storage.connect(DB_PATH)
     c = conn.cursor()
     
     status = {"agent": "AGI News Agent", "status": "active"}
     
+    counters = migrations.get_counters(DB_PATH)
     for table in ["news", "knowledge", "technologies", "agent_actions"]:
-        c.execute(f"SELECT COUNT(*) FROM {table}")
-        status[table] = c.fetchone()[0]
+        status[table] = counters.get(table, 0)
     
     c.execute("SELECT action_type, executed_at FROM agent_actions ORDER BY id DESC LIMIT 1")
     last = c.fetchone()
@@ -28,20 +32,33 @@ def tool_agent_status():
     conn.close()
     return status
 
-def tool_agent_news(limit=5, min_score=30):
-    """Get relevant news from agent"""
-    conn = sqlite3.connect(DB_PATH)
+def tool_agent_news(limit=5, min_score=30, months=0):
+    """Get relevant news from agent (months: include the last N archived months)"""
+    conn = storage.connect(DB_PATH)
     c = conn.cursor()
-    c.execute('''SELECT source, title, relevance_score, url FROM news 
-                 WHERE relevance_score >= ? ORDER BY relevance_score DESC LIMIT ?''',
-              (min_score, limit))
-    results = [{"source": r[0], "title": r[1], "score": r[2], "url": r[3]} for r in c.fetchall()]
-    conn.close()
+    table = "news"
+    try:
+        if months:
+            archive.attach_archives(conn, months, DB_PATH)
+            table = "news_all"
+        c.execute(f'''SELECT source, title, relevance_score, url FROM {table} 
+                      WHERE relevance_score >= ? ORDER BY relevance_score DESC LIMIT ?''',
+                  (min_score, limit))
+        results = [{"source": r[0], "title": r[1], "score": r[2], "url": r[3]} for r in c.fetchall()]
+    finally:
+        if months:
+            archive.close_archives(conn)
+        conn.close()
     return results
 
+def tool_agent_search(query="", limit=10):
+    """Full-text search over collected news"""
+    return [{"source": r[1], "title": r[2], "score": r[4], "url": r[3], "snippet": r[5]}
+            for r in search_news(query, limit)]
+
 def tool_agent_technologies():
     """Get discovered technologies"""
-    conn = sqlite3.connect(DB_PATH)
+    conn = storage.connect(DB_PATH)
     c = conn.cursor()
     c.execute('''SELECT name, description, status FROM technologies ORDER BY id DESC''')
     results = [{"name": r[0], "description": r[1], "status": r[2]} for r in c.fetchall()]
@@ -61,6 +78,7 @@ def tool_agent_run():
 TOOLS = {
     "agent_status": tool_agent_status,
     "agent_news": tool_agent_news,
+    "agent_search": tool_agent_search,
     "agent_technologies": tool_agent_technologies,
     "agent_run": tool_agent_run
 }
@@ -68,8 +86,12 @@ TOOLS = {
 if __name__ == "__main__":
     import sys
     cmd = sys.argv[1] if len(sys.argv) > 1 else "status"
+    migrations.migrate(DB_PATH)
     
-    if cmd in TOOLS:
+    if cmd == "agent_search":
+        result = tool_agent_search(" ".join(sys.argv[2:]))
+        print(json.dumps(result, indent=2, ensure_ascii=False))
+    elif cmd in TOOLS:
         result = TOOLS[cmd]()
         print(json.dumps(result, indent=2, ensure_ascii=False))
     else:
@@ -0,0 +1,433 @@
+#!/usr/bin/env python3
+"""
+Migrations - версионированная схема БД
+- Все таблицы и индексы создаются здесь; номер применённой версии хранится в schema_version
+- Миграции идут по порядку и идемпотентны (IF NOT EXISTS, проверка колонок), поэтому
+  старая БД, созданная прежними init_* функциями, доводится до текущей схемы без потерь
+- migrate() выполняется один раз на процесс и файл БД; повторные вызовы ничего не стоят
+"""
+import sys
+import json
+import tempfile
+import threading
+from pathlib import Path
+
+import storage
+import dedup
+
+DB_PATH = Path(__file__).parent / "knowledge" / "news.db"
+
+def add_column(c, table, column, definition):
+    c.execute(f"PRAGMA table_info({table})")
+    if column not in [r[1] for r in c.fetchall()]:
+        c.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+
+def m001_core(c):
+    c.execute('''CREATE TABLE IF NOT EXISTS news (
+        id INTEGER PRIMARY KEY,
+        source TEXT, title TEXT, content TEXT, url TEXT UNIQUE,
+        crawled_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        analyzed BOOLEAN DEFAULT 0, relevance_score REAL DEFAULT 0
+    )''')
+
+    c.execute('''CREATE TABLE IF NOT EXISTS knowledge (
+        id INTEGER PRIMARY KEY, news_id INTEGER,
+        category TEXT, key TEXT, value TEXT,
+        importance TEXT DEFAULT 'medium',
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )''')
+
+    c.execute('''CREATE TABLE IF NOT EXISTS technologies (
+        id INTEGER PRIMARY KEY, name TEXT UNIQUE, description TEXT,
+        source_news_id INTEGER, status TEXT DEFAULT 'discovered',
+        architecture TEXT, implementation_plan TEXT, deployed_at TIMESTAMP
+    )''')
+
+    c.execute('''CREATE TABLE IF NOT EXISTS agent_actions (
+        id INTEGER PRIMARY KEY, action_type TEXT, description TEXT,
+        input_data TEXT, output_data TEXT, success BOOLEAN,
+        executed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )''')
+
+def m002_crawler_state(c):
+    c.execute('''CREATE TABLE IF NOT EXISTS hn_items (
+        id INTEGER PRIMARY KEY,
+        title TEXT,
+        url TEXT,
+        score INTEGER,
+        descendants INTEGER,
+        matched BOOLEAN,
+        filter_key TEXT,
+        fetched_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )''')
+
+    c.execute('''CREATE TABLE IF NOT EXISTS crawler_state (
+        key TEXT PRIMARY KEY,
+        value TEXT,
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )''')
+
+    c.execute('''CREATE TABLE IF NOT EXISTS feed_validators (
+        url TEXT PRIMARY KEY,
+        etag TEXT,
+        last_modified TEXT,
+        fetch_count INTEGER DEFAULT 0,
+        not_modified_count INTEGER DEFAULT 0,
+        checked_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )''')
+
+    c.execute('''CREATE TABLE IF NOT EXISTS crawl_schedule (
+        source TEXT PRIMARY KEY,
+        interval REAL,
+        min_interval REAL,
+        max_interval REAL,
+        last_run REAL,
+        next_run REAL,
+        runs INTEGER DEFAULT 0,
+        productive_runs INTEGER DEFAULT 0,
+        last_new INTEGER DEFAULT 0,
+        new_rate REAL DEFAULT 0
+    )''')
+
+def m003_github(c):
+    c.execute('''CREATE TABLE IF NOT EXISTS github_watchlist (
+        id INTEGER PRIMARY KEY,
+        repo_name TEXT UNIQUE,
+        url TEXT,
+        description TEXT,
+        stars INTEGER,
+        forks INTEGER,
+        language TEXT,
+        category TEXT,
+        status TEXT DEFAULT 'watching',
+        is_rising_star BOOLEAN DEFAULT 0,
+        stars_per_day REAL,
+        created_at TEXT,
+        first_seen TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        last_updated TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        notes TEXT
+    )''')
+
+    c.execute('''CREATE TABLE IF NOT EXISTS github_history (
+        id INTEGER PRIMARY KEY,
+        repo_name TEXT,
+        stars INTEGER,
+        forks INTEGER,
+        recorded_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )''')
+
+    add_column(c, "github_watchlist", "pushed_at", "TEXT")
+    # Звёзды до последнего UPSERT в update_watchlist (NULL - ещё не обновлялся)
+    add_column(c, "github_watchlist", "prev_stars", "INTEGER")
+
+def m004_alerts(c):
+    c.execute('''CREATE TABLE IF NOT EXISTS alerts (
+        id INTEGER PRIMARY KEY, alert_type TEXT, title TEXT, message TEXT,
+        url TEXT, priority TEXT DEFAULT 'normal', sent BOOLEAN DEFAULT 0,
+        sent_at TIMESTAMP, created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )''')
+
+def m005_dedup(c):
+    add_column(c, "news", "duplicate_of", "INTEGER")
+    c.execute(f'''CREATE TABLE IF NOT EXISTS news_fingerprints (
+        news_id INTEGER PRIMARY KEY,
+        {", ".join(f"band{i} INTEGER" for i in range(dedup.BANDS))}
+    )''')
+    for i in range(dedup.BANDS):
+        c.execute(f"CREATE INDEX IF NOT EXISTS idx_fingerprints_band{i} ON news_fingerprints(band{i})")
+
+def m006_query_indexes(c):
+    # Предикаты дашбордов, нотификатора и анализатора (см. HOT_QUERIES)
+    c.execute("CREATE INDEX IF NOT EXISTS idx_news_analyzed ON news(analyzed)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_news_relevance ON news(relevance_score)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_news_crawled_at ON news(crawled_at)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_news_source ON news(source)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_watchlist_rising ON github_watchlist(is_rising_star, stars_per_day)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_watchlist_stars ON github_watchlist(stars)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_watchlist_category ON github_watchlist(category, stars_per_day)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_history_repo ON github_history(repo_name, recorded_at)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_actions_executed_at ON agent_actions(executed_at)")
+
+# Таблицы, число строк которых ведут триггеры в table_counters
+COUNTED_TABLES = ["news", "knowledge", "technologies", "agent_actions", "github_watchlist", "github_history"]
+# Счётчики по условию: имя -> (таблица, условие над строкой; NEW./OLD. подставляются)
+COUNTED_FILTERS = {
+    "github_watchlist.rising": ("github_watchlist", "COALESCE({row}.is_rising_star, 0) = 1"),
+}
+
+def m007_table_counters(c):
+    c.execute('''CREATE TABLE IF NOT EXISTS table_counters (
+        name TEXT PRIMARY KEY,
+        value INTEGER NOT NULL DEFAULT 0
+    )''')
+    for table in COUNTED_TABLES:
+        c.execute(f'''CREATE TRIGGER IF NOT EXISTS trg_count_{table}_insert AFTER INSERT ON {table}
+                     BEGIN UPDATE table_counters SET value = value + 1 WHERE name = '{table}'; END''')
+        c.execute(f'''CREATE TRIGGER IF NOT EXISTS trg_count_{table}_delete AFTER DELETE ON {table}
+                     BEGIN UPDATE table_counters SET value = value - 1 WHERE name = '{table}'; END''')
+    for name, (table, condition) in COUNTED_FILTERS.items():
+        new, old = condition.format(row="NEW"), condition.format(row="OLD")
+        trigger = name.replace(".", "_")
+        c.execute(f'''CREATE TRIGGER IF NOT EXISTS trg_count_{trigger}_insert AFTER INSERT ON {table}
+                     WHEN {new}
+                     BEGIN UPDATE table_counters SET value = value + 1 WHERE name = '{name}'; END''')
+        c.execute(f'''CREATE TRIGGER IF NOT EXISTS trg_count_{trigger}_delete AFTER DELETE ON {table}
+                     WHEN {old}
+                     BEGIN UPDATE table_counters SET value = value - 1 WHERE name = '{name}'; END''')
+        c.execute(f'''CREATE TRIGGER IF NOT EXISTS trg_count_{trigger}_update AFTER UPDATE ON {table}
+                     WHEN ({new}) != ({old})
+                     BEGIN UPDATE table_counters SET value = value + ({new}) - ({old})
+                           WHERE name = '{name}'; END''')
+    recount(c)
+
+def recount(c):
+    """Set every counter from COUNT(*); {name: (stored, actual)} of the ones that drifted"""
+    c.execute("SELECT name, value FROM table_counters")
+    stored = dict(c.fetchall())
+    actual = {}
+    for table in COUNTED_TABLES:
+        c.execute(f"SELECT COUNT(*) FROM {table}")
+        actual[table] = c.fetchone()[0]
+    for name, (table, condition) in COUNTED_FILTERS.items():
+        c.execute(f"SELECT COUNT(*) FROM {table} WHERE {condition.format(row=table)}")
+        actual[name] = c.fetchone()[0]
+    c.executemany("INSERT OR REPLACE INTO table_counters (name, value) VALUES (?, ?)", actual.items())
+    return {name: (stored.get(name), value) for name, value in actual.items() if stored.get(name) != value}
+
+def m008_history_rollups(c):
+    # Сжатая история звёзд: сырые точки -> часовые -> дневные (compact_history в github_advanced)
+    for table in ("github_history_hourly", "github_history_daily"):
+        c.execute(f'''CREATE TABLE IF NOT EXISTS {table} (
+            repo_name TEXT,
+            bucket TEXT,
+            min_stars INTEGER, max_stars INTEGER, last_stars INTEGER,
+            min_forks INTEGER, max_forks INTEGER, last_forks INTEGER,
+            last_at TIMESTAMP,
+            samples INTEGER,
+            PRIMARY KEY (repo_name, bucket)
+        ) WITHOUT ROWID''')
+        c.execute(f"CREATE INDEX IF NOT EXISTS idx_{table}_last_at ON {table}(last_at)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_history_recorded_at ON github_history(recorded_at)")
+    # Одна последовательность точек для запросов роста; уровни не пересекаются по времени
+    c.execute('''CREATE VIEW IF NOT EXISTS github_history_series AS
+        SELECT repo_name, recorded_at, stars, forks, 'raw' AS resolution FROM github_history
+        UNION ALL
+        SELECT repo_name, last_at, last_stars, last_forks, 'hourly' FROM github_history_hourly
+        UNION ALL
+        SELECT repo_name, last_at, last_stars, last_forks, 'daily' FROM github_history_daily''')
+    add_column(c, "github_watchlist", "prev_forks", "INTEGER")
+
+# Определение news_fts - то же самое в архивных файлах (archive.py)
+NEWS_FTS = ("fts5(title, content, content='news', content_rowid='id', "
+            "tokenize='porter unicode61 remove_diacritics 2')")
+NEWS_FTS_RANK = "bm25(10.0, 1.0)"
+
+def m009_news_fts(c):
+    # Внешний контент: индекс хранит только токены, текст остаётся в news
+    c.execute(f"CREATE VIRTUAL TABLE IF NOT EXISTS news_fts USING {NEWS_FTS}")
+    c.execute('''CREATE TRIGGER IF NOT EXISTS trg_news_fts_insert AFTER INSERT ON news BEGIN
+        INSERT INTO news_fts (rowid, title, content) VALUES (NEW.id, NEW.title, NEW.content);
+    END''')
+    c.execute('''CREATE TRIGGER IF NOT EXISTS trg_news_fts_delete AFTER DELETE ON news BEGIN
+        INSERT INTO news_fts (news_fts, rowid, title, content) VALUES ('delete', OLD.id, OLD.title, OLD.content);
+    END''')
+    # Только при смене текста - обновления analyzed/relevance_score индекс не трогают
+    c.execute('''CREATE TRIGGER IF NOT EXISTS trg_news_fts_update AFTER UPDATE OF title, content ON news BEGIN
+        INSERT INTO news_fts (news_fts, rowid, title, content) VALUES ('delete', OLD.id, OLD.title, OLD.content);
+        INSERT INTO news_fts (rowid, title, content) VALUES (NEW.id, NEW.title, NEW.content);
+    END''')
+    # BM25: совпадение в заголовке весит в 10 раз больше, чем в тексте
+    c.execute("INSERT INTO news_fts (news_fts, rank) VALUES ('rank', ?)", (NEWS_FTS_RANK,))
+    c.execute("INSERT INTO news_fts (news_fts) VALUES ('rebuild')")
+
+def m010_archive(c):
+    # Строки, вынесенные в knowledge/archive/news-YYYY-MM.db (archive.py)
+    c.execute('''CREATE TABLE IF NOT EXISTS archive_months (
+        month TEXT PRIMARY KEY,
+        path TEXT,
+        news INTEGER DEFAULT 0,
+        knowledge INTEGER DEFAULT 0,
+        archived_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )''')
+    # URL архивных новостей остаются известными краулерам и Bloom-фильтру
+    c.execute('''CREATE TABLE IF NOT EXISTS archived_urls (
+        url TEXT PRIMARY KEY,
+        month TEXT
+    ) WITHOUT ROWID''')
+    c.execute("CREATE INDEX IF NOT EXISTS idx_knowledge_created_at ON knowledge(created_at)")
+
+def m011_canonical_urls(c):
+    # URL, сохранённые до dedup.canonicalize_url (или прежней её версией, которая меняла
+    # http на https и резала source/ref), приводятся к текущей форме - сравнение при
+    # вставке идёт по ней. Совпавшая после приведения строка становится дубликатом старшей
+    from dedup import canonicalize_url
+    rows = c.execute("SELECT id, url FROM news WHERE url IS NOT NULL ORDER BY id").fetchall()
+    for news_id, url in rows:
+        canonical = canonicalize_url(url)
+        if canonical == url:
+            continue
+        existing = c.execute("SELECT id FROM news WHERE url = ?", (canonical,)).fetchone()
+        if existing:
+            c.execute("UPDATE news SET duplicate_of = ? WHERE id = ? AND duplicate_of IS NULL",
+                      (existing[0], news_id))
+        else:
+            c.execute("UPDATE news SET url = ? WHERE id = ?", (canonical, news_id))
+    for url, month in c.execute("SELECT url, month FROM archived_urls").fetchall():
+        canonical = canonicalize_url(url)
+        if canonical != url:
+            c.execute("INSERT OR IGNORE INTO archived_urls (url, month) VALUES (?, ?)", (canonical, month))
+            c.execute("DELETE FROM archived_urls WHERE url = ?", (url,))
+
+# (версия, название, функция) - только дописывать в конец, не менять применённые
+MIGRATIONS = [
+    (1, "core tables", m001_core),
+    (2, "crawler state tables", m002_crawler_state),
+    (3, "github watchlist", m003_github),
+    (4, "alerts", m004_alerts),
+    (5, "near-duplicate fingerprints", m005_dedup),
+    (6, "indexes for hot queries", m006_query_indexes),
+    (7, "trigger-maintained table counters", m007_table_counters),
+    (8, "github history rollups", m008_history_rollups),
+    (9, "news full-text search", m009_news_fts),
+    (10, "monthly news archive", m010_archive),
+    (11, "canonical news urls", m011_canonical_urls),
+]
+
+# Запросы дашбордов и нотификатора, которые не должны читать таблицу целиком
+HOT_QUERIES = {
+    "web_api.rising": ('''SELECT repo_name, url, stars, stars_per_day, category, description
+                          FROM github_watchlist WHERE is_rising_star = 1
+                          ORDER BY stars_per_day DESC LIMIT 20''', ()),
+    "web_api.watchlist": ('''SELECT repo_name, url, stars, stars_per_day, category, is_rising_star
+                             FROM github_watchlist ORDER BY stars DESC LIMIT ?''', (20,)),
+    "web_api.news": ('''SELECT title, url, relevance_score, source FROM news
+                        WHERE relevance_score >= ? ORDER BY relevance_score DESC LIMIT ?''', (30, 20)),
+    "alerts_api.rising": ('''SELECT repo_name, stars, stars_per_day, url FROM github_watchlist
+                             WHERE category IN ('rising', 'hot') ORDER BY stars_per_day DESC LIMIT 20''', ()),
+    "notifier.rising": ('''SELECT repo_name, url, stars, stars_per_day, category
+                           FROM github_watchlist
+                           WHERE is_rising_star = 1 AND status = 'watching'
+                           AND stars_per_day >= ?
+                           ORDER BY stars_per_day DESC LIMIT 10''', (5,)),
+    "notifier.established": ('''SELECT repo_name, url, stars, category
+                                FROM github_watchlist
+                                WHERE stars >= ? AND status = 'watching'
+                                ORDER BY stars DESC LIMIT 10''', (10000,)),
+    "notifier.news": ('''SELECT title, url, relevance_score, source
+                         FROM news WHERE relevance_score >= ? AND duplicate_of IS NULL
+                         ORDER BY crawled_at DESC LIMIT 5''', (50,)),
+    "alerts.blogs": ('''SELECT source, title, content, url FROM news
+                        WHERE source GLOB 'blog_*' AND relevance_score >= 30
+                        ORDER BY id DESC LIMIT 10''', ()),
+    "analyzer.unanalyzed": ("SELECT id, source, title, content, url FROM news WHERE analyzed = 0", ()),
+    "analyzer.high_relevance": ('''SELECT id, source, title, relevance_score, url
+                                   FROM news WHERE relevance_score >= ? AND duplicate_of IS NULL
+                                   ORDER BY relevance_score DESC''', (50,)),
+    "main.recent_actions": ('''SELECT action_type, executed_at FROM agent_actions
+                               ORDER BY executed_at DESC LIMIT 3''', ()),
+}
+
+_migrated = set()
+_lock = threading.Lock()
+
+def current_version(c):
+    c.execute('''CREATE TABLE IF NOT EXISTS schema_version (
+        version INTEGER PRIMARY KEY,
+        name TEXT,
+        applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )''')
+    c.execute("SELECT COALESCE(MAX(version), 0) FROM schema_version")
+    return c.fetchone()[0]
+
+def migrate(db_path=DB_PATH):
+    """Apply pending migrations (once per process and database file)"""
+    key = str(storage.resolve(db_path))
+    if key in _migrated:
+        return []
+    with _lock:
+        if key in _migrated:
+            return []
+        Path(key).parent.mkdir(parents=True, exist_ok=True)
+        applied = []
+        conn = storage.connect(db_path)
+        behind = current_version(conn.cursor()) < MIGRATIONS[-1][0]
+        conn.close()
+        if behind:
+            # transaction() берёт BEGIN IMMEDIATE: второй процесс ждёт и потом видит уже новую версию
+            with storage.transaction(db_path) as conn:
+                c = conn.cursor()
+                version = current_version(c)
+                for number, name, func in MIGRATIONS:
+                    if number > version:
+                        func(c)
+                        c.execute("INSERT INTO schema_version (version, name) VALUES (?, ?)", (number, name))
+                        applied.append(number)
+        if applied:
+            conn = storage.connect(db_path)
+            conn.execute("PRAGMA optimize")
+            conn.close()
+        _migrated.add(key)
+        return applied
+
+def get_versions(db_path=DB_PATH):
+    conn = storage.connect(db_path)
+    c = conn.cursor()
+    current_version(c)
+    c.execute("SELECT version, name, applied_at FROM schema_version ORDER BY version")
+    rows = c.fetchall()
+    conn.close()
+    return rows
+
+def read_counters(conn):
+    """{table or counter name: rows} from table_counters of an open connection"""
+    return dict(conn.execute("SELECT name, value FROM table_counters").fetchall())
+
+def get_counters(db_path=DB_PATH):
+    """{table or counter name: rows} from table_counters - O(1), no COUNT(*)"""
+    migrate(db_path)
+    conn = storage.connect(db_path)
+    counters = read_counters(conn)
+    conn.close()
+    return counters
+
+def query_plan(conn, sql, params=()):
+    return [row[3] for row in conn.execute(f"EXPLAIN QUERY PLAN {sql}", params)]
+
+def check_query_plans(db_path=None):
+    """{query: plan} of HOT_QUERIES that scan a table without an index
+
+    Runs against db_path, or against a freshly migrated empty database.
+    """
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = db_path or Path(tmp) / "news.db"
+        migrate(db_path)
+        conn = storage.connect(db_path)
+        problems = {}
+        for name, (sql, params) in HOT_QUERIES.items():
+            plan = query_plan(conn, sql, params)
+            if any(step.startswith("SCAN") and "INDEX" not in step for step in plan):
+                problems[name] = plan
+        conn.close()
+        storage.close_all()
+    return problems
+
+if __name__ == "__main__":
+    cmd = sys.argv[1] if len(sys.argv) > 1 else "migrate"
+
+    if cmd == "migrate":
+        print(json.dumps({"applied": migrate()}))
+    elif cmd == "status":
+        for version, name, applied_at in get_versions():
+            print(f"  {version:>3}  {name:<36} {applied_at}")
+    elif cmd == "counters":
+        print(json.dumps(get_counters(), indent=2))
+    elif cmd == "recount":
+        migrate()
+        with storage.transaction(DB_PATH) as conn:
+            print(json.dumps({"drifted": recount(conn.cursor())}))
+    elif cmd == "check":
+        problems = check_query_plans(sys.argv[2] if len(sys.argv) > 2 else None)
+        for name, plan in problems.items():
+            print(f"  FULL SCAN {name}: {plan}")
+        assert not problems, f"{len(problems)} queries scan a whole table"
+        print(f"OK: {len(HOT_QUERIES)} queries use indexes")
@@ -3,16 +3,16 @@
 Notifier - система уведомлений о находках агента
 Поддержка: Telegram, Webhook, File
 """
-import sqlite3
 import json
-import urllib.request
-import ssl
 from datetime import datetime
 from pathlib import Path
 
+import http_client
+import storage
+import migrations
+
 DB_PATH = Path(__file__).parent / "knowledge" / "news.db"
 CONFIG_PATH = Path(__file__).parent / "notifier_config.json"
-ssl._create_default_https_context = ssl._create_unverified_context
 
 # Default config
 DEFAULT_CONFIG = {
@@ -57,17 +57,15 @@ def send_telegram(message, config):
     chat_id = config["telegram"]["chat_id"]
     
     url = f"https://api.telegram.org/bot{token}/sendMessage"
-    data = json.dumps({
+    payload = {
         "chat_id": chat_id,
         "text": message,
         "parse_mode": "HTML"
-    }).encode('utf-8')
+    }
     
     try:
-        req = urllib.request.Request(url, data=data, 
-                                     headers={"Content-Type": "application/json"})
-        with urllib.request.urlopen(req, timeout=10) as response:
-            return response.status == 200
+        response = http_client.post_json(url, payload, timeout=10)
+        return response.status == 200
     except Exception as e:
         print(f"Telegram error: {e}")
         return False
@@ -78,11 +76,8 @@ def send_webhook(payload, config):
         return False
     
     try:
-        data = json.dumps(payload).encode('utf-8')
-        req = urllib.request.Request(config["webhook"]["url"], data=data,
-                                     headers={"Content-Type": "application/json"})
-        with urllib.request.urlopen(req, timeout=10) as response:
-            return response.status == 200
+        response = http_client.post_json(config["webhook"]["url"], payload, timeout=10)
+        return response.status == 200
     except Exception as e:
         print(f"Webhook error: {e}")
         return False
@@ -142,7 +137,8 @@ def check_and_notify():
     config = load_config()
     thresholds = config["thresholds"]
     
-    conn = sqlite3.connect(DB_PATH)
+    conn = storage.connect(DB_PATH)
+    migrations.migrate(DB_PATH)
     c = conn.cursor()
     
     findings = {
@@ -180,7 +176,7 @@ def check_and_notify():
     
     # Check high relevance news
     c.execute('''SELECT title, url, relevance_score, source
-                 FROM news WHERE relevance_score >= ?
+                 FROM news WHERE relevance_score >= ? AND duplicate_of IS NULL
                  ORDER BY crawled_at DESC LIMIT 5''',
               (thresholds["min_relevance"],))
     
@@ -303,7 +299,8 @@ def send_to_channel(channel_id=None):
         return {"error": "No channel_id configured"}
     
     # Get findings
-    conn = sqlite3.connect(DB_PATH)
+    conn = storage.connect(DB_PATH)
+    migrations.migrate(DB_PATH)
     c = conn.cursor()
     
     findings = {"rising_stars": [], "high_value": []}
@@ -332,17 +329,17 @@ def send_to_channel(channel_id=None):
     token = config["telegram"]["bot_token"]
     
     url = f"https://api.telegram.org/bot{token}/sendMessage"
-    data = json.dumps({
+    payload = {
         "chat_id": channel_id,
         "text": msg,
         "parse_mode": "HTML",
         "disable_web_page_preview": True
-    }).encode('utf-8')
+    }
     
     try:
-        req = urllib.request.Request(url, data=data,
-                                     headers={"Content-Type": "application/json"})
-        with urllib.request.urlopen(req, timeout=10) as response:
-            return {"success": True, "channel_id": channel_id}
+        response = http_client.post_json(url, payload, timeout=10)
+        if response.status != 200:
+            return {"error": f"HTTP {response.status}"}
+        return {"success": True, "channel_id": channel_id}
     except Exception as e:
         return {"error": str(e)}
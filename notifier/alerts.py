@@ -1,14 +1,20 @@
 #!/usr/bin/env python3
 """Alert System - Notifications for important discoveries"""
-import sqlite3
+import sys
 import json
 import urllib.request
 import ssl
 from datetime import datetime, timedelta
 from pathlib import Path
 
-DB_PATH = Path(__file__).parent.parent / "knowledge" / "news.db"
-ALERTS_FILE = Path(__file__).parent.parent / "logs" / "alerts.json"
+BASE_DIR = Path(__file__).parent.parent
+DB_PATH = BASE_DIR / "knowledge" / "news.db"
+ALERTS_FILE = BASE_DIR / "logs" / "alerts.json"
+
+sys.path.insert(0, str(BASE_DIR))
+import storage
+import migrations
+
 ssl._create_default_https_context = ssl._create_unverified_context
 
 CONFIG = {
@@ -20,18 +26,10 @@ CONFIG = {
 }
 
 def init_alerts_table():
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
-    c.execute('''CREATE TABLE IF NOT EXISTS alerts (
-        id INTEGER PRIMARY KEY, alert_type TEXT, title TEXT, message TEXT,
-        url TEXT, priority TEXT DEFAULT 'normal', sent BOOLEAN DEFAULT 0,
-        sent_at TIMESTAMP, created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-    )''')
-    conn.commit()
-    conn.close()
+    migrations.migrate(DB_PATH)
 
 def check_for_alerts():
-    conn = sqlite3.connect(DB_PATH)
+    conn = storage.connect(DB_PATH)
     c = conn.cursor()
     alerts = []
     
@@ -51,7 +49,7 @@ def check_for_alerts():
     
     # Important blog posts  
     c.execute('''SELECT source, title, content, url FROM news 
-                 WHERE source LIKE 'blog_%' AND relevance_score >= 30
+                 WHERE source GLOB 'blog_*' AND relevance_score >= 30
                  ORDER BY id DESC LIMIT 10''')
     for row in c.fetchall():
         alerts.append({
@@ -90,7 +88,6 @@ def process_alerts():
     return {"alerts": len(alerts)}
 
 if __name__ == "__main__":
-    import sys
     cmd = sys.argv[1] if len(sys.argv) > 1 else "check"
     if cmd == "check":
         result = process_alerts()
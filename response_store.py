@@ -0,0 +1,236 @@
+#!/usr/bin/env python3
+"""
+Response Store - контентно-адресуемый кэш сырых HTTP ответов краулеров
+- Тела хранятся сжатыми (gzip) под своим sha256, одинаковые тела - один раз
+- Индекс по URL и времени запроса для каждого запуска (run_id)
+- Режим replay: весь цикл обслуживается из кэша без сети
+"""
+import sys
+import os
+import gzip
+import json
+import hashlib
+import sqlite3
+import tempfile
+import threading
+from datetime import datetime
+from pathlib import Path
+
+STORE_DIR = Path(__file__).parent / "knowledge" / "responses"
+
+class ReplayMiss(ConnectionError):
+    """Request not found in the replayed run"""
+
+class BodyWriter:
+    """Body being streamed into the store: sha256 and gzip file grow chunk by chunk"""
+    def __init__(self, objects):
+        self.objects = objects
+        fd, self.tmp = tempfile.mkstemp(dir=objects, suffix=".tmp")
+        os.close(fd)
+        self.file = gzip.open(self.tmp, "wb")
+        self.sha256 = hashlib.sha256()
+        self.size = 0
+
+    def write(self, data):
+        self.file.write(data)
+        self.sha256.update(data)
+        self.size += len(data)
+
+    def finish(self, path_for):
+        """Move the file under its digest (dropped if that body is stored already)"""
+        self.file.close()
+        digest = self.sha256.hexdigest()
+        path = path_for(digest)
+        if path.exists():
+            os.unlink(self.tmp)
+        else:
+            path.parent.mkdir(exist_ok=True)
+            os.replace(self.tmp, path)
+        return digest
+
+    def discard(self):
+        self.file.close()
+        if os.path.exists(self.tmp):
+            os.unlink(self.tmp)
+
+class ResponseStore:
+    """Object files + SQLite index of recorded responses"""
+    def __init__(self, root=STORE_DIR):
+        self.root = Path(root)
+        self.objects = self.root / "objects"
+        self.objects.mkdir(parents=True, exist_ok=True)
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(self.root / "index.db", check_same_thread=False)
+        self.conn.execute('''CREATE TABLE IF NOT EXISTS runs (
+            run_id TEXT PRIMARY KEY,
+            started_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            note TEXT,
+            state TEXT
+        )''')
+        # Индекс, созданный до колонки state (состояние краулеров на старте запуска)
+        if "state" not in {r[1] for r in self.conn.execute("PRAGMA table_info(runs)")}:
+            self.conn.execute("ALTER TABLE runs ADD COLUMN state TEXT")
+        self.conn.execute('''CREATE TABLE IF NOT EXISTS responses (
+            id INTEGER PRIMARY KEY,
+            run_id TEXT,
+            method TEXT,
+            url TEXT,
+            request_hash TEXT,
+            status INTEGER,
+            headers TEXT,
+            sha256 TEXT,
+            size INTEGER,
+            fetched_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )''')
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_responses_run ON responses(run_id, method, url)")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_responses_url ON responses(url, fetched_at)")
+        self.conn.commit()
+
+    def object_path(self, digest):
+        return self.objects / digest[:2] / f"{digest}.gz"
+
+    def put_body(self, body):
+        """Store a body once under its sha256; returns the digest"""
+        digest = hashlib.sha256(body).hexdigest()
+        path = self.object_path(digest)
+        if not path.exists():
+            path.parent.mkdir(exist_ok=True)
+            fd, tmp = tempfile.mkstemp(dir=path.parent)
+            with os.fdopen(fd, "wb") as f:
+                f.write(gzip.compress(body))
+            os.replace(tmp, path)
+        return digest
+
+    def get_body(self, digest):
+        with open(self.object_path(digest), "rb") as f:
+            return gzip.decompress(f.read())
+
+    def open_body(self):
+        return BodyWriter(self.objects)
+
+    def start_run(self, run_id, note=None, state=None):
+        """Register a run; state: crawler state it started from (replayed runs start from it too)"""
+        with self.lock:
+            self.conn.execute("INSERT OR IGNORE INTO runs (run_id, note, state) VALUES (?, ?, ?)",
+                              (run_id, note, json.dumps(state) if state else None))
+            self.conn.commit()
+
+    def load_state(self, run_id):
+        with self.lock:
+            row = self.conn.execute("SELECT state FROM runs WHERE run_id = ?", (run_id,)).fetchone()
+        return json.loads(row[0]) if row and row[0] else {}
+
+    def record(self, run_id, method, url, request_hash, status, headers, body):
+        """Store a response; returns (digest, previous digest for this URL)"""
+        return self._index(run_id, method, url, request_hash, status, headers,
+                           self.put_body(body), len(body))
+
+    def record_body(self, run_id, method, url, request_hash, status, headers, writer):
+        """Store a response streamed into a BodyWriter; returns (digest, previous digest)"""
+        return self._index(run_id, method, url, request_hash, status, headers,
+                           writer.finish(self.object_path), writer.size)
+
+    def _index(self, run_id, method, url, request_hash, status, headers, digest, size):
+        with self.lock:
+            row = self.conn.execute('''SELECT sha256 FROM responses
+                                       WHERE url = ? AND method = ? AND status = 200
+                                       ORDER BY id DESC LIMIT 1''', (url, method)).fetchone()
+            self.conn.execute('''INSERT INTO responses
+                                 (run_id, method, url, request_hash, status, headers, sha256, size)
+                                 VALUES (?, ?, ?, ?, ?, ?, ?, ?)''',
+                              (run_id, method, url, request_hash, status,
+                               json.dumps(headers), digest, size))
+            self.conn.commit()
+        return digest, row[0] if row else None
+
+    def load_run(self, run_id):
+        """Map (method, url, request_hash) -> recorded responses in fetch order"""
+        with self.lock:
+            rows = self.conn.execute('''SELECT method, url, request_hash, status, headers, sha256
+                                        FROM responses WHERE run_id = ? ORDER BY id''',
+                                     (run_id,)).fetchall()
+        if not rows:
+            raise ValueError(f"Unknown run: {run_id}")
+        recorded = {}
+        for method, url, request_hash, status, headers, digest in rows:
+            recorded.setdefault((method, url, request_hash), []).append(
+                (status, json.loads(headers), digest))
+        return recorded
+
+    def list_runs(self):
+        with self.lock:
+            return self.conn.execute('''SELECT r.run_id, r.started_at, r.note, COUNT(s.id), COALESCE(SUM(s.size), 0)
+                                        FROM runs r LEFT JOIN responses s ON s.run_id = r.run_id
+                                        GROUP BY r.run_id ORDER BY r.started_at DESC''').fetchall()
+
+    def prune(self, keep_runs=50):
+        """Drop index rows of old runs and objects no longer referenced"""
+        with self.lock:
+            old = [r[0] for r in self.conn.execute(
+                "SELECT run_id FROM runs ORDER BY started_at DESC LIMIT -1 OFFSET ?", (keep_runs,))]
+            self.conn.executemany("DELETE FROM responses WHERE run_id = ?", [(r,) for r in old])
+            self.conn.executemany("DELETE FROM runs WHERE run_id = ?", [(r,) for r in old])
+            self.conn.commit()
+            live = {r[0] for r in self.conn.execute("SELECT DISTINCT sha256 FROM responses")}
+        removed = 0
+        for path in self.objects.glob("*/*.gz"):
+            if path.name[:-3] not in live:
+                path.unlink()
+                removed += 1
+        return {"runs_removed": len(old), "objects_removed": removed}
+
+class Recorder:
+    """Records every response of a run into the store"""
+    def __init__(self, store, run_id, state=None):
+        self.store = store
+        self.run_id = run_id
+        store.start_run(run_id, state=state)
+
+    def record(self, method, url, request_hash, status, headers, body):
+        return self.store.record(self.run_id, method, url, request_hash, status, headers, body)
+
+    def open_body(self):
+        return self.store.open_body()
+
+    def record_body(self, method, url, request_hash, status, headers, writer):
+        return self.store.record_body(self.run_id, method, url, request_hash, status, headers, writer)
+
+class Replayer:
+    """Serves responses of a recorded run, in the order they were fetched"""
+    def __init__(self, store, run_id):
+        self.store = store
+        self.run_id = run_id
+        self.recorded = store.load_run(run_id)
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def lookup(self, method, url, request_hash):
+        """Return (status, headers, body) or raise ReplayMiss"""
+        with self.lock:
+            queue = self.recorded.get((method, url, request_hash))
+            if not queue:
+                self.misses += 1
+                raise ReplayMiss(f"Not recorded in run {self.run_id}: {method} {url}")
+            # Последний ответ остаётся в очереди для повторных запросов того же URL
+            status, headers, digest = queue.pop(0) if len(queue) > 1 else queue[0]
+            self.hits += 1
+        return status, headers, self.store.get_body(digest)
+
+    def stats(self):
+        return {"run_id": self.run_id, "hits": self.hits, "misses": self.misses}
+
+def new_run_id():
+    # Микросекунды: запуски, начатые в одну секунду (cron и ручной), не смешивают записи
+    return datetime.now().strftime("%Y%m%d-%H%M%S-%f")
+
+if __name__ == "__main__":
+    cmd = sys.argv[1] if len(sys.argv) > 1 else "runs"
+    store = ResponseStore()
+
+    if cmd == "runs":
+        for run_id, started_at, note, count, size in store.list_runs():
+            print(f"  {run_id}  {started_at}  {count:>5} responses  {size // 1024:>7} KB  {note or ''}")
+    elif cmd == "prune":
+        keep = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+        print(json.dumps(store.prune(keep)))
@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+"""
+Scheduler - адаптивное расписание опроса источников
+Интервал каждого источника подстраивается под то, как часто он реально даёт новые записи
+"""
+import json
+import time
+from datetime import datetime
+from pathlib import Path
+
+import storage
+import migrations
+
+DB_PATH = Path(__file__).parent / "knowledge" / "news.db"
+
+# (min, max) интервал опроса в секундах
+SOURCE_INTERVALS = {
+    "hackernews": (300, 3600),
+    "blog_anthropic": (1800, 7 * 86400),
+    "blog_google_ai": (1800, 2 * 86400),
+    "blog_openai": (1800, 2 * 86400),
+    "github": (3600, 86400),
+}
+DEFAULT_INTERVALS = (1800, 86400)
+
+SPEEDUP = 0.5      # источник дал новые записи - опрашиваем чаще
+SLOWDOWN = 1.5     # ничего нового - реже
+RATE_ALPHA = 0.3   # сглаживание среднего числа новых записей за запуск
+
+# Бюджет цикла (--deadline): доля на краулинг, остальное - анализ, планы, уведомления
+CRAWL_BUDGET_SHARE = 0.8
+MIN_STEP_SECONDS = 2   # меньше этого шаг не запускаем
+
+class CycleBudget:
+    """Time budget of one cycle, split across crawl steps by priority and weight"""
+    def __init__(self, seconds):
+        self.seconds = seconds
+        self.started = time.monotonic()
+        self.deadline = self.started + seconds
+        self.crawl_deadline = self.started + seconds * CRAWL_BUDGET_SHARE
+        self.skipped = []
+
+    def remaining(self):
+        return max(0.0, self.deadline - time.monotonic())
+
+    def allot(self, weight, pending_weight):
+        """Seconds for a crawl step: its weight's share of the crawl time left
+
+        Steps run in priority order, so time a step leaves unused rolls over
+        to the steps after it.
+        """
+        left = max(0.0, self.crawl_deadline - time.monotonic())
+        if left < MIN_STEP_SECONDS:
+            return 0.0
+        share = left * weight / pending_weight if pending_weight else left
+        return min(left, max(share, MIN_STEP_SECONDS))
+
+    def skip(self, step, reason="deadline"):
+        self.skipped.append({"step": step, "reason": reason,
+                             "at": round(time.monotonic() - self.started, 1)})
+
+    def summary(self):
+        return {
+            "seconds": self.seconds,
+            "elapsed": round(time.monotonic() - self.started, 1),
+            "skipped": self.skipped
+        }
+
+def init_schedule_table():
+    """Initialize crawl schedule table"""
+    migrations.migrate(DB_PATH)
+
+def get_intervals(source):
+    return SOURCE_INTERVALS.get(source, DEFAULT_INTERVALS)
+
+def due_sources(sources, now=None):
+    """Return the sources whose next_run has passed (unknown sources are due)"""
+    now = now or time.time()
+    conn = storage.connect(DB_PATH)
+    c = conn.cursor()
+    c.execute("SELECT source, next_run FROM crawl_schedule")
+    next_runs = dict(c.fetchall())
+    conn.close()
+    return [s for s in sources if (next_runs.get(s) or 0) <= now]
+
+def record_run(source, new_rows, now=None, error=False):
+    """Record a crawl result and adapt the source's polling interval
+
+    error: the crawl failed (exception, timeout, feed unavailable). The interval
+    is kept and the source is retried after min_interval - a source that is down
+    must not be polled less often right when it recovers.
+    """
+    now = now or time.time()
+    min_interval, max_interval = get_intervals(source)
+
+    with storage.transaction(DB_PATH) as conn:
+        c = conn.cursor()
+        c.execute("SELECT interval, new_rate FROM crawl_schedule WHERE source = ?", (source,))
+        row = c.fetchone()
+        interval, new_rate = row if row else (min_interval, float(new_rows))
+
+        if not error:
+            # Реже - только после успешного запуска без новых записей
+            interval *= SPEEDUP if new_rows > 0 else SLOWDOWN
+            new_rate = RATE_ALPHA * new_rows + (1 - RATE_ALPHA) * new_rate
+        interval = max(min_interval, min(max_interval, interval))
+        next_run = now + (min_interval if error else interval)
+
+        c.execute('''INSERT INTO crawl_schedule
+                     (source, interval, min_interval, max_interval, last_run, next_run,
+                      runs, productive_runs, last_new, new_rate)
+                     VALUES (?, ?, ?, ?, ?, ?, 1, ?, ?, ?)
+                     ON CONFLICT(source) DO UPDATE SET
+                         interval = excluded.interval,
+                         min_interval = excluded.min_interval,
+                         max_interval = excluded.max_interval,
+                         last_run = excluded.last_run,
+                         next_run = excluded.next_run,
+                         runs = runs + 1,
+                         productive_runs = productive_runs + excluded.productive_runs,
+                         last_new = excluded.last_new,
+                         new_rate = excluded.new_rate''',
+                  (source, interval, min_interval, max_interval, now, next_run,
+                   int(new_rows > 0 and not error), new_rows, new_rate))
+    return interval
+
+def get_schedule():
+    """Get the current schedule for all sources"""
+    conn = storage.connect(DB_PATH)
+    c = conn.cursor()
+    c.execute('''SELECT source, interval, last_run, next_run, runs, productive_runs, last_new, new_rate
+                 FROM crawl_schedule ORDER BY next_run''')
+    schedule = [{
+        "source": r[0],
+        "interval_min": round(r[1] / 60, 1),
+        "last_run": datetime.fromtimestamp(r[2]).isoformat(timespec="seconds") if r[2] else None,
+        "next_run": datetime.fromtimestamp(r[3]).isoformat(timespec="seconds") if r[3] else None,
+        "runs": r[4],
+        "productive_runs": r[5],
+        "last_new": r[6],
+        "new_rate": round(r[7], 2)
+    } for r in c.fetchall()]
+    conn.close()
+    return schedule
+
+if __name__ == "__main__":
+    init_schedule_table()
+    print(json.dumps(get_schedule(), indent=2))
@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+Snapshot - согласованные read-only копии news.db для веб-дашбордов
+- В конце цикла (main.py run --snapshot) БД копируется через sqlite3 backup API во
+  временный файл, который атомарно переименовывается в news.snapshot-<версия>.db
+- Опубликованный файл больше не меняется: дашборды (--snapshot) открывают самый новый
+  с mode=ro&immutable=1 - без блокировок, чтения не ждут длинных транзакций цикла
+- Хранятся KEEP последних версий; пока снимков нет, дашборды читают живую БД
+"""
+import os
+import sys
+import json
+import time
+import sqlite3
+from datetime import datetime, timezone
+from pathlib import Path
+
+import storage
+import migrations
+
+DB_PATH = Path(__file__).parent / "knowledge" / "news.db"
+
+PREFIX = "news.snapshot-"
+KEEP = 3                 # версий на диске: читатель может ещё держать предыдущую
+STALE_TMP = 3600         # сек - недописанный .tmp прерванной публикации удаляется
+
+enabled = False          # дашборды включают флагом --snapshot
+_current = {}
+
+def enable(on=True):
+    """Serve dashboard reads from the newest snapshot"""
+    global enabled
+    enabled = on
+
+def list_snapshots(db_path=DB_PATH):
+    """Published snapshots, oldest first (the version sorts by time)"""
+    return sorted(Path(db_path).parent.glob(f"{PREFIX}*.db"))
+
+def latest(db_path=DB_PATH):
+    snapshots = list_snapshots(db_path)
+    return snapshots[-1] if snapshots else None
+
+def _fsync(path):
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+def publish(db_path=DB_PATH):
+    """Copy the database into a new snapshot file and publish it atomically
+
+    Call outside a write transaction: the copy is one consistent read of the database.
+    """
+    migrations.migrate(db_path)
+    started = time.perf_counter()
+    version = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S%f")
+    path = Path(db_path).with_name(f"{PREFIX}{version}.db")
+    tmp = path.with_name(f".{path.name}.tmp")
+
+    source = storage.connect(db_path)
+    # Приёмник - одноразовый файл вне пула: storage включил бы ему WAL
+    target = sqlite3.connect(tmp)
+    try:
+        source.backup(target)
+        # Без -wal файла: снимок самодостаточен для immutable=1
+        target.execute("PRAGMA journal_mode=DELETE")
+    finally:
+        target.close()
+        source.close()
+    _fsync(tmp)
+    os.replace(tmp, path)
+    _fsync(path.parent)
+
+    return {"path": path.name, "bytes": path.stat().st_size,
+            "seconds": round(time.perf_counter() - started, 3), "removed": prune(db_path)}
+
+def prune(db_path=DB_PATH, keep=KEEP):
+    """Delete all but the newest keep snapshots and stale temporary files"""
+    removed = []
+    old = list_snapshots(db_path)[:-keep] if keep else list_snapshots(db_path)
+    stale = [p for p in Path(db_path).parent.glob(f".{PREFIX}*.tmp")
+             if time.time() - p.stat().st_mtime > STALE_TMP]
+    for path in old + stale:
+        try:
+            # Открытые у читателей файлы остаются доступны им до закрытия
+            path.unlink()
+            removed.append(path.name)
+        except OSError:
+            pass
+    return removed
+
+def read_path(db_path=DB_PATH):
+    """File dashboard reads should use: newest snapshot when enabled, else the live DB"""
+    if not enabled:
+        return Path(db_path)
+    return latest(db_path) or Path(db_path)
+
+def connect(db_path=DB_PATH):
+    """Connection for dashboard reads (read-only and immutable for a snapshot)"""
+    path = read_path(db_path)
+    if path == Path(db_path):
+        return storage.connect(db_path)
+    key = str(db_path)
+    previous = _current.get(key)
+    if previous and previous != path:
+        storage.retire(previous, readonly=True)
+    _current[key] = path
+    return storage.connect(path, readonly=True)
+
+if __name__ == "__main__":
+    cmd = sys.argv[1] if len(sys.argv) > 1 else "list"
+
+    if cmd == "publish":
+        print(json.dumps(publish(), indent=2))
+    elif cmd == "list":
+        for path in list_snapshots():
+            print(f"{path.name}  {path.stat().st_size} bytes")
+    elif cmd == "prune":
+        print(json.dumps(prune()))
+    else:
+        print("Commands: publish, list, prune")
@@ -0,0 +1,289 @@
+#!/usr/bin/env python3
+"""
+Storage - общий слой подключений к SQLite
+- Одно соединение на поток и файл БД: повторный connect() в том же потоке
+  возвращает уже открытое соединение, close() лишь отпускает его
+- WAL: веб-дашборды читают, пока цикл пишет, без "database is locked"
+- Соединения завершившихся потоков (запросы HTTP серверов) возвращаются в пул
+- readonly=True: неизменяемый файл (снимок, snapshot.py) открывается с mode=ro&immutable=1 -
+  без блокировок и без проверки чужих изменений
+"""
+import sys
+import json
+import sqlite3
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+
+DB_PATH = Path(__file__).parent / "knowledge" / "news.db"
+
+BUSY_TIMEOUT = 5000        # мс ожидания чужой блокировки записи
+PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",   # в WAL надёжно при сбое процесса, fsync только на checkpoint
+    "cache_size": -65536,      # 64 MiB страничного кэша на соединение
+    "mmap_size": 268435456,    # 256 MiB чтения через mmap
+    "busy_timeout": BUSY_TIMEOUT,
+    "temp_store": "MEMORY",
+}
+# Для readonly: только настройки чтения, journal_mode/synchronous файлу не нужны
+READ_PRAGMAS = ("cache_size", "mmap_size", "temp_store")
+READONLY = "?mode=ro&immutable=1"
+MAX_IDLE = 8               # свободных соединений на файл БД в пуле
+SQL_BATCH = 500            # значений в одном ... IN (...)
+MAX_VARIABLES = 32766      # параметров на запрос (SQLITE_MAX_VARIABLE_NUMBER с 3.32)
+
+class PooledConnection(sqlite3.Connection):
+    """Connection shared by every user in one thread; close() releases it"""
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.users = 0
+        self.depth = 0
+
+    def commit(self):
+        # Внутри transaction() фиксирует только внешний блок: commit() вложенного кода
+        # (set_state, log_run...) иначе завершил бы транзакцию на полпути
+        if self.depth == 0:
+            super().commit()
+
+    def close(self):
+        # Последний пользователь: откатываем незавершённое, как сделал бы настоящий close()
+        self.users = max(0, self.users - 1)
+        if self.users == 0 and self.depth == 0 and self.in_transaction:
+            self.rollback()
+
+    def close_now(self):
+        super().close()
+
+class _ThreadConnections(dict):
+    """Per-thread {db key: connection}; returns them to the pool when the thread ends"""
+    def __del__(self):
+        for key, conn in self.items():
+            release(key, conn)
+
+_local = threading.local()
+_idle = {}
+_idle_lock = threading.Lock()
+_retired = set()
+_redirects = {}
+
+def resolve(db_path):
+    """File that connect(db_path) really opens (see redirect)"""
+    path = Path(db_path).resolve()
+    return _redirects.get(path, path)
+
+def redirect(db_path, target=None):
+    """Open target whenever db_path is asked for (None: stop) - replay runs on a scratch DB
+
+    Applies to every thread; connections this thread holds are closed first.
+    """
+    close_all()
+    path = Path(db_path).resolve()
+    if target is None:
+        _redirects.pop(path, None)
+    else:
+        _redirects[path] = Path(target).resolve()
+
+def _key(db_path, readonly=False):
+    path = resolve(db_path)
+    return path.as_uri() + READONLY if readonly else str(path)
+
+def _open(key):
+    readonly = key.endswith(READONLY)
+    conn = sqlite3.connect(key, timeout=BUSY_TIMEOUT / 1000, factory=PooledConnection,
+                           check_same_thread=False, uri=readonly)
+    for name, value in PRAGMAS.items():
+        if not readonly or name in READ_PRAGMAS:
+            conn.execute(f"PRAGMA {name}={value}")
+    return conn
+
+def release(key, conn):
+    """Put a connection back into the idle pool (or close it if the pool is full)"""
+    try:
+        if conn.in_transaction:
+            conn.rollback()
+        conn.users = conn.depth = 0
+    except sqlite3.Error:
+        return
+    with _idle_lock:
+        if key in _retired:
+            conn.close_now()
+            return
+        idle = _idle.setdefault(key, [])
+        if len(idle) < MAX_IDLE:
+            idle.append(conn)
+            return
+    conn.close_now()
+
+def connect(db_path=DB_PATH, readonly=False):
+    """This thread's connection to db_path (opened with PRAGMAS on first use)
+
+    readonly: the file never changes while open (a published snapshot).
+    """
+    conns = getattr(_local, "conns", None)
+    if conns is None:
+        conns = _local.conns = _ThreadConnections()
+    key = _key(db_path, readonly)
+    conn = conns.get(key)
+    if conn is None:
+        with _idle_lock:
+            idle = _idle.get(key)
+            conn = idle.pop() if idle else None
+        conns[key] = conn = conn or _open(key)
+    conn.users += 1
+    return conn
+
+@contextmanager
+def transaction(db_path=DB_PATH):
+    """Commit on success, roll back on error; nested blocks join the outer one
+
+    The outer block starts with BEGIN IMMEDIATE: the write lock is taken up
+    front, so a read-then-write block cannot fail halfway with SQLITE_BUSY.
+    conn.commit() inside the block does nothing.
+    """
+    conn = connect(db_path)
+    if conn.depth == 0 and not conn.in_transaction:
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+        except BaseException:
+            conn.close()
+            raise
+    conn.depth += 1
+    try:
+        yield conn
+        if conn.depth == 1:
+            sqlite3.Connection.commit(conn)
+    except BaseException:
+        if conn.depth == 1 and conn.in_transaction:
+            conn.rollback()
+        raise
+    finally:
+        conn.depth -= 1
+        conn.close()
+
+def retire(db_path, readonly=False):
+    """Close this thread's and idle connections to a file that is no longer read
+
+    Connections other threads still hold are closed when they come back to the pool.
+    """
+    key = _key(db_path, readonly)
+    conns = getattr(_local, "conns", None) or {}
+    current = conns.pop(key, None)
+    with _idle_lock:
+        _retired.add(key)
+        idle = _idle.pop(key, [])
+    for conn in idle + ([current] if current else []):
+        conn.close_now()
+
+def close_all():
+    """Close this thread's connections and the idle pool (e.g. before replacing the file)"""
+    conns = getattr(_local, "conns", None) or {}
+    for conn in conns.values():
+        conn.close_now()
+    conns.clear()
+    with _idle_lock:
+        for idle in _idle.values():
+            for conn in idle:
+                conn.close_now()
+        _idle.clear()
+
+def write_many(conn, sql, rows):
+    """Run one statement for every row with executemany; number of rows changed"""
+    cursor = conn.executemany(sql, rows)
+    return max(cursor.rowcount, 0)
+
+def insert_many(conn, table, columns, records, conflict="IGNORE"):
+    """Bulk INSERT OR <conflict> of tuples or dicts in the caller's transaction
+
+    Returns {"inserted": n, "ignored": m} - ignored rows hit a UNIQUE constraint.
+    """
+    rows = [tuple(r[col] for col in columns) if isinstance(r, dict) else tuple(r) for r in records]
+    sql = (f"INSERT OR {conflict} INTO {table} ({', '.join(columns)}) "
+           f"VALUES ({', '.join('?' * len(columns))})")
+    inserted = write_many(conn, sql, rows) if rows else 0
+    return {"inserted": inserted, "ignored": len(rows) - inserted}
+
+def select_in(conn, sql, values):
+    """Rows of a query with an IN ({}) placeholder, run in SQL_BATCH chunks"""
+    values = list(values)
+    for i in range(0, len(values), SQL_BATCH):
+        batch = values[i:i + SQL_BATCH]
+        yield from conn.execute(sql.format(",".join("?" * len(batch))), batch)
+
+def values_many(conn, sql, rows):
+    """Multi-row statement with a VALUES {} placeholder; rows it RETURNs
+
+    Rows are sent in as few statements as the parameter limit allows, so an
+    INSERT ... ON CONFLICT ... RETURNING upserts a whole batch in one round trip.
+    """
+    rows = [tuple(r) for r in rows]
+    result = []
+    if not rows:
+        return result
+    width = len(rows[0])
+    step = max(1, MAX_VARIABLES // width)
+    placeholder = f"({', '.join('?' * width)})"
+    for i in range(0, len(rows), step):
+        batch = rows[i:i + step]
+        params = [value for row in batch for value in row]
+        result.extend(conn.execute(sql.format(", ".join([placeholder] * len(batch))), params).fetchall())
+    return result
+
+def benchmark(sizes=(10000, 100000)):
+    """Row-by-row INSERTs (commit per row / one transaction) vs insert_many; half the rows repeat"""
+    import tempfile
+    import time
+
+    sql = "INSERT OR IGNORE INTO news (source, title, content, url) VALUES (?, ?, ?, ?)"
+    results = []
+    for size in sizes:
+        rows = [("bench", f"Title {i}", "content " * 10, f"https://example.com/{i % (size // 2)}")
+                for i in range(size)]
+        timings = {}
+        with tempfile.TemporaryDirectory() as tmp:
+            for mode in ("commit_per_row", "row_loop", "executemany"):
+                db = Path(tmp) / f"{mode}.db"
+                with transaction(db) as conn:
+                    conn.execute('''CREATE TABLE news (id INTEGER PRIMARY KEY, source TEXT,
+                                    title TEXT, content TEXT, url TEXT UNIQUE)''')
+                started = time.perf_counter()
+                if mode == "executemany":
+                    with transaction(db) as conn:
+                        result = insert_many(conn, "news", ("source", "title", "content", "url"), rows)
+                else:
+                    conn = connect(db)
+                    inserted = 0
+                    for row in rows:
+                        inserted += conn.execute(sql, row).rowcount
+                        if mode == "commit_per_row":
+                            conn.commit()
+                    conn.commit()
+                    conn.close()
+                    result = {"inserted": inserted, "ignored": size - inserted}
+                timings[mode] = time.perf_counter() - started
+                assert result == {"inserted": size // 2, "ignored": size - size // 2}, (mode, result)
+            close_all()
+        results.append({"rows": size, **{f"{mode}_s": round(t, 3) for mode, t in timings.items()},
+                        "speedup_vs_commit_per_row": round(timings["commit_per_row"] / timings["executemany"], 1),
+                        "speedup_vs_row_loop": round(timings["row_loop"] / timings["executemany"], 2),
+                        **result})
+    return results
+
+def get_pragmas(db_path=DB_PATH):
+    conn = connect(db_path)
+    result = {name: conn.execute(f"PRAGMA {name}").fetchone()[0] for name in PRAGMAS}
+    conn.close()
+    return result
+
+if __name__ == "__main__":
+    cmd = sys.argv[1] if len(sys.argv) > 1 else "pragmas"
+
+    if cmd == "pragmas":
+        print(json.dumps(get_pragmas(), indent=2))
+    elif cmd == "checkpoint":
+        conn = connect()
+        print(conn.execute("PRAGMA wal_checkpoint(TRUNCATE)").fetchone())
+        conn.close()
+    elif cmd == "bench":
+        for row in benchmark():
+            print(json.dumps(row))
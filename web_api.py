@@ -5,10 +5,13 @@ Web API для AGI News Agent
 """
 from http.server import HTTPServer, BaseHTTPRequestHandler
 import json
-import sqlite3
 from pathlib import Path
 from urllib.parse import urlparse, parse_qs
 
+import migrations
+import snapshot
+from analyzer.news_analyzer import search
+
 DB_PATH = Path(__file__).parent / "knowledge" / "news.db"
 NOTIFY_PATH = Path(__file__).parent / "notifications.json"
 
@@ -43,6 +46,8 @@ class AgentAPIHandler(BaseHTTPRequestHandler):
             self._api_notifications()
         elif path == '/api/watchlist':
             self._api_watchlist(query)
+        elif path == '/api/search':
+            self._api_search(query)
         else:
             self._send_json({"error": "Not found"}, 404)
     
@@ -179,32 +184,19 @@ class AgentAPIHandler(BaseHTTPRequestHandler):
         self._send_html(html)
     
     def _api_status(self):
-        conn = sqlite3.connect(DB_PATH)
-        c = conn.cursor()
-        status = {}
-        
-        try:
-            c.execute("SELECT COUNT(*) FROM github_watchlist")
-            status["github_repos"] = c.fetchone()[0]
-            c.execute("SELECT COUNT(*) FROM github_watchlist WHERE is_rising_star = 1")
-            status["rising_stars"] = c.fetchone()[0]
-        except: pass
-        
-        try:
-            c.execute("SELECT COUNT(*) FROM news")
-            status["news"] = c.fetchone()[0]
-        except: pass
-        
-        try:
-            c.execute("SELECT COUNT(*) FROM technologies")
-            status["technologies"] = c.fetchone()[0]
-        except: pass
-        
+        conn = snapshot.connect(DB_PATH)
+        counters = migrations.read_counters(conn)
         conn.close()
+        status = {
+            "github_repos": counters.get("github_watchlist", 0),
+            "rising_stars": counters.get("github_watchlist.rising", 0),
+            "news": counters.get("news", 0),
+            "technologies": counters.get("technologies", 0)
+        }
         self._send_json(status)
     
     def _api_rising_stars(self):
-        conn = sqlite3.connect(DB_PATH)
+        conn = snapshot.connect(DB_PATH)
         c = conn.cursor()
         c.execute('''SELECT repo_name, url, stars, stars_per_day, category, description
                      FROM github_watchlist WHERE is_rising_star = 1
@@ -217,7 +209,7 @@ class AgentAPIHandler(BaseHTTPRequestHandler):
     
     def _api_watchlist(self, query):
         limit = int(query.get('limit', [20])[0])
-        conn = sqlite3.connect(DB_PATH)
+        conn = snapshot.connect(DB_PATH)
         c = conn.cursor()
         c.execute('''SELECT repo_name, url, stars, stars_per_day, category, is_rising_star
                      FROM github_watchlist ORDER BY stars DESC LIMIT ?''', (limit,))
@@ -230,7 +222,7 @@ class AgentAPIHandler(BaseHTTPRequestHandler):
     def _api_news(self, query):
         limit = int(query.get('limit', [20])[0])
         min_score = int(query.get('min_score', [30])[0])
-        conn = sqlite3.connect(DB_PATH)
+        conn = snapshot.connect(DB_PATH)
         c = conn.cursor()
         c.execute('''SELECT title, url, relevance_score, source FROM news
                      WHERE relevance_score >= ? ORDER BY relevance_score DESC LIMIT ?''',
@@ -240,6 +232,24 @@ class AgentAPIHandler(BaseHTTPRequestHandler):
         conn.close()
         self._send_json(results)
     
+    def _api_search(self, query):
+        text = query.get('q', [''])[0].strip()
+        if not text:
+            self._send_json({"error": "Missing q"}, 400)
+            return
+        try:
+            # LIMIT -1 в SQLite - без ограничения: держим 1..100
+            limit = max(1, min(int(query.get('limit', [20])[0]), 100))
+        except ValueError:
+            self._send_json({"error": "Bad limit"}, 400)
+            return
+        conn = snapshot.connect(DB_PATH)
+        results = [{"id": r[0], "source": r[1], "title": r[2], "url": r[3],
+                    "score": r[4], "snippet": r[5]}
+                   for r in search(conn, text, limit)]
+        conn.close()
+        self._send_json(results)
+    
     def _api_notifications(self):
         if NOTIFY_PATH.exists():
             with open(NOTIFY_PATH) as f:
@@ -250,12 +260,16 @@ class AgentAPIHandler(BaseHTTPRequestHandler):
     def log_message(self, format, *args):
         pass  # Suppress logs
 
-def run_server(port=3457):
+def run_server(port=3457, snapshots=False):
+    # Схему обновляет цикл (main.py): дашборд только читает и не берёт блокировку записи
+    # Чтение из последнего опубликованного снимка вместо живой БД
+    snapshot.enable(snapshots)
     server = HTTPServer(('0.0.0.0', port), AgentAPIHandler)
     print(f"AGI Agent Web API running on http://0.0.0.0:{port}")
     server.serve_forever()
 
 if __name__ == "__main__":
     import sys
-    port = int(sys.argv[1]) if len(sys.argv) > 1 else 3457
-    run_server(port)
+    args = [a for a in sys.argv[1:] if a != "--snapshot"]
+    port = int(args[0]) if args else 3457
+    run_server(port, snapshots="--snapshot" in sys.argv)
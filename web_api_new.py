@@ -4,12 +4,15 @@ AGI Dashboard v3 - Extended System Monitoring with Navigation
 Sections: API Keys, Errors, System, Learning, Services
 """
 from http.server import HTTPServer, BaseHTTPRequestHandler
-import json, sqlite3, subprocess, os
+import json, subprocess, os, sys
 from pathlib import Path
 from datetime import datetime
 
-DB = Path(__file__).parent.parent / "knowledge" / "news.db"
-ALERTS = Path(__file__).parent.parent / "logs" / "alerts.json"
+import migrations
+import snapshot
+
+DB = Path(__file__).parent / "knowledge" / "news.db"
+ALERTS = Path(__file__).parent / "logs" / "alerts.json"
 KEYS_FILE = Path.home() / ".keys" / "keys.json"
 KNOWLEDGE_FILE = Path.home() / "agent-memory" / "internal-knowledge.json"
 
@@ -67,19 +70,15 @@ class H(BaseHTTPRequestHandler):
 
     def rising(self):
         try:
-            c = sqlite3.connect(DB).cursor()
+            c = snapshot.connect(DB).cursor()
             c.execute('SELECT repo_name,stars,stars_per_day,url FROM github_watchlist WHERE category IN ("rising","hot") ORDER BY stars_per_day DESC LIMIT 20')
             return [{"name":r[0],"stars":r[1],"growth":r[2],"url":r[3]} for r in c.fetchall()]
         except: return []
 
     def stats(self):
         try:
-            c = sqlite3.connect(DB).cursor()
-            s = {}
-            for t in ["news","technologies","github_watchlist"]:
-                try: c.execute(f"SELECT COUNT(*) FROM {t}"); s[t]=c.fetchone()[0]
-                except: s[t]=0
-            return s
+            counters = migrations.read_counters(snapshot.connect(DB))
+            return {t: counters.get(t, 0) for t in ["news","technologies","github_watchlist"]}
         except: return {}
 
     def system_stats(self):
@@ -523,5 +522,7 @@ small {{ color:#888; }}
     def log_message(self, *a): pass
 
 if __name__ == "__main__":
+    # Схему обновляет цикл (main.py): дашборд только читает и не берёт блокировку записи
+    snapshot.enable("--snapshot" in sys.argv)
     print("Starting AGI Dashboard v3 on :3457")
     HTTPServer(('0.0.0.0', 3457), H).serve_forever()